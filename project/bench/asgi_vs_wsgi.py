@@ -0,0 +1,59 @@
+# Compara vazão e latência da busca sob WSGI (gunicorn, views síncronas) e ASGI (uvicorn, views assíncronas),
+# com um servidor falso do Google Books respondendo com latência fixa.
+#
+#     cd project && python -m bench.asgi_vs_wsgi --requests 2000 --concurrency 200 --latency 0.1
+import argparse
+import asyncio
+
+from core.fakes import FakeGoogleBooksServer
+
+from .common import drive, free_port, print_table, start_server, stop_server, write_results
+
+
+def server_commands(port, threads):
+    # nome do cenário -> (comando, variáveis de ambiente extras)
+    return {
+        "wsgi-gunicorn": (
+            ["gunicorn", "project.wsgi:application", "-b", f"127.0.0.1:{port}",
+             "-w", "1", "-k", "gthread", "--threads", str(threads)],
+            {},
+        ),
+        "asgi-uvicorn": (
+            ["uvicorn", "project.asgi:application", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", "1", "--no-access-log"],
+            {"BOOKLY_ASYNC_VIEWS": "1"},
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca sob WSGI x ASGI contra um Google Books falso")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="latência do Google Books falso, em segundos")
+    parser.add_argument("--threads", type=int, default=32, help="threads do worker gunicorn")
+    parser.add_argument("--output", default="bench_asgi_vs_wsgi.json")
+    args = parser.parse_args()
+
+    results = {}
+    with FakeGoogleBooksServer(latency=args.latency) as fake:
+        port = free_port()
+        for name, (command, env) in server_commands(port, args.threads).items():
+            env = dict(env, GOOGLE_BOOKS_API_URL=fake.base_url)
+            process = start_server(command, port, env)
+            try:
+                # cada requisição usa uma busca diferente, para medir a chamada à API e não o cache
+                results[name] = asyncio.run(drive(
+                    lambda i: f"http://127.0.0.1:{port}/search/?q=bench{i}",
+                    args.requests,
+                    args.concurrency,
+                ))
+            finally:
+                stop_server(process)
+
+    print_table(results)
+    write_results(args.output, {"benchmark": "asgi_vs_wsgi", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
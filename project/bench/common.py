@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    import django
+
+    django.setup()
+
+
+# Cria um banco de testes descartável (como o manage.py test) para os benchmarks que populam dados
+@contextmanager
+def test_database():
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+
+# Mediana de `repeat` execuções de fn(), em segundos
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)[len(samples) // 2]
+
+
+# Percentis de uma lista de latências (em segundos)
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "max": ordered[-1]}
+
+
+def summarize(latencies, errors, elapsed):
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "latency": percentiles(latencies),
+    }
+
+
+# Dispara `total` requisições GET com no máximo `concurrency` simultâneas.
+# url_for(i) devolve a URL da i-ésima requisição
+async def drive(url_for, total, concurrency, timeout=30):
+    return await drive_requests(lambda i: ("GET", url_for(i), {}), total, concurrency, timeout)
+
+
+# Como drive, para qualquer método: request_for(i) devolve (método, URL, argumentos do httpx),
+# ex.: ("POST", url, {"data": {...}, "headers": {...}})
+async def drive_requests(request_for, total, concurrency, timeout=30):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                method, url, options = request_for(i)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **options)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"servidor não subiu na porta {port}")
+
+
+# Sobe um servidor da aplicação (gunicorn, uvicorn...) em subprocesso, a partir do diretório do projeto
+def start_server(command, port, env=None):
+    process_env = dict(os.environ, **(env or {}))
+    process_env.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    process = subprocess.Popen(
+        [sys.executable, "-m", *command],
+        cwd=PROJECT_DIR,
+        env=process_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def write_results(path, results):
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True))
+
+
+def print_table(rows):
+    print(f"{'cenário':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'erros':>8}")
+    for name, result in rows.items():
+        latency = result["latency"]
+        print(f"{name:<24}{result['throughput']:>10.1f}{latency['p50'] * 1000:>10.1f}"
+              f"{latency['p99'] * 1000:>10.1f}{result['errors']:>8}")
@@ -0,0 +1,72 @@
+# Latência da última página do perfil com paginação por offset e por cursor, para bibliotecas de
+# tamanhos crescentes. Com cursor, a página N deve custar o mesmo que a primeira.
+#
+#     cd project && python -m bench.profile_pagination --sizes 1000 10000 50000
+import argparse
+
+from .common import setup_django, test_database, timed, write_results
+
+
+def seed_library(user, size, offset):
+    from core.models import Book, UserBook
+
+    batch = 5000
+    for start in range(0, size, batch):
+        books = Book.objects.bulk_create([
+            Book(google_book_id=f"bench-{offset + i}", title=f"Livro {offset + i}", authors="Autor")
+            for i in range(start, min(start + batch, size))
+        ])
+        UserBook.objects.bulk_create([UserBook(user=user, book=book) for book in books])
+
+
+def measure(size, repeat):
+    from django.test import Client
+    from django.urls import reverse
+
+    from core.models import CustomUser, UserBook
+    from core.pagination import KeysetPaginator
+    from core.views import ProfileView
+
+    user = CustomUser.objects.create_user(f"bench{size}", password="bench-password-123")
+    seed_library(user, size, offset=size * 10)
+    client = Client()
+    client.force_login(user)
+
+    per_page = ProfileView.paginate_by
+    last_page = (size + per_page - 1) // per_page
+    queryset = UserBook.objects.filter(user=user).order_by("-added_at", "-id")
+    # cursor equivalente à última página: aponta para o último item da penúltima página
+    anchor = queryset[(last_page - 1) * per_page - 1]
+    cursor = KeysetPaginator(queryset, per_page).encode_cursor(anchor, "next")
+
+    url = reverse("profile")
+    return {
+        "offset_first": timed(lambda: client.get(url), repeat),
+        "offset_last": timed(lambda: client.get(url, {"page": last_page}), repeat),
+        "cursor_first": timed(lambda: client.get(url, {"cursor": ""}), repeat),
+        "cursor_last": timed(lambda: client.get(url, {"cursor": cursor}), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paginação do perfil: offset x cursor")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", default="bench_profile_pagination.json")
+    args = parser.parse_args()
+
+    setup_django()
+    results = {}
+    with test_database():
+        for size in args.sizes:
+            results[size] = measure(size, args.repeat)
+
+    print(f"{'livros':>8}{'offset 1ª':>12}{'offset últ.':>13}{'cursor 1ª':>12}{'cursor últ.':>13}  (ms)")
+    for size, row in results.items():
+        print(f"{size:>8}{row['offset_first'] * 1000:>12.2f}{row['offset_last'] * 1000:>13.2f}"
+              f"{row['cursor_first'] * 1000:>12.2f}{row['cursor_last'] * 1000:>13.2f}")
+    write_results(args.output, {"benchmark": "profile_pagination", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
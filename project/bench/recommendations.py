@@ -0,0 +1,129 @@
+# Recomendações "quem leu também leu" com 1 milhão de interações (UserBook) sintéticas: popularidade dos
+# livros em lei de potência, como num catálogo real. Mede o cálculo completo dos vizinhos (NumPy/SciPy
+# se instalados; o Python puro roda só numa amostra, com --python-sample interações) e a leitura feita
+# pelas páginas (similar_books e for_user) depois de gravar a tabela BookNeighbor.
+#
+#     cd project && python -m bench.recommendations --interactions 1000000 --books 50000
+import argparse
+import random
+import time
+
+from .common import percentiles, setup_django, test_database, write_results
+
+
+# (usuários, livros, pesos) sem pares repetidos; o livro de cada interação segue uma lei de potência
+def synthetic_interactions(count, users, books, exponent, rng, weights):
+    cumulative = []
+    total = 0.0
+    for rank in range(1, books + 1):
+        total += rank ** -exponent
+        cumulative.append(total)
+    statuses = list(weights)
+    seen = set()
+    columns = ([], [], [])
+    while len(seen) < count:
+        user = rng.randrange(users)
+        for book in rng.choices(range(books), cum_weights=cumulative, k=rng.randint(1, 40)):
+            if (user, book) not in seen and len(seen) < count:
+                seen.add((user, book))
+                columns[0].append(user)
+                columns[1].append(book)
+                columns[2].append(weights[rng.choice(statuses)])
+    return columns
+
+
+def compute(users, books, weights, config):
+    from core import recommendations
+
+    started = time.perf_counter()
+    rows = list(recommendations.compute_neighbors(users, books, weights, config["TOP_K"], config["MIN_COMMON"]))
+    return rows, time.perf_counter() - started
+
+
+def seed_neighbors(rows, books, users, readers):
+    from django.contrib.auth import get_user_model
+
+    from core.models import Book, BookNeighbor, UserBook
+
+    Book.objects.bulk_create([Book(google_book_id=f"bench-{i}", title=f"Livro {i}") for i in range(books)], batch_size=10000)
+    ids = dict(Book.objects.values_list("google_book_id", "id"))
+    BookNeighbor.objects.bulk_create(
+        (BookNeighbor(book_id=ids[f"bench-{a}"], neighbor_id=ids[f"bench-{b}"], score=score) for a, b, score in rows),
+        batch_size=10000,
+    )
+    User = get_user_model()
+    User.objects.bulk_create([User(username=f"bench-{i}") for i in range(users)], batch_size=10000)
+    user_ids = dict(User.objects.values_list("username", "id"))
+    UserBook.objects.bulk_create(
+        (UserBook(user_id=user_ids[f"bench-{user}"], book_id=ids[f"bench-{book}"]) for user, book in readers),
+        batch_size=10000,
+    )
+    return ids, user_ids
+
+
+def sample(fn, args):
+    samples = []
+    for arg in args:
+        started = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cálculo e leitura das recomendações")
+    parser.add_argument("--interactions", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--exponent", type=float, default=1.0, help="expoente da lei de potência da popularidade")
+    parser.add_argument("--python-sample", type=int, default=50000, help="interações usadas no cálculo em Python puro")
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_recommendations.json")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    from core import recommendations
+
+    config = settings.RECOMMENDATIONS
+    rng = random.Random(args.seed)
+    users, books, weights = synthetic_interactions(args.interactions, args.users, args.books, args.exponent, rng, config["WEIGHTS"])
+    results = {"engine": "numpy" if recommendations.np is not None else "python"}
+
+    np_module = recommendations.np
+    recommendations.np = None  # Python puro, numa amostra
+    try:
+        size = args.python_sample
+        _, results["python_sample_seconds"] = compute(users[:size], books[:size], weights[:size], config)
+    finally:
+        recommendations.np = np_module
+
+    if np_module is not None:
+        rows, results["numpy_seconds"] = compute(users, books, weights, config)
+    else:
+        rows, results["python_full_seconds"] = compute(users, books, weights, config)
+    results["pairs"] = len(rows)
+
+    with test_database():
+        _, user_ids = seed_neighbors(rows, args.books, args.users, list(zip(users, books))[:args.lookups * 20])
+        google_ids = [f"bench-{rng.randrange(args.books)}" for _ in range(args.lookups)]
+        results["similar_books"] = sample(recommendations.similar_books, google_ids)
+        readers = list(user_ids.values())
+        picked = [rng.choice(readers) for _ in range(args.lookups)]
+        results["for_user"] = sample(lambda user_id: list(recommendations.for_user(user_id)), picked)
+
+    print(f"{args.interactions} interações, {results['pairs']} pares (motor: {results['engine']})")
+    for name in ("numpy_seconds", "python_full_seconds", "python_sample_seconds"):
+        if name in results:
+            print(f"{name:<24}{results[name]:>10.2f} s")
+    print(f"{'leitura':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in ("similar_books", "for_user"):
+        row = results[name]
+        print(f"{name:<18}{row['p50'] * 1000:>10.3f}{row['p95'] * 1000:>10.3f}{row['p99'] * 1000:>10.3f}{row['max'] * 1000:>10.3f}")
+    write_results(args.output, {"benchmark": "recommendations", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Queries por requisição nas páginas mais usadas, antes e depois das sessões em cache (cached_db), do
+# usuário logado em cache (core.auth) e das mensagens em cookie. "antes" roda com as settings antigas
+# (sessões só no banco, ModelBackend); "depois", com as de produção com GOOGLE_BOOKS_CACHE_URL, em que
+# sessões, usuários e fragmentos ficam no cache compartilhado (aqui, LocMem: o benchmark roda num processo
+# só). Cada cenário é repetido e o resultado é a mediana de queries e de latência, já com os caches aquecidos.
+#
+#     cd project && python -m bench.request_queries --repeat 50
+import argparse
+import time
+
+from .common import percentiles, setup_django, test_database, write_results
+
+BEFORE = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+    "MESSAGE_STORAGE": "django.contrib.messages.storage.fallback.FallbackStorage",
+}
+AFTER = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+    "AUTHENTICATION_BACKENDS": ["core.auth.CachedModelBackend", "django.contrib.auth.backends.ModelBackend"],
+    "MESSAGE_STORAGE": "django.contrib.messages.storage.cookie.CookieStorage",
+}
+SHARED_CACHES = ("fragments", "sessions")  # Redis em produção
+PASSWORD = "bench-password-123"
+
+
+def seed(books):
+    from core.models import Book, CustomUser, UserBook
+
+    user = CustomUser.objects.create_user("bench", password=PASSWORD)
+    created = Book.objects.bulk_create([
+        Book(google_book_id=f"bench-{i}", title=f"Duna volume {i}", authors="Frank Herbert") for i in range(books)
+    ])
+    UserBook.objects.bulk_create([UserBook(user=user, book=book) for book in created[:books // 2]])
+    return user
+
+
+def scenarios(user):
+    from django.test import Client
+    from django.urls import reverse
+
+    from core.models import UserBook
+
+    anonymous = Client()
+    client = Client()
+    client.login(username=user.username, password=PASSWORD)
+    userbook = UserBook.objects.filter(user=user).first()
+    statuses = iter(["reading", "completed"] * 100000)
+
+    return {
+        "home_anonymous": lambda: anonymous.get(reverse("home")),
+        "home": lambda: client.get(reverse("home")),
+        "search_cached": lambda: client.get(reverse("search"), {"q": "duna"}),
+        "profile": lambda: client.get(reverse("profile")),
+        "update_status": lambda: client.post(reverse("update_status", args=[userbook.id]), {"status": next(statuses)}),
+    }
+
+
+def measure(user, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    results = {}
+    for name, request in scenarios(user).items():
+        request()  # aquece sessão, usuário e fragmentos
+        counts, samples = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            samples.append(time.perf_counter() - started)
+            counts.append(len(queries))
+        results[name] = {"queries": sorted(counts)[len(counts) // 2], "latency": percentiles(samples)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queries por requisição, antes e depois das sessões em cache")
+    parser.add_argument("--books", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", default="bench_request_queries.json")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.test.utils import override_settings
+
+    results = {}
+    with test_database():
+        user = seed(args.books)
+        with override_settings(**BEFORE):
+            results["before"] = measure(user, args.repeat)
+        shared = dict(settings.CACHES, **{
+            alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"bench-{alias}"}
+            for alias in SHARED_CACHES
+        })
+        with override_settings(CACHES=shared, **AFTER):
+            for alias in SHARED_CACHES:
+                caches[alias].clear()
+            results["after"] = measure(user, args.repeat)
+
+    print(f"{'cenário':<18}{'queries antes':>15}{'queries depois':>16}{'p50 antes ms':>14}{'p50 depois ms':>15}")
+    for name, before in results["before"].items():
+        after = results["after"][name]
+        print(f"{name:<18}{before['queries']:>15}{after['queries']:>16}"
+              f"{before['latency']['p50'] * 1000:>14.2f}{after['latency']['p50'] * 1000:>15.2f}")
+    write_results(args.output, {"benchmark": "request_queries", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
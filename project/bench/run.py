@@ -0,0 +1,242 @@
+# Benchmark dos caminhos mais usados (busca, detalhes, perfil, adicionar/alterar/remover livro), com um
+# Google Books falso local e um banco descartável populado com N usuários x M livros. A aplicação roda
+# em um servidor WSGI com threads dentro do próprio processo, e cada cenário é disparado com httpx
+# (requisições simultâneas). Os resultados vão para um JSON e podem ser comparados com um baseline
+# salvo antes: o comando sai com código 1 se algum cenário piorar além da tolerância.
+#
+#     cd project && python -m bench.run --users 20 --books 200 --requests 500 --concurrency 16
+#     cd project && python -m bench.run --save-baseline            # grava bench/baseline.json
+#     cd project && python -m bench.run --baseline bench/baseline.json --tolerance 0.2
+#
+# Roda sem navegador nem serviços externos; com as settings padrão usa o PostgreSQL configurado
+# (banco de testes test_bookly), ou o SQLite se DJANGO_SETTINGS_MODULE apontar para settings com SQLite.
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import secrets
+import subprocess
+import tempfile
+import threading
+from importlib import import_module
+from pathlib import Path
+
+from .common import PROJECT_DIR, drive_requests, print_table, setup_django, test_database, write_results
+
+SCENARIOS = ["search", "search_cached", "detail", "profile", "add", "update", "remove"]
+DEFAULT_BASELINE = PROJECT_DIR / "bench" / "baseline.json"
+WARMUP = 20  # requisições descartadas antes de cada cenário
+
+
+# Servidor WSGI da aplicação em uma thread deste processo, para usar o mesmo banco de testes
+class AppServer:
+    def __init__(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler, allow_reuse_address=False)
+        self.httpd.request_queue_size = 512
+        self.httpd.set_app(WSGIHandler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Sessão já autenticada para o usuário, sem passar pelo login (e pelo hash de senha)
+def session_cookie(user):
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session.session_key
+
+
+def seed(users, books_per_user, rng):
+    from core.models import Book, CustomUser, UserBook
+
+    statuses = [status for status, _ in UserBook.STATUS_CHOICES]
+    catalogue = Book.objects.bulk_create([
+        Book(google_book_id=f"seed-{i}", title=f"Livro {i}", authors=f"Autor {i % 97}", publisher="Editora")
+        for i in range(max(books_per_user * 2, 100))
+    ], batch_size=2000)
+    accounts = []
+    for number in range(users):
+        user = CustomUser(username=f"bench{number}", email=f"bench{number}@example.com")
+        user.set_unusable_password()
+        user.save()
+        UserBook.objects.bulk_create([
+            UserBook(user=user, book=book, status=rng.choice(statuses))
+            for book in rng.sample(catalogue, books_per_user)
+        ], batch_size=2000)
+        accounts.append({
+            "user": user,
+            "cookie": session_cookie(user),
+            "userbooks": list(UserBook.objects.filter(user=user).values_list("id", flat=True)),
+        })
+    return catalogue, accounts
+
+
+# request_for(i) de cada cenário: (método, URL, argumentos do httpx)
+def build_scenarios(base_url, catalogue, accounts, args, rng):
+    csrf = secrets.token_hex(16)  # 32 caracteres: o cookie e o cabeçalho precisam ser iguais
+
+    def auth(account, post=False):
+        headers = {"Cookie": f"sessionid={account['cookie']}; csrftoken={csrf}"}
+        if post:
+            headers["X-CSRFToken"] = csrf
+        return headers
+
+    def pick(i):
+        return accounts[i % len(accounts)]
+
+    # cada conta remove os próprios livros, do fim da lista, sem repetir
+    removable = {id(account): list(account["userbooks"]) for account in accounts}
+    statuses = ["plan", "reading", "completed", "dropped"]
+    hot_queries = [f"popular {n}" for n in range(args.hot_queries)]
+
+    return {
+        "search": lambda i: ("GET", f"{base_url}/search/?q=bench {rng.random():.12f}", {}),
+        "search_cached": lambda i: ("GET", f"{base_url}/search/?q={hot_queries[i % len(hot_queries)]}", {}),
+        "detail": lambda i: ("GET", f"{base_url}/book/{catalogue[i % len(catalogue)].google_book_id}/", {}),
+        "profile": lambda i: ("GET", f"{base_url}/profile/?page={1 + i % 3}", {"headers": auth(pick(i))}),
+        "add": lambda i: ("POST", f"{base_url}/add-book/", {
+            "headers": auth(pick(i), post=True),
+            "data": {"google_book_id": f"added-{i}", "title": f"Novo livro {i}", "authors": "Autor"},
+        }),
+        "update": lambda i: ("POST", f"{base_url}/update-status/{rng.choice(pick(i)['userbooks'])}/", {
+            "headers": auth(pick(i), post=True),
+            "data": {"status": statuses[i % len(statuses)]},
+        }),
+        "remove": lambda i: ("POST", f"{base_url}/remove-book/{removable[id(pick(i))].pop()}/", {
+            "headers": auth(pick(i), post=True),
+        }),
+    }
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# Cenários que pioraram além da tolerância (vazão menor ou p95/p99 maior) em relação ao baseline
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: vazão {before['throughput']:.1f} -> {result['throughput']:.1f} req/s")
+        for pct in ("p95", "p99"):
+            old, new = before["latency"][pct], result["latency"][pct]
+            if new > old * (1 + tolerance):
+                regressions.append(f"{name}: {pct} {old * 1000:.1f} -> {new * 1000:.1f} ms")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: erros {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos principais do Bookly")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--books", type=int, default=200, help="livros na lista de cada usuário")
+    parser.add_argument("--requests", type=int, default=500, help="requisições por cenário")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--latency", type=float, default=0.05, help="latência do Google Books falso, em segundos")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 503 do Google Books falso")
+    parser.add_argument("--total-items", type=int, default=105, help="resultados por busca no Google Books falso")
+    parser.add_argument("--hot-queries", type=int, default=10, help="buscas repetidas no cenário search_cached")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), help="grava o resultado como baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="piora aceita em relação ao baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    # a requisição i remove um livro da conta i % users, e o aquecimento e a medição contam i a partir de 0:
+    # cada conta precisa de livros para as duas rodadas
+    if "remove" in args.scenarios and math.ceil(WARMUP / args.users) + math.ceil(args.requests / args.users) > args.books:
+        parser.error("o cenário remove precisa de --books >= ceil(aquecimento / --users) + ceil(--requests / --users)")
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    from core.fakes import FakeGoogleBooksServer
+
+    rng = random.Random(args.seed)
+    if connection.vendor == "sqlite":
+        # o banco de testes em memória não aguenta escritas de várias threads: usa um arquivo temporário,
+        # e as escritas simultâneas esperam a trava do SQLite em vez de falhar
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+        connection.settings_dict.setdefault("OPTIONS", {}).update(timeout=30, transaction_mode="IMMEDIATE")
+
+    results = {}
+    with FakeGoogleBooksServer(latency=args.latency, error_rate=args.error_rate,
+                               total_items=args.total_items, seed=args.seed) as fake, test_database():
+        overrides = override_settings(
+            GOOGLE_BOOKS_API=dict(settings.GOOGLE_BOOKS_API, BASE_URL=fake.base_url),
+            GOOGLE_BOOKS_QUOTA=dict(settings.GOOGLE_BOOKS_QUOTA, ENABLED=False),  # mede a aplicação, não a cota
+            ALLOWED_HOSTS=["127.0.0.1", "localhost"],
+        )
+        with overrides, AppServer() as server:
+            catalogue, accounts = seed(args.users, args.books, rng)
+            scenarios = build_scenarios(server.base_url, catalogue, accounts, args, rng)
+            for name in args.scenarios:
+                request_for = scenarios[name]
+                asyncio.run(drive_requests(request_for, WARMUP, args.concurrency))
+                before = fake.request_count
+                results[name] = asyncio.run(drive_requests(request_for, args.requests, args.concurrency))
+                results[name]["upstream_requests"] = fake.request_count - before
+
+    print_table(results)
+    report = {"benchmark": "run", "params": vars(args), "machine": machine_info(), "results": results}
+    write_results(args.output, report)
+
+    if args.save_baseline:
+        write_results(args.save_baseline, report)
+        print(f"baseline gravado em {args.save_baseline}")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSÃO {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"sem regressões em relação a {args.baseline} (tolerância {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Latência do autocomplete (/search/suggest/) com um catálogo de 100 mil títulos: consulta direta ao
+# índice (sem e com o cache de prefixos) e a requisição completa pela view. Meta: p99 < 5 ms.
+#
+#     cd project && python -m bench.suggest --titles 100000 --queries 20000
+import argparse
+import random
+import time
+
+from .common import percentiles, setup_django, test_database, write_results
+
+WORDS = (
+    "amor guerra noite casa sombra mar vento tempo cidade rio jardim segredo livro viagem fogo pedra "
+    "lua sol memória sonho caminho ilha reino filho estrela silêncio história coração castelo floresta "
+    "the of and night house shadow war love time city river garden secret journey fire stone moon dream"
+).split()
+NAMES = "ana bruno carla diego elisa fabio gabriela heitor iris joao karen lucas marta nuno olga paulo".split()
+
+
+def seed_catalogue(count, rng):
+    from core.models import Book
+
+    batch = 10000
+    for start in range(0, count, batch):
+        Book.objects.bulk_create([
+            Book(
+                google_book_id=f"bench-{i}",
+                title=" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize() + f" {i}",
+                authors=f"{rng.choice(NAMES).title()} {rng.choice(NAMES).title()}",
+            )
+            for i in range(start, min(start + batch, count))
+        ])
+
+
+def random_prefixes(count, rng):
+    from core.models import Book
+
+    titles = list(Book.objects.values_list("title", flat=True)[:50000])
+    prefixes = []
+    for _ in range(count):
+        text = rng.choice(titles) if rng.random() < 0.8 else rng.choice(NAMES)
+        prefixes.append(text[:rng.randint(2, min(12, len(text)))])
+    return prefixes
+
+
+def sample(fn, prefixes):
+    samples = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        fn(prefix)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do autocomplete")
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_suggest.json")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.urls import reverse
+
+    from core.suggest import SuggestIndex
+
+    rng = random.Random(args.seed)
+    results = {}
+    with test_database():
+        seed_catalogue(args.titles, rng)
+        prefixes = random_prefixes(args.queries, rng)
+
+        started = time.perf_counter()
+        index = SuggestIndex(cache_size=0)  # sem cache de prefixos: mede só a busca no array
+        index.suggest("a")
+        results["build_seconds"] = time.perf_counter() - started
+        results["index_uncached"] = sample(index.suggest, prefixes)
+
+        cached = SuggestIndex()
+        cached.suggest("a")
+        results["index_cached"] = sample(cached.suggest, prefixes)
+
+        client = Client()
+        url = reverse("search_suggest")
+        client.get(url, {"q": "aa"})  # carrega o índice compartilhado antes de medir
+        results["view"] = sample(lambda prefix: client.get(url, {"q": prefix}), prefixes)
+
+    print(f"{args.titles} títulos, índice montado em {results['build_seconds']:.2f} s")
+    print(f"{'cenário':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in ("index_uncached", "index_cached", "view"):
+        row = results[name]
+        print(f"{name:<18}{row['p50'] * 1000:>10.3f}{row['p95'] * 1000:>10.3f}{row['p99'] * 1000:>10.3f}{row['max'] * 1000:>10.3f}")
+    write_results(args.output, {"benchmark": "suggest", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import json
+import math
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.text import compress_string
+from django.views import View
+
+from . import fragments, library, replicas
+from .models import UserBook
+from .pagination import InvalidCursor, KeysetPaginator
+from .suggest import suggest_index
+from .views import BookSearchView
+
+try:
+    import brotli
+except ImportError:  # sem o pacote brotli, só gzip
+    brotli = None
+
+API_VERSION = 1
+
+
+# API JSON (/api/v1/) da lista de leitura e da busca, para apps e clientes JavaScript.
+# Autenticação pela sessão do site; POST/PATCH/DELETE levam o token CSRF no cabeçalho X-CSRFToken.
+#   - ?fields=id,title,status: só os campos pedidos (e só as colunas deles no SELECT);
+#   - paginação por cursor (?cursor= com o valor de "next"/"previous", ?limit=);
+#   - ETag forte nas leituras, tirado da versão da lista do usuário (core.fragments): com If-None-Match,
+#     um cliente que consulta a lista periodicamente recebe 304 sem nenhuma query além da sessão (só com o
+#     cache compartilhado: sem ele, a versão muda a cada leitura e a resposta é sempre completa);
+#   - respostas comprimidas com brotli ou gzip, conforme o Accept-Encoding.
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# Campos de um livro da lista: nome -> (colunas lidas do banco, valor)
+USERBOOK_FIELDS = {
+    "id": ((), lambda userbook, request: userbook.id),
+    "status": (("status",), lambda userbook, request: userbook.status),
+    "added_at": ((), lambda userbook, request: userbook.added_at.isoformat()),
+    "book_id": ((), lambda userbook, request: userbook.book_id),
+    "google_book_id": (("book__google_book_id",), lambda userbook, request: userbook.book.google_book_id),
+    "title": (("book__title",), lambda userbook, request: userbook.book.title),
+    "authors": (("book__authors",), lambda userbook, request: userbook.book.authors),
+    "publisher": (("book__publisher",), lambda userbook, request: userbook.book.publisher),
+    "published_date": (("book__published_date",), lambda userbook, request: userbook.book.published_date),
+    "cover": (("book__cover", "book__thumbnail"), lambda userbook, request: _absolute(request, userbook.book.image_url)),
+}
+
+SEARCH_FIELDS = ["google_book_id", "title", "authors", "publisher", "published_date", "thumbnail"]
+
+_encoding_suffix = re.compile(r'-(?:br|gzip)"$')
+
+
+def _absolute(request, url):
+    return request.build_absolute_uri(url) if url else None
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={"separators": (",", ":"), "ensure_ascii": False})
+
+
+def error_response(message, status):
+    return json_response({"error": message}, status=status)
+
+
+def read_json(request):
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        raise ApiError("JSON inválido")
+    if not isinstance(payload, dict):
+        raise ApiError("o corpo deve ser um objeto JSON")
+    return payload
+
+
+def selected_fields(request, available):
+    value = request.GET.get("fields")
+    if not value:
+        return list(available)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f"campos desconhecidos: {', '.join(unknown)}")
+    return fields
+
+
+def page_size(request):
+    config = settings.API
+    try:
+        limit = int(request.GET.get("limit", config["PAGE_SIZE"]))
+    except ValueError:
+        raise ApiError('"limit" deve ser um número')
+    return max(1, min(limit, config["MAX_PAGE_SIZE"]))
+
+
+def make_etag(*parts):
+    return '"%s"' % fragments.digest([API_VERSION, *parts])[:32]
+
+
+# ETag do If-None-Match que corresponde a `etag` (em qualquer codificação), ou None. A comparação é a
+# fraca, como manda o HTTP para o If-None-Match
+def matching_etag(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return None
+    for tag in parse_etags(header):
+        if tag == "*" or _encoding_suffix.sub('"', tag.removeprefix("W/")) == etag:
+            return tag
+    return None
+
+
+# Resposta de uma leitura com ETag: 304, sem montar o corpo, se o cliente já tem esta versão
+def conditional(request, etag, build, **cache_control):
+    matched = matching_etag(request, etag)
+    response = HttpResponseNotModified() if matched else build()
+    response["ETag"] = etag if matched in (None, "*") else matched
+    patch_cache_control(response, private=True, **cache_control)
+    return response
+
+
+# Comprime a resposta conforme o Accept-Encoding. Cada codificação é uma representação diferente, então
+# o ETag forte ganha um sufixo (-br, -gzip); matching_etag o ignora ao comparar
+def compress(request, response):
+    patch_vary_headers(response, ("Accept-Encoding",))
+    if response.streaming or response.has_header("Content-Encoding"):
+        return response
+    if len(response.content) < settings.API["COMPRESS_MIN_SIZE"]:
+        return response
+    accepted = request.headers.get("Accept-Encoding", "")
+    if brotli is not None and re.search(r"\bbr\b", accepted):
+        encoding, content = "br", brotli.compress(response.content, quality=5)
+    elif re.search(r"\bgzip\b", accepted):
+        encoding, content = "gzip", compress_string(response.content)
+    else:
+        return response
+    if len(content) >= len(response.content):
+        return response
+    response.content = content
+    response["Content-Length"] = str(len(content))
+    response["Content-Encoding"] = encoding
+    if response.has_header("ETag"):
+        response["ETag"] = response["ETag"][:-1] + f'-{encoding}"'
+    return response
+
+
+class ApiView(View):
+    login_required = True
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.login_required and not request.user.is_authenticated:
+            response = error_response("autenticação necessária", 401)
+        else:
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            except ApiError as exc:
+                response = error_response(str(exc), exc.status)
+            except Http404:
+                response = error_response("não encontrado", 404)
+        return compress(request, response)
+
+
+# Livros da lista do usuário: no SELECT, só as colunas dos campos pedidos
+class UserBookApiMixin:
+    def get_queryset(self, fields):
+        columns = {"id", "added_at", "book"}
+        for name in fields:
+            columns.update(USERBOOK_FIELDS[name][0])
+        queryset = UserBook.objects.filter(user=self.request.user)
+        if any(column.startswith("book__") for column in columns):
+            queryset = queryset.select_related("book")
+        return queryset.only(*columns)
+
+    def serialize(self, userbook, fields):
+        return {name: USERBOOK_FIELDS[name][1](userbook, self.request) for name in fields}
+
+    def list_etag(self, *parts):
+        user_id = self.request.user.id
+        return make_etag(user_id, fragments.list_version(user_id), sorted(self.request.GET.lists()), *parts)
+
+
+# GET /api/v1/books/ (?status=, ?fields=, ?cursor=, ?limit=): lista do usuário, mais recentes primeiro
+# POST /api/v1/books/ {"google_book_id": ..., "title": ..., "authors": ...}: adiciona um livro
+class UserBooksApiView(UserBookApiMixin, ApiView):
+    def get(self, request, *args, **kwargs):
+        fields = selected_fields(request, USERBOOK_FIELDS)
+        return conditional(request, self.list_etag(), lambda: json_response(self.list_data(fields)), no_cache=True)
+
+    def list_data(self, fields):
+        queryset = self.get_queryset(fields).using(replicas.read_alias(self.request.user.id))
+        status = self.request.GET.get("status")
+        if status:
+            if status not in dict(UserBook.STATUS_CHOICES):
+                raise ApiError("status inválido")
+            queryset = queryset.filter(status=status)
+        paginator = KeysetPaginator(queryset, page_size(self.request), ordering=("-added_at", "-id"))
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            raise ApiError("cursor inválido")
+        return {
+            "results": [self.serialize(userbook, fields) for userbook in page],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        }
+
+    def post(self, request, *args, **kwargs):
+        fields = selected_fields(request, USERBOOK_FIELDS)
+        payload = read_json(request)
+        google_book_id = str(payload.get("google_book_id") or "")
+        if not google_book_id or not payload.get("title"):
+            raise ApiError('"google_book_id" e "title" são obrigatórios')
+        userbook, created, added = library.add_book(request.user, google_book_id, library.book_fields(payload))
+        userbook = self.get_queryset(fields).get(pk=userbook.pk)
+        response = json_response(self.serialize(userbook, fields), status=201 if added else 200)
+        response["Location"] = reverse("api_user_book", args=[userbook.pk])
+        return response
+
+
+# GET, PATCH {"status": ...} e DELETE /api/v1/books/<id>/: um livro da lista
+class UserBookApiView(UserBookApiMixin, ApiView):
+    def get(self, request, userbook_id, *args, **kwargs):
+        fields = selected_fields(request, USERBOOK_FIELDS)
+        build = lambda: json_response(self.serialize(self.get_object(userbook_id, fields), fields))
+        return conditional(request, self.list_etag(userbook_id), build, no_cache=True)
+
+    def patch(self, request, userbook_id, *args, **kwargs):
+        fields = selected_fields(request, USERBOOK_FIELDS)
+        status = read_json(request).get("status")
+        if status not in dict(UserBook.STATUS_CHOICES):
+            raise ApiError("status inválido")
+        library.update_status(request.user, userbook_id, status)
+        return json_response(self.serialize(self.get_object(userbook_id, fields), fields))
+
+    def delete(self, request, userbook_id, *args, **kwargs):
+        library.remove_book(request.user, userbook_id)
+        return HttpResponse(status=204)
+
+    def get_object(self, userbook_id, fields):
+        try:
+            return self.get_queryset(fields).get(pk=userbook_id)
+        except UserBook.DoesNotExist:
+            raise Http404
+
+
+# GET /api/v1/search/?q=duna&page=2&fields=title,authors: mesma busca da página (catálogo local + Google).
+# Aberta a visitantes, como a página de busca
+class SearchApiView(ApiView):
+    login_required = False
+
+    def get(self, request, *args, **kwargs):
+        fields = selected_fields(request, SEARCH_FIELDS)
+        search = BookSearchView(request=request)
+        query = request.GET.get("q", "").strip()
+        page = search.get_page()
+        results, total_items, unavailable = search.load_results(query, page) if query else ([], 0, False)
+        if query and page == 1:
+            suggest_index.record_query(query)
+        if unavailable:
+            return error_response("busca indisponível no momento", 503)
+
+        data = {
+            "query": query,
+            "page": page,
+            "total_pages": math.ceil(min(total_items, search.MAX_RESULTS_API) / search.RESULTS_PER_PAGE),
+            "results": [{name: result[name] for name in fields} for result in results],
+        }
+        return conditional(request, make_etag(data), lambda: json_response(data), max_age=settings.API["SEARCH_MAX_AGE"])
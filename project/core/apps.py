@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # registram os receivers: post_save do índice de busca local, estatísticas dos usuários novos,
+        # versões das listas para o cache de fragmentos, autores dos livros, usuários em cache e medição
+        # das conexões do banco
+        from . import auth, fragments, instrumentation, reading_stats, search_index, taxonomy  # noqa: F401
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+
+
+# Usuário logado lido do cache (AUTH_USER_CACHE["ALIAS"]) em vez de um SELECT em core_customuser a cada
+# requisição. A cópia em cache sai quando o usuário é salvo ou apagado: troca de senha, last_login do
+# login, edição no admin. A senha também invalida as sessões antigas pelo hash de sessão, que o Django
+# confere com o usuário daqui. Permissões e grupos não ficam em cache (o ModelBackend os lê quando pedidos)
+def _backend():
+    return caches[settings.AUTH_USER_CACHE["ALIAS"]]
+
+
+def _key(user_id):
+    return f"auth-user:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = _backend().get(_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                _backend().set(_key(user_id), user, settings.AUTH_USER_CACHE["TIMEOUT"])
+        return user
+
+    async def aget_user(self, user_id):
+        user = await _backend().aget(_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await _backend().aset(_key(user_id), user, settings.AUTH_USER_CACHE["TIMEOUT"])
+        return user
+
+
+# Sai do cache na hora e de novo depois do commit: uma requisição simultânea pode ter guardado a linha
+# antiga antes de a transação terminar
+def forget_user(user_id):
+    _backend().delete(_key(user_id))
+    transaction.on_commit(lambda: _backend().delete(_key(user_id)))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def _user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
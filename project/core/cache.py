@@ -0,0 +1,193 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Cache de respostas da API do Google Books.
+# Funciona em duas camadas: um LRU em memória (limitado e com TTL) na frente do
+# backend de cache do Django configurado em settings (locmem em desenvolvimento,
+# Redis/Memcached compartilhado entre os workers em produção).
+# O backend guarda (expira_em, valor), com expira_em pelo relógio de parede: um worker que acha a resposta
+# lá só a mantém no LRU local pelo tempo que falta, e não por um TTL inteiro de novo
+class ResponseCache:
+    def __init__(self, alias, timeout, max_entries, prefix):
+        self.alias = alias
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self._local = OrderedDict()  # chave -> (expira_em, valor), da menos para a mais recente
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "local_hits": 0, "misses": 0, "evictions": 0, "sets": 0}
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    # Normaliza os parâmetros da busca para que "Harry  Potter" e "harry potter" caiam na mesma chave
+    def make_key(self, *parts):
+        normalized = []
+        for part in parts:
+            if isinstance(part, str):
+                part = " ".join(part.lower().split())
+            normalized.append(str(part))
+        digest = hashlib.sha1("|".join(normalized).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def get(self, key):
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        return self._record_backend_lookup(key, self.backend.get(key))
+
+    def _get_local(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)  # marca como usado recentemente
+                    self._stats["hits"] += 1
+                    self._stats["local_hits"] += 1
+                    return value
+                del self._local[key]
+        return None
+
+    def _record_backend_lookup(self, key, entry):
+        value, remaining = self._unpack(entry)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+        self._remember(key, value, remaining)
+        return value
+
+    # (valor, segundos restantes) de uma entrada do backend; entradas vencidas ou em outro formato são ignoradas
+    @staticmethod
+    def _unpack(entry):
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            return None, 0
+        expires_at, value = entry
+        remaining = expires_at - time.time()
+        return (value, remaining) if remaining > 0 else (None, 0)
+
+    def _pack(self, value):
+        return (time.time() + self.timeout, value)
+
+    # Versões assíncronas para as views ASGI: o LRU local é consultado direto, o backend compartilhado via aget/aset
+    async def aget(self, key):
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        value = await self.backend.aget(key)
+        return self._record_backend_lookup(key, value)
+
+    async def aset(self, key, value):
+        await self.backend.aset(key, self._pack(value), self.timeout)
+        self._remember(key, value, self.timeout)
+        with self._lock:
+            self._stats["sets"] += 1
+
+    async def aget_or_set(self, key, fetch):
+        value = await self.aget(key)
+        if value is None:
+            value = await fetch()
+            if value is not None:
+                await self.aset(key, value)
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, self._pack(value), self.timeout)
+        self._remember(key, value, self.timeout)
+        with self._lock:
+            self._stats["sets"] += 1
+
+    def delete(self, key):
+        self.backend.delete(key)
+        with self._lock:
+            self._local.pop(key, None)
+
+    # Retorna o valor em cache ou chama fetch(); valores None não são guardados (ex.: erro na API)
+    def get_or_set(self, key, fetch):
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._local.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._local)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, value, ttl):
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)  # descarta o item usado há mais tempo
+                self._stats["evictions"] += 1
+
+
+# Executa buscas antecipadas (ex.: as outras páginas de uma pesquisa) em um pool de threads.
+# Cada chave tem no máximo uma busca em andamento; quem pedir a mesma chave espera por ela
+class Prefetcher:
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._inflight = {}  # chave -> Future
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(fn)
+            self._inflight[key] = future
+        # fora do lock: se a busca já terminou, o callback roda aqui mesmo e precisa do lock em _forget
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    # Busca em andamento para a chave, ou None
+    def inflight(self, key):
+        with self._lock:
+            return self._inflight.get(key)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:  # a chave pode já ter uma busca nova
+                del self._inflight[key]
+
+
+def _build_cache(prefix):
+    config = settings.GOOGLE_BOOKS_CACHE
+    return ResponseCache(
+        alias=config["ALIAS"],
+        timeout=config["TIMEOUT"],
+        max_entries=config["MAX_ENTRIES"],
+        prefix=prefix,
+    )
+
+
+# Instâncias compartilhadas usadas pelas views de busca
+search_cache = _build_cache("gb-search")
+# Volumes de livros que não estão no banco (página de detalhes, core.hydration); os salvos ficam em BookVolume
+volume_cache = _build_cache("gb-volume")
+search_prefetcher = Prefetcher(max_workers=settings.GOOGLE_BOOKS_CACHE["PREFETCH_WORKERS"])
@@ -0,0 +1,92 @@
+import hashlib
+import io
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import Book
+
+try:
+    from PIL import Image
+except ImportError:  # sem Pillow, a capa é guardada como veio do Google (já é um JPEG pequeno)
+    Image = None
+
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+
+
+class CoverError(Exception):
+    pass
+
+
+_session = requests.Session()
+
+
+# O thumbnail pode ter vindo do usuário (formulário, lote, API JSON): o servidor só baixa imagens dos hosts
+# do Google (COVERS["ALLOWED_HOSTS"]; ".dominio" vale para os subdomínios), para não fazer requisições a
+# hosts internos em nome de quem cadastrou o livro
+def is_allowed(url):
+    config = settings.COVERS
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in config["ALLOWED_SCHEMES"] or not host:
+        return False
+    return any(host == allowed or (allowed.startswith(".") and host.endswith(allowed)) for allowed in config["ALLOWED_HOSTS"])
+
+
+# Baixa a imagem (limitada a COVERS["MAX_BYTES"]). Levanta CoverError se o endereço não for permitido ou se
+# não for uma imagem; erros de rede (requests.RequestException) sobem para o job tentar de novo
+def download(url):
+    config = settings.COVERS
+    # o Google devolve http:// nos thumbnails, mas serve as mesmas imagens por https
+    url = url.replace("http://books.google.com/", "https://books.google.com/")
+    if not is_allowed(url):
+        raise CoverError(f"endereço de capa não permitido: {url}")
+    # sem seguir redirecionamentos: o destino não passou por is_allowed
+    with _session.get(url, timeout=config["TIMEOUT"], stream=True, allow_redirects=False) as response:
+        if response.is_redirect:
+            raise CoverError("a capa redireciona para outro endereço")
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in EXTENSIONS:
+            raise CoverError(f"a capa não é uma imagem ({content_type or 'sem Content-Type'})")
+        content = b""
+        for chunk in response.iter_content(64 * 1024):
+            content += chunk
+            if len(content) > config["MAX_BYTES"]:
+                raise CoverError("capa grande demais")
+    return content, content_type
+
+
+# Reduz para caber em COVERS["MAX_SIZE"] e recomprime em JPEG progressivo. Retorna (bytes, extensão)
+def compress(content, content_type):
+    if Image is None:
+        return content, EXTENSIONS[content_type]
+    config = settings.COVERS
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.thumbnail(config["MAX_SIZE"])
+            output = io.BytesIO()
+            image.convert("RGB").save(output, "JPEG", quality=config["QUALITY"], optimize=True, progressive=True)
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise CoverError(f"imagem inválida: {exc}") from exc
+    return output.getvalue(), "jpg"
+
+
+# Baixa, reduz e guarda a capa do livro em MEDIA_ROOT/covers/<id>-<hash>.<ext>. Como o nome muda
+# junto com o conteúdo, a URL da capa pode ser guardada pelo navegador por tempo indeterminado
+def mirror_cover(book):
+    if not book.thumbnail:
+        return None
+    content, extension = compress(*download(book.thumbnail))
+    version = hashlib.sha1(content).hexdigest()[:12]
+    old = book.cover.name if book.cover else None
+    if old and old.endswith(f"-{version}.{extension}"):
+        return book.cover  # mesma imagem
+    book.cover.save(f"{book.pk}-{version}.{extension}", ContentFile(content), save=False)
+    Book.objects.filter(pk=book.pk).update(cover=book.cover.name, updated_at=timezone.now())
+    if old:
+        book.cover.storage.delete(old)
+    return book.cover
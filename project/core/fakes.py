@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# PNG de 1x1 pixel servido como capa dos livros
+COVER_PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512  # aguenta as rajadas de conexões dos benchmarks
+
+
+# Servidor local que imita a API do Google Books (/books/v1/volumes e /books/v1/volumes/<id>) e as
+# imagens de capa (/books/v1/covers/<id>).
+# Usado nos testes e nos benchmarks, com latência, taxa de erro e tamanho dos resultados configuráveis.
+#
+#     with FakeGoogleBooksServer(latency=0.05) as fake:
+#         client = GoogleBooksClient(base_url=fake.base_url)
+class FakeGoogleBooksServer:
+    def __init__(self, latency=0.0, error_rate=0.0, total_items=105, error_status=503, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.total_items = total_items
+        self.error_status = error_status
+        self.fail_next = 0  # força as próximas N respostas a falharem
+        self.requests = []  # caminhos recebidos, para os testes conferirem as chamadas
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/books/v1"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # mantém a conexão aberta (keep-alive), como a API real
+            disable_nagle_algorithm = True  # cabeçalho e corpo saem em escritas separadas
+
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server(("127.0.0.1", 0), Handler)
+        self._covers_url = f"{self.base_url}/covers"  # guardado: respostas ainda em andamento depois do stop()
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def request_count(self):
+        with self._lock:
+            return len(self.requests)
+
+    def _should_fail(self):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+            return self._random.random() < self.error_rate
+
+    def _handle(self, handler):
+        url = urlparse(handler.path)
+        with self._lock:
+            self.requests.append(url.path)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self._should_fail():
+            return self._send(handler, self.error_status, {"error": {"code": self.error_status}})
+
+        params = parse_qs(url.query)
+        path = url.path.rstrip("/")
+        if path == "/books/v1/volumes":
+            start = int(params.get("startIndex", ["0"])[0])
+            count = int(params.get("maxResults", ["10"])[0])
+            query = params.get("q", [""])[0]
+            prefix = hashlib.md5(query.encode("utf-8")).hexdigest()[:6]  # buscas diferentes, livros diferentes
+            items = [self.volume(f"{prefix}-{i}", query) for i in range(start, min(start + count, self.total_items))]
+            return self._send(handler, 200, {"kind": "books#volumes", "totalItems": self.total_items, "items": items})
+        if path.startswith("/books/v1/volumes/"):
+            google_book_id = path.rsplit("/", 1)[1]
+            if google_book_id.startswith("missing"):
+                return self._send(handler, 404, {"error": {"code": 404}})
+            return self._send(handler, 200, self.volume(google_book_id))
+        if path.startswith("/books/v1/covers/"):
+            return self._send_bytes(handler, 200, COVER_PNG, "image/png")
+        return self._send(handler, 404, {"error": {"code": 404}})
+
+    def volume(self, google_book_id, query=""):
+        title = query.split(":", 1)[-1] or "Livro"
+        return {
+            "kind": "books#volume",
+            "id": google_book_id,
+            "volumeInfo": {
+                "title": f"{title} {google_book_id}",
+                "subtitle": "Subtítulo",
+                "authors": ["Autor Fictício"],
+                "publisher": "Editora Fictícia",
+                "publishedDate": "2020",
+                "description": "Descrição de teste.",
+                "pageCount": 200,
+                "categories": ["Fiction"],
+                "language": "pt",
+                "previewLink": f"https://books.google.com/books?id={google_book_id}",
+                "imageLinks": {"thumbnail": f"{self._covers_url}/{google_book_id}"},
+            },
+        }
+
+    def _send(self, handler, status, payload):
+        self._send_bytes(handler, status, json.dumps(payload).encode("utf-8"), "application/json; charset=UTF-8")
+
+    def _send_bytes(self, handler, status, body, content_type):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        try:
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # o cliente desistiu antes (ex.: timeout de leitura)
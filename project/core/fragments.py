@@ -0,0 +1,101 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.middleware.csrf import get_token
+from django.utils.crypto import salted_hmac
+from django.utils.functional import lazy
+
+from . import replicas
+from .models import UserBook
+
+
+# Cache de fragmentos dos templates ({% cache %} do Django, no alias FRAGMENT_CACHE["ALIAS"]).
+# As chaves não expiram por tempo para ficar certas: levam uma versão que muda quando o conteúdo muda.
+#   - list_version: versão da lista de cada usuário, trocada a cada livro adicionado, alterado ou removido;
+#   - csrf_version: os fragmentos têm formulários com {% csrf_token %}, que só vale para o segredo CSRF
+#     da sessão; a chave leva um hash desse segredo, e um login novo (segredo novo) não reaproveita HTML antigo;
+#   - digest: hash do conteúdo, para dados que não vêm do banco (resultados de busca).
+def backend():
+    return caches[settings.FRAGMENT_CACHE["ALIAS"]]
+
+
+# O cache de fragmentos guarda alguma coisa (settings: DummyCache sem um cache compartilhado entre os workers).
+# Quem só vale a pena com o cache (contagens dos filtros, mapa da lista) usa isto para não recalcular tudo
+# a cada requisição
+def enabled():
+    return not isinstance(backend(), DummyCache)
+
+
+def _list_key(user_id):
+    return f"list-version:{user_id}"
+
+
+def list_version(user_id):
+    version = backend().get(_list_key(user_id))
+    if version is None:
+        # versão inicial pelo relógio: se a chave sumir do cache (LRU, reinício do Redis), a lista não
+        # volta para um número já usado por fragmentos antigos
+        version = time.time_ns()
+        if not backend().add(_list_key(user_id), version, None):
+            version = backend().get(_list_key(user_id), version)
+    return version
+
+
+def bump_list_version(user_id):
+    try:
+        backend().incr(_list_key(user_id))
+    except ValueError:
+        backend().add(_list_key(user_id), time.time_ns(), None)
+
+
+# A lista do usuário mudou. A versão troca na hora e de novo depois do commit: uma requisição
+# simultânea pode ter guardado a lista antiga com a versão nova antes de a transação terminar.
+# As leituras do usuário passam a ser feitas no default até as réplicas receberem a mudança
+def list_changed(user_id):
+    bump_list_version(user_id)
+    replicas.pin(user_id)
+    transaction.on_commit(lambda: bump_list_version(user_id))
+
+
+# Dados de um livro mudaram (capa, editora...): troca a versão da lista de quem tem o livro
+def book_changed(book_id):
+    for user_id in UserBook.objects.filter(book_id=book_id).values_list("user_id", flat=True).iterator():
+        list_changed(user_id)
+
+
+def csrf_version(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return "anon"  # sem formulários com token
+    get_token(request)  # garante o segredo (e o cookie) na primeira visita
+    return salted_hmac("core.fragments", request.META["CSRF_COOKIE"]).hexdigest()[:16]
+
+
+def digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# Variáveis usadas pelos {% cache %} dos templates. csrf_version só é calculada na renderização: nas views
+# assíncronas o contexto é montado dentro do event loop, onde request.user não pode ir ao banco
+def template_context(request, **versions):
+    return {
+        "fragment_cache": settings.FRAGMENT_CACHE["ALIAS"],
+        "fragment_timeout": settings.FRAGMENT_CACHE["TIMEOUT"],
+        "csrf_version": lazy(csrf_version, str)(request),
+        **versions,
+    }
+
+
+# Livros adicionados ou alterados um por vez (views, admin, shell). As operações em lote e as remoções
+# chamam list_changed direto: com um receiver de post_delete, QuerySet.delete() deixaria de ser um único DELETE
+@receiver(post_save, sender=UserBook)
+def _userbook_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        list_changed(instance.user_id)
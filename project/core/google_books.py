@@ -0,0 +1,423 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import instrumentation
+from .singleflight import SingleFlight
+
+
+# Erro genérico da API do Google Books
+class GoogleBooksError(Exception):
+    pass
+
+
+# A API está fora do ar (circuito aberto ou tentativas esgotadas): a página deve ser exibida em modo degradado
+class UpstreamUnavailable(GoogleBooksError):
+    pass
+
+
+# Disjuntor: depois de `threshold` falhas seguidas, recusa as chamadas por `reset_timeout` segundos.
+# Passado esse tempo, deixa uma chamada de teste passar (meio-aberto) para decidir se fecha de novo
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    # Estado em que a chamada foi admitida (CLOSED, ou HALF_OPEN para a chamada de teste), ou None se recusada
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return state
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True  # só uma requisição de teste por vez
+                return state
+            return None
+
+    # A chamada de teste desistiu antes de sair (ex.: sem cota): a próxima chamada pode testar a API
+    def cancel_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+# Latência das chamadas por endpoint, com uma janela das últimas medições para os percentis
+class LatencyStats:
+    def __init__(self, window=1000):
+        self.window = window
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, error=False):
+        with self._lock:
+            data = self._data.setdefault(endpoint, {
+                "count": 0, "errors": 0, "total": 0.0, "recent": deque(maxlen=self.window),
+            })
+            data["count"] += 1
+            data["total"] += seconds
+            data["recent"].append(seconds)
+            if error:
+                data["errors"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, data in self._data.items():
+                recent = sorted(data["recent"])
+                result[endpoint] = {
+                    "count": data["count"],
+                    "errors": data["errors"],
+                    "avg": data["total"] / data["count"] if data["count"] else 0.0,
+                    "p50": percentile(recent, 50),
+                    "p95": percentile(recent, 95),
+                    "p99": percentile(recent, 99),
+                }
+            return result
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Parte comum dos clientes síncrono e assíncrono: configuração, backoff, disjuntor e métricas
+class BaseGoogleBooksClient:
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url, api_key=None, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff=0.3, pool_maxsize=20,
+                 breaker_threshold=5, breaker_reset_timeout=30, breaker=None, latency=None, singleflight=None, quota=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_maxsize = pool_maxsize
+        # o disjuntor e as métricas podem ser compartilhados entre clientes do mesmo processo
+        self.breaker = breaker or CircuitBreaker(breaker_threshold, breaker_reset_timeout)
+        self.latency = latency or LatencyStats()
+        # chamadas idênticas simultâneas (mesmo path e parâmetros) viram uma só
+        self.singleflight = singleflight or SingleFlight()
+        self.quota = quota  # core.quota.QuotaManager; None = sem controle de cota
+
+    @staticmethod
+    def search_params(query, start_index, max_results, print_type):
+        return {
+            "q": query,
+            "startIndex": start_index,
+            "maxResults": max_results,
+            "printType": print_type,
+        }
+
+    # Passa pelo disjuntor antes de gastar cota: chamadas recusadas não consomem a cota diária.
+    # Retorna True se a chamada é a de teste do meio-aberto
+    def _admit(self):
+        state = self.breaker.allow()
+        if state is None:
+            raise UpstreamUnavailable("Google Books indisponível (circuito aberto)")
+        return state == CircuitBreaker.HALF_OPEN
+
+    # A cota acabou depois de a chamada ser admitida: sem devolver a chamada de teste, o circuito ficaria
+    # meio-aberto para sempre
+    def _quota_refused(self, probe):
+        if probe:
+            self.breaker.cancel_probe()
+
+    def _prepare(self, params):
+        params = dict(params or {})
+        if self.api_key:
+            params["key"] = self.api_key
+        return params
+
+    def _give_up(self, error):
+        self.breaker.record_failure()
+        return UpstreamUnavailable(str(error))
+
+    # Backoff exponencial com "full jitter", para os workers não tentarem todos ao mesmo tempo
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    # Latência por endpoint e, se estiver dentro de uma requisição, no Server-Timing dela
+    def _record(self, endpoint, started, error=False):
+        seconds = time.perf_counter() - started
+        self.latency.record(endpoint, seconds, error=error)
+        instrumentation.record("upstream", seconds)
+
+    def flight_key(self, path, params):
+        return self.singleflight.make_key(self.base_url, path, sorted((params or {}).items()))
+
+    def stats(self):
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "latency": self.latency.snapshot(),
+            "singleflight": self.singleflight.stats(),
+            "quota": self.quota.stats() if self.quota is not None else None,
+        }
+
+
+# Cliente único da API do Google Books: sessão com pool de conexões keep-alive, timeouts,
+# novas tentativas com backoff em 429/5xx e disjuntor para falhar rápido quando a API cai
+class GoogleBooksClient(BaseGoogleBooksClient):
+    def __init__(self, base_url, **options):
+        super().__init__(base_url, **options)
+        self.session = requests.Session()
+        # pool_block=True limita as conexões simultâneas por host a pool_maxsize
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # Busca uma página de volumes. Retorna o JSON, ou None se a API recusar a busca (4xx)
+    def search(self, query, start_index=0, max_results=20, print_type="books"):
+        params = self.search_params(query, start_index, max_results, print_type)
+        return self.get_json("/volumes", params, endpoint="search")
+
+    # Volume completo pelo id. Retorna None se o livro não existir
+    def volume(self, google_book_id):
+        return self.get_json(f"/volumes/{google_book_id}", endpoint="volume")
+
+    # Requisições iguais em andamento (neste ou em outro worker) são respondidas por uma só chamada
+    def get_json(self, path, params=None, endpoint="other"):
+        return self.singleflight.do(self.flight_key(path, params), lambda: self._get_json(path, params, endpoint))
+
+    def _get_json(self, path, params, endpoint):
+        response = self.request(path, params, endpoint)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def request(self, path, params=None, endpoint="other"):
+        probe = self._admit()
+        if self.quota is not None:
+            try:
+                self.quota.acquire()  # cada tentativa gasta cota; levanta QuotaExceeded
+            except UpstreamUnavailable:
+                self._quota_refused(probe)
+                raise
+        params = self._prepare(params)
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            if attempt and self.quota is not None:
+                try:
+                    self.quota.acquire()
+                except UpstreamUnavailable:
+                    break  # sem cota para tentar de novo: desiste com o último erro da API
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=(self.connect_timeout, self.read_timeout))
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self._record(endpoint, started, error=True)
+                error = exc
+            else:
+                retryable = response.status_code in self.RETRY_STATUS
+                self._record(endpoint, started, error=retryable)
+                if not retryable:
+                    self.breaker.record_success()
+                    return response
+                error = GoogleBooksError(f"Google Books respondeu {response.status_code}")
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff_delay(attempt))
+
+        raise self._give_up(error) from error
+
+
+# Versão assíncrona (httpx) usada pelas views ASGI. O pool de conexões é do event loop,
+# então cada loop tem o seu cliente (ver get_async_client)
+class AsyncGoogleBooksClient(BaseGoogleBooksClient):
+    def __init__(self, base_url, **options):
+        super().__init__(base_url, **options)
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+        )
+
+    async def search(self, query, start_index=0, max_results=20, print_type="books"):
+        params = self.search_params(query, start_index, max_results, print_type)
+        return await self.get_json("/volumes", params, endpoint="search")
+
+    async def volume(self, google_book_id):
+        return await self.get_json(f"/volumes/{google_book_id}", endpoint="volume")
+
+    async def get_json(self, path, params=None, endpoint="other"):
+        return await self.singleflight.ado(self.flight_key(path, params), lambda: self._get_json(path, params, endpoint))
+
+    async def _get_json(self, path, params, endpoint):
+        response = await self.request(path, params, endpoint)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    async def request(self, path, params=None, endpoint="other"):
+        probe = self._admit()
+        if self.quota is not None:
+            try:
+                await self.quota.aacquire()
+            except UpstreamUnavailable:
+                self._quota_refused(probe)
+                raise
+        params = self._prepare(params)
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            if attempt and self.quota is not None:
+                try:
+                    await self.quota.aacquire()
+                except UpstreamUnavailable:
+                    break
+            started = time.perf_counter()
+            try:
+                response = await self.http.get(url, params=params)
+            except httpx.TransportError as exc:
+                self._record(endpoint, started, error=True)
+                error = exc
+            else:
+                retryable = response.status_code in self.RETRY_STATUS
+                self._record(endpoint, started, error=retryable)
+                if not retryable:
+                    self.breaker.record_success()
+                    return response
+                error = GoogleBooksError(f"Google Books respondeu {response.status_code}")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+        raise self._give_up(error) from error
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+# Coalescência entre workers pelo cache compartilhado das respostas (ver GOOGLE_BOOKS_SINGLEFLIGHT)
+def _build_singleflight():
+    config = settings.GOOGLE_BOOKS_SINGLEFLIGHT
+    return SingleFlight(
+        alias=settings.GOOGLE_BOOKS_CACHE["ALIAS"] if config["CROSS_PROCESS"] else None,
+        lock_timeout=config["LOCK_TIMEOUT"],
+        result_timeout=config["RESULT_TIMEOUT"],
+        wait_timeout=config["WAIT_TIMEOUT"],
+        poll_interval=config["POLL_INTERVAL"],
+        prefix="gb-flight",
+    )
+
+
+# Cota compartilhada entre os workers (ver GOOGLE_BOOKS_QUOTA)
+def _build_quota():
+    from .quota import QuotaManager
+
+    config = settings.GOOGLE_BOOKS_QUOTA
+    if not config["ENABLED"]:
+        return None
+    return QuotaManager(
+        alias=config["ALIAS"],
+        rate=config["RATE"],
+        capacity=config["CAPACITY"],
+        daily_limit=config["DAILY_LIMIT"],
+        background_reserve=config["BACKGROUND_RESERVE"],
+    )
+
+
+def _client_options(pool_key="POOL_MAXSIZE"):
+    config = settings.GOOGLE_BOOKS_API
+    return {
+        "api_key": config.get("API_KEY"),
+        "connect_timeout": config["CONNECT_TIMEOUT"],
+        "read_timeout": config["READ_TIMEOUT"],
+        "max_retries": config["MAX_RETRIES"],
+        "backoff": config["BACKOFF"],
+        "pool_maxsize": config[pool_key],
+        "breaker_threshold": config["BREAKER_THRESHOLD"],
+        "breaker_reset_timeout": config["BREAKER_RESET_TIMEOUT"],
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncGoogleBooksClient
+
+
+# Cliente compartilhado por todas as views (criado na primeira chamada a partir de settings.GOOGLE_BOOKS_API)
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GoogleBooksClient(
+                    settings.GOOGLE_BOOKS_API["BASE_URL"],
+                    singleflight=_build_singleflight(),
+                    quota=_build_quota(),
+                    **_client_options(),
+                )
+    return _client
+
+
+# Cliente assíncrono do event loop atual. Compartilha disjuntor, métricas, coalescência e cota com o cliente síncrono,
+# para que o estado da API seja o mesmo para as views WSGI e ASGI do processo
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        shared = get_client()
+        client = AsyncGoogleBooksClient(
+            settings.GOOGLE_BOOKS_API["BASE_URL"],
+            breaker=shared.breaker,
+            latency=shared.latency,
+            singleflight=shared.singleflight,
+            quota=shared.quota,
+            **_client_options("ASYNC_POOL_MAXSIZE"),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+# Recria os clientes quando os testes alteram a configuração com override_settings
+@receiver(setting_changed)
+def _reset_client(setting, **kwargs):
+    global _client
+    if setting in ("GOOGLE_BOOKS_API", "GOOGLE_BOOKS_SINGLEFLIGHT", "GOOGLE_BOOKS_QUOTA"):
+        _client = None
+        _async_clients.clear()
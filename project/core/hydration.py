@@ -0,0 +1,65 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from . import volumes
+from .google_books import GoogleBooksError
+from .models import Book
+from .quota import background as background_priority
+
+logger = logging.getLogger(__name__)
+
+VOLUME_FIELDS = ["subtitle", "description", "page_count", "categories", "language", "preview_link"]
+
+# Pool compartilhado pelas hidratações do processo: limita as chamadas simultâneas à API, por mais
+# páginas e exportações que estejam sendo montadas ao mesmo tempo
+_executor = ThreadPoolExecutor(max_workers=settings.HYDRATION["WORKERS"], thread_name_prefix="hydration")
+
+
+# Dados completos de vários livros de uma vez: google_book_id -> campos do volume (VOLUME_FIELDS, como em
+# BookVolume), ou None para livros que não existem na API ou não responderam a tempo.
+# Volumes já salvos saem do banco em uma query; os que faltam são buscados em paralelo no pool, então
+# hidratar 100 livros leva o tempo da chamada mais lenta, não a soma. Os volumes buscados são gravados em
+# BookVolume (livros salvos) ou em volume_cache (os demais). Com background=True (exportações), as chamadas
+# usam a cota de segundo plano
+def hydrate(google_book_ids, background=False, timeout=None):
+    ids = list(dict.fromkeys(google_book_ids))
+    books = {book.google_book_id: book for book in Book.objects.select_related("volume").filter(google_book_id__in=ids)}
+    details = {}
+    pending = {}
+    for google_book_id in ids:
+        book = books.get(google_book_id)
+        volume = getattr(book, "volume", None) if book else None
+        if volume is not None:
+            if volumes.is_stale(volume):
+                volumes.schedule_refresh(book)
+            details[google_book_id] = {name: getattr(volume, name) for name in VOLUME_FIELDS}
+        else:
+            pending[_executor.submit(_fetch, google_book_id, book is None, background)] = google_book_id
+
+    done, not_done = wait(pending, timeout=settings.HYDRATION["TIMEOUT"] if timeout is None else timeout)
+    for future in not_done:
+        future.cancel()  # a chamada que já começou termina e, no caso de volume_cache, ainda fica guardada
+        logger.info("Volume %s não respondeu a tempo", pending[future])
+    for future in done:
+        google_book_id = pending[future]
+        try:
+            data = future.result()
+        except GoogleBooksError:
+            logger.warning("Falha ao buscar o volume %s", google_book_id, exc_info=True)
+            continue
+        if data is None:
+            continue
+        book = books.get(google_book_id)
+        if book is not None:
+            volumes.store_volume(book, data)  # nesta thread: as do pool não abrem conexões com o banco
+        details[google_book_id] = volumes.volume_fields(data)
+    return {google_book_id: details.get(google_book_id) for google_book_id in ids}
+
+
+def _fetch(google_book_id, cached, background):
+    if background:
+        with background_priority():
+            return _fetch(google_book_id, cached, False)
+    return volumes.fetch_volume_cached(google_book_id) if cached else volumes.fetch_volume(google_book_id)
@@ -0,0 +1,299 @@
+import csv
+import io
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .google_books import GoogleBooksError, get_client
+from .models import Book, ImportJob, UserBook
+from .quota import QuotaExceeded, background
+from .search_index import index_books
+from . import fragments, hydration, jobs, reading_stats, taxonomy
+
+logger = logging.getLogger(__name__)
+
+# Prateleiras do Goodreads (coluna "Exclusive Shelf") e nomes comuns de status -> UserBook.status
+STATUS_MAP = {
+    "read": "completed",
+    "currently-reading": "reading",
+    "to-read": "plan",
+    "dnf": "dropped",
+    "did-not-finish": "dropped",
+    "abandoned": "dropped",
+}
+
+# Pool da importação pelo site: uma importação por vez por processo, fora do ciclo da requisição
+_import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reading-list-import")
+
+
+# Limita as chamadas à API a `rate` por segundo, somando todas as threads da importação
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Lê as linhas do arquivo uma a uma (CSV, JSON array ou JSON Lines), sem carregar o arquivo inteiro
+def read_rows(file, format):
+    if format == "csv":
+        yield from csv.DictReader(file)
+    else:
+        yield from iter_json(file)
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    array = None  # True para [..., ...], False para um objeto por linha
+    for chunk in iter(lambda: file.read(chunk_size), ""):
+        buffer += chunk
+        position = 0
+        if array is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            array = stripped.startswith("[")
+            position = len(buffer) - len(stripped) + (1 if array else 0)
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # objeto incompleto: espera o próximo pedaço do arquivo
+            yield row
+        buffer = buffer[position:]
+    if buffer.strip() and buffer.strip() != "]":
+        raise ValueError("JSON incompleto no fim do arquivo")
+
+
+def _first(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value:
+            return str(value).strip()
+    return ""
+
+
+# Normaliza uma linha (formato do Goodreads ou da exportação do próprio Bookly)
+def normalize_row(row):
+    isbn = re.sub(r"[^0-9Xx]", "", _first(row, "ISBN13", "isbn13", "ISBN", "isbn"))  # Goodreads exporta ="978..."
+    status = _first(row, "status", "Exclusive Shelf", "shelf").lower()
+    return {
+        "google_book_id": _first(row, "google_book_id"),
+        "isbn": isbn,
+        "title": _first(row, "title", "Title"),
+        "authors": _first(row, "authors", "author", "Author"),
+        "publisher": _first(row, "publisher", "Publisher"),
+        "published_date": _first(row, "published_date", "Year Published", "Original Publication Year"),
+        "thumbnail": _first(row, "thumbnail"),
+        "status": status if status in dict(UserBook.STATUS_CHOICES) else STATUS_MAP.get(status, "plan"),
+    }
+
+
+def _clip(name, value):
+    max_length = Book._meta.get_field(name).max_length
+    return value[:max_length] if max_length else value
+
+
+# Converte a linha em um Book (ainda não salvo): direto, se ela já traz o google_book_id,
+# ou procurando o livro na API pelo ISBN ou por título + autor
+def resolve_book(row, client, limiter):
+    if row["google_book_id"]:
+        if not row["title"]:
+            return None
+        fields = {name: row[name] for name in ("title", "authors", "publisher", "published_date", "thumbnail")}
+        return Book(google_book_id=row["google_book_id"], **{k: _clip(k, v) for k, v in fields.items()})
+
+    if row["isbn"]:
+        query = f"isbn:{row['isbn']}"
+    elif row["title"]:
+        query = f'intitle:"{row["title"]}"' + (f' inauthor:"{row["authors"].split(",")[0]}"' if row["authors"] else "")
+    else:
+        return None
+
+    limiter.wait()
+    data = client.search(query, max_results=1)
+    items = (data or {}).get("items") or []
+    if not items:
+        return None
+    info = items[0].get("volumeInfo", {})
+    return Book(
+        google_book_id=items[0]["id"],
+        title=_clip("title", info.get("title", row["title"] or "Sem título")),
+        authors=_clip("authors", ", ".join(info.get("authors") or []) or row["authors"]),
+        publisher=_clip("publisher", info.get("publisher", "")),
+        published_date=_clip("published_date", info.get("publishedDate", "")),
+        thumbnail=(info.get("imageLinks") or {}).get("thumbnail"),
+    )
+
+
+# Executa (ou retoma) uma importação: lê o arquivo em lotes, resolve os livros de cada lote em paralelo
+# e grava Books e UserBooks em lote. O progresso é salvo a cada lote
+class ReadingListImporter:
+    def __init__(self, job, batch_size=None, workers=None, rate=None, client=None):
+        config = settings.READING_LIST_IMPORT
+        self.job = job
+        self.batch_size = batch_size or config["BATCH_SIZE"]
+        self.workers = workers or config["WORKERS"]
+        self.limiter = RateLimiter(config["RATE_LIMIT"] if rate is None else rate)
+        self.client = client or get_client()
+        self.quota_wait = config["QUOTA_WAIT"]
+
+    def run(self):
+        job = self.job
+        job.status = "running"
+        job.save(update_fields=["status", "updated_at"])
+        try:
+            with job.source.open("rb") as raw, io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as file:
+                rows = islice(read_rows(file, job.format), job.rows_processed, None)  # retoma de onde parou
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import-resolve") as executor:
+                    while True:
+                        batch = [normalize_row(row) for row in islice(rows, self.batch_size)]
+                        if not batch:
+                            break
+                        self.import_batch(batch, executor)
+        except Exception as exc:
+            job.status = "failed"
+            job.error = str(exc)
+            job.save(update_fields=["status", "error", "updated_at"])
+            raise
+        job.status = "done"
+        job.save(update_fields=["status", "updated_at"])
+        return job
+
+    def import_batch(self, rows, executor):
+        books = list(executor.map(self._resolve, rows))
+        found = [(row, book) for row, book in zip(rows, books) if book is not None]
+
+        with transaction.atomic():
+            by_id = {book.google_book_id: book for _, book in found}
+            Book.objects.bulk_create(by_id.values(), ignore_conflicts=True)
+            saved = Book.objects.in_bulk(list(by_id), field_name="google_book_id")
+            index_books(saved.values())  # bulk_create não dispara post_save
+            taxonomy.link_authors(saved.values())
+            listed = set(
+                UserBook.objects.filter(user=self.job.user, book__in=saved.values()).values_list("book_id", flat=True)
+            )
+            new = {}  # book_id -> UserBook; a mesma obra repetida no arquivo entra uma vez só
+            for row, book in found:
+                book_id = saved[book.google_book_id].id
+                if book_id not in listed and book_id not in new:
+                    new[book_id] = UserBook(user=self.job.user, book_id=book_id, status=row["status"])
+            # livros que já estavam na lista continuam com o status atual
+            created = UserBook.objects.bulk_create(new.values(), ignore_conflicts=True)
+            reading_stats.books_added(self.job.user_id, [(userbook.book_id, userbook.status, userbook.added_at) for userbook in created])
+            if created:
+                fragments.list_changed(self.job.user_id)  # bulk_create não dispara post_save
+            # capas e dados completos dos livros que ainda não têm volume e recomendações dos livros adicionados,
+            # pelo worker (run_jobs)
+            unenriched = Book.objects.filter(id__in=[book.id for book in saved.values()], volume__isnull=True).values_list("id", flat=True)
+            jobs.enqueue_many([("enrich", unenriched, 0), jobs.neighbors_batch([userbook.book_id for userbook in created])])
+            self.job.rows_processed += len(rows)
+            self.job.rows_imported += len(found)
+            self.job.rows_failed += len(rows) - len(found)
+            self.job.save(update_fields=["rows_processed", "rows_imported", "rows_failed", "updated_at"])
+
+    # As buscas da importação são de segundo plano: com a cota reservada para os usuários, espera até
+    # QUOTA_WAIT segundos; depois disso a importação para e pode ser retomada (--resume) sem perder linhas
+    def _resolve(self, row):
+        waited = 0
+        while True:
+            try:
+                with background():
+                    return resolve_book(row, self.client, self.limiter)
+            except QuotaExceeded:
+                if waited >= self.quota_wait:
+                    raise
+                time.sleep(1)
+                waited += 1
+            except GoogleBooksError:
+                logger.warning("Não foi possível resolver a linha %r", row.get("title"), exc_info=True)
+                return None
+
+
+# Importação enviada pelo site: roda em segundo plano
+def schedule_import(job):
+    _import_executor.submit(_run_in_background, job.pk)
+
+
+def _run_in_background(job_id):
+    close_old_connections()
+    try:
+        ReadingListImporter(ImportJob.objects.get(pk=job_id)).run()
+    except Exception:
+        logger.exception("Falha na importação %s", job_id)
+    finally:
+        close_old_connections()
+
+
+# Linhas da exportação (mesmas colunas que o importador entende), lendo o banco em blocos.
+# Com expanded=True, cada linha leva também os dados completos do volume (descrição, páginas, categorias...),
+# hidratados EXPORT_BATCH livros por vez
+EXPORT_FIELDS = ["google_book_id", "title", "authors", "publisher", "published_date", "thumbnail", "status", "added_at"]
+EXPANDED_FIELDS = ["subtitle", "description", "page_count", "categories", "language"]
+
+
+def export_rows(user, chunk_size=2000, expanded=False):
+    queryset = UserBook.objects.filter(user=user).select_related("book").order_by("added_at", "id")
+    rows = (_export_row(userbook) for userbook in queryset.iterator(chunk_size=chunk_size))
+    if not expanded:
+        yield from rows
+        return
+    while batch := list(islice(rows, settings.HYDRATION["EXPORT_BATCH"])):
+        details = hydration.hydrate([row["google_book_id"] for row in batch], background=True)
+        for row in batch:
+            detail = details[row["google_book_id"]] or {}
+            yield {**row, **{name: detail.get(name) or "" for name in EXPANDED_FIELDS}}
+
+
+def _export_row(userbook):
+    book = userbook.book
+    return {
+        "google_book_id": book.google_book_id,
+        "title": book.title,
+        "authors": book.authors,
+        "publisher": book.publisher,
+        "published_date": book.published_date,
+        "thumbnail": book.thumbnail or "",
+        "status": userbook.status,
+        "added_at": userbook.added_at.isoformat(),
+    }
+
+
+# Buffer de uma linha: o csv.writer escreve nele e a linha é devolvida para o StreamingHttpResponse
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, fields=EXPORT_FIELDS):
+    writer = csv.DictWriter(_Echo(), fieldnames=fields)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_json(rows):
+    yield "["
+    for index, row in enumerate(rows):
+        yield ("," if index else "") + "\n" + json.dumps(row, ensure_ascii=False)
+    yield "\n]\n"
@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_current = ContextVar("request_timings", default=None)
+
+
+# Tempos de uma requisição, somados por componente. Os componentes podem se sobrepor: queries feitas
+# durante a renderização (querysets preguiçosos no template) contam em "db" e em "template"
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {"upstream": 0.0, "db": 0.0, "template": 0.0}
+        self.counts = {"upstream": 0, "db": 0}
+
+    def add(self, component, seconds):
+        self.seconds[component] += seconds
+        if component in self.counts:
+            self.counts[component] += 1
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+# Registra um tempo na requisição em andamento (não faz nada fora de uma requisição, ex.: threads de prefetch)
+def record(component, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(component, seconds)
+
+
+# Executa as queries medindo o tempo; instalado em todas as conexões do banco
+def _db_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("db", time.perf_counter() - started)
+
+
+def install_db_wrapper(connection):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+@receiver(connection_created)
+def _instrument_connection(sender, connection, **kwargs):
+    install_db_wrapper(connection)
+
+
+# Janela das últimas medições de cada view e componente, para os percentis
+class RollingHistograms:
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._data = {}  # (view, componente) -> {"count", "sum", "recent"}
+        self._lock = threading.Lock()
+
+    def observe(self, view, component, value):
+        with self._lock:
+            data = self._data.get((view, component))
+            if data is None:
+                data = self._data[(view, component)] = {"count": 0, "sum": 0.0, "recent": deque(maxlen=self.window)}
+            data["count"] += 1
+            data["sum"] += value
+            data["recent"].append(value)
+
+    def snapshot(self):
+        with self._lock:
+            items = [(key, data["count"], data["sum"], sorted(data["recent"])) for key, data in self._data.items()]
+        result = {}
+        for (view, component), count, total, recent in items:
+            quantiles = {q: recent[min(len(recent) - 1, int(round(q * (len(recent) - 1))))] for q in self.QUANTILES}
+            result.setdefault(view, {})[component] = {"count": count, "sum": total, "quantiles": quantiles}
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+request_histograms = RollingHistograms(window=settings.PERFORMANCE_METRICS["WINDOW"])
+
+
+# Mede cada requisição (API do Google, banco, template e total), devolve o cabeçalho Server-Timing
+# e alimenta os histogramas por view expostos em /metrics/
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        install_db_wrapper(connections["default"])  # conexões abertas antes do middleware ser carregado
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    # Chamado logo antes de o TemplateResponse ser renderizado; o fim vem pelo post_render_callback
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda _: timings.add("template", time.perf_counter() - started))
+        return response
+
+    def finish(self, request, response, timings):
+        total = timings.total()
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else None) or "unmatched"
+        for component in ("upstream", "db", "template"):
+            request_histograms.observe(view, component, timings.seconds[component])
+        request_histograms.observe(view, "total", total)
+        request_histograms.observe(view, "db_queries", timings.counts["db"])
+        if settings.PERFORMANCE_METRICS["SERVER_TIMING"]:
+            response["Server-Timing"] = server_timing(timings, total)
+        return response
+
+
+def server_timing(timings, total):
+    entries = [
+        f'upstream;dur={timings.seconds["upstream"] * 1000:.1f};desc="Google Books ({timings.counts["upstream"]})"',
+        f'db;dur={timings.seconds["db"] * 1000:.1f};desc="{timings.counts["db"]} queries"',
+        f'template;dur={timings.seconds["template"] * 1000:.1f}',
+        f"total;dur={total * 1000:.1f}",
+    ]
+    return ", ".join(entries)
+
+
+# Formato de texto do Prometheus (exposition format 0.0.4)
+class PrometheusWriter:
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help, samples):
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            self.lines.append(f"{name}{suffix}{format_labels(labels)} {float(value)!r}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Histogramas das requisições como "summary" do Prometheus (quantis + _sum + _count)
+def write_request_metrics(writer):
+    snapshot = request_histograms.snapshot()
+    seconds, queries = [], []
+    for view, components in sorted(snapshot.items()):
+        for component, data in sorted(components.items()):
+            labels = {"view": view} if component == "db_queries" else {"view": view, "component": component}
+            target = queries if component == "db_queries" else seconds
+            for quantile, value in data["quantiles"].items():
+                target.append(("", dict(labels, quantile=quantile), value))
+            target.append(("_sum", labels, data["sum"]))
+            target.append(("_count", labels, data["count"]))
+    writer.metric("bookly_request_seconds", "summary", "Tempo por requisição, por view e componente.", seconds)
+    writer.metric("bookly_request_db_queries", "summary", "Queries ao banco por requisição, por view.", queries)
+
+
+# Métricas dos outros componentes, lidas na hora do scrape
+def write_app_metrics(writer):
+    from .cache import search_cache
+    from .google_books import CircuitBreaker, get_client
+    from .suggest import suggest_index
+
+    cache = search_cache.stats()
+    writer.metric("bookly_search_cache_lookups_total", "counter", "Consultas ao cache de buscas.", [
+        ("", {"result": "hit"}, cache["hits"]),
+        ("", {"result": "miss"}, cache["misses"]),
+    ])
+    writer.metric("bookly_search_cache_evictions_total", "counter", "Entradas descartadas do LRU local do cache de buscas.", [
+        ("", {}, cache["evictions"]),
+    ])
+    writer.metric("bookly_search_cache_entries", "gauge", "Entradas no LRU local do cache de buscas.", [("", {}, cache["size"])])
+
+    client = get_client().stats()
+    circuit = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}[client["circuit"]]
+    writer.metric("bookly_upstream_circuit_state", "gauge", "Disjuntor da API (0 fechado, 1 meio-aberto, 2 aberto).", [("", {}, circuit)])
+    latency = []
+    for endpoint, data in sorted(client["latency"].items()):
+        for quantile in ("p50", "p95", "p99"):
+            latency.append(("", {"endpoint": endpoint, "quantile": int(quantile[1:]) / 100}, data[quantile]))
+        latency.append(("_count", {"endpoint": endpoint}, data["count"]))
+    writer.metric("bookly_upstream_seconds", "summary", "Latência das chamadas à API do Google Books.", latency)
+    writer.metric("bookly_upstream_errors_total", "counter", "Chamadas à API que falharam.", [
+        ("", {"endpoint": endpoint}, data["errors"]) for endpoint, data in sorted(client["latency"].items())
+    ])
+
+    flight = client["singleflight"]
+    writer.metric("bookly_upstream_coalesced_total", "counter", "Chamadas à API evitadas por coalescência.", [
+        ("", {"scope": "process"}, flight["shared_local"]),
+        ("", {"scope": "cluster"}, flight["shared_remote"]),
+    ])
+
+    quota = client["quota"]
+    if quota is not None:
+        writer.metric("bookly_quota_tokens", "gauge", "Tokens no bucket da cota da API.", [("", {}, quota["tokens"])])
+        writer.metric("bookly_quota_remaining_today", "gauge", "Chamadas à API que ainda cabem na cota do dia.", [
+            ("", {}, quota["remaining_today"]),
+        ])
+        writer.metric("bookly_quota_rejected_total", "counter", "Chamadas recusadas por falta de cota (neste processo).", [
+            ("", {"priority": priority}, count) for priority, count in sorted(quota["rejected"].items())
+        ])
+
+    writer.metric("bookly_suggest_keys", "gauge", "Chaves no índice do autocomplete.", [("", {}, suggest_index.stats()["keys"])])
@@ -0,0 +1,210 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import covers, fragments, recommendations, volumes
+from .models import Book, Job
+from .quota import background
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}  # tipo -> função(key)
+
+
+# Registra a função que executa as tarefas de um tipo. Ela recebe a key da tarefa; se levantar uma
+# exceção, a tarefa volta para a fila com backoff até JOBS["MAX_ATTEMPTS"] tentativas
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# Coloca tarefas na fila, na transação em andamento (se ela for desfeita, as tarefas também são).
+# Tarefas iguais já pendentes não são duplicadas (constraint job_unique_active)
+def enqueue(kind, *keys, delay=0):
+    enqueue_many([(kind, keys, delay)])
+
+
+# Tarefas de vários tipos em um só INSERT: [(tipo, keys, delay), ...]
+def enqueue_many(batches):
+    now = timezone.now()
+    rows = []
+    for kind, keys, delay in batches:
+        if kind not in HANDLERS:
+            raise ValueError(f"tipo de tarefa desconhecido: {kind}")
+        run_after = now + timedelta(seconds=delay)
+        rows += [Job(kind=kind, key=str(key), run_after=run_after) for key in keys]
+    if rows:
+        Job.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+# A presença dos livros nas listas mudou: recalcula os vizinhos deles (recomendações) daqui a
+# RECOMMENDATIONS["UPDATE_DELAY"] segundos. Enquanto a tarefa espera, novas mudanças no mesmo livro não criam outra
+def neighbors_changed(*book_ids):
+    enqueue_many([neighbors_batch(book_ids)])
+
+
+def neighbors_batch(book_ids):
+    return "neighbors", book_ids, settings.RECOMMENDATIONS["UPDATE_DELAY"]
+
+
+def backoff(attempts):
+    config = settings.JOBS
+    return min(config["RETRY_BACKOFF"] * 2 ** (attempts - 1), config["MAX_BACKOFF"])
+
+
+# Worker: pega tarefas vencidas na fila e as executa em um pool de threads, respeitando o limite de
+# tarefas simultâneas de cada tipo (JOBS["KIND_CONCURRENCY"]). Vários workers (processos ou máquinas)
+# podem rodar juntos: no PostgreSQL as tarefas são reservadas com SELECT ... FOR UPDATE SKIP LOCKED, e
+# em todos os bancos a reserva é um UPDATE condicional (status='pending'), então cada tarefa roda uma vez.
+# Tarefas "running" há mais de JOBS["LOCK_TIMEOUT"] segundos (worker que morreu) voltam para a fila
+class Worker:
+    def __init__(self, kinds=None, concurrency=None, poll_interval=None, name=None):
+        config = settings.JOBS
+        self.kinds = list(kinds or HANDLERS)
+        self.concurrency = concurrency or config["CONCURRENCY"]
+        self.poll_interval = config["POLL_INTERVAL"] if poll_interval is None else poll_interval
+        self.limits = {kind: config["KIND_CONCURRENCY"].get(kind, self.concurrency) for kind in self.kinds}
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.stop_event = threading.Event()
+        self._running = {kind: 0 for kind in self.kinds}
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self.stop_event.set()
+
+    # Executa até stop(). Com once=True, para quando não houver mais tarefas vencidas.
+    # As tarefas em andamento terminam antes de o worker sair
+    def run(self, once=False):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job") as executor:
+            while not self.stop_event.is_set():
+                claimed = self.claim_available()
+                for job in claimed:
+                    executor.submit(self._execute_in_thread, job)
+                if claimed:
+                    continue
+                if once and self.busy() == 0:
+                    break
+                self.stop_event.wait(self.poll_interval)
+
+    # Executa as tarefas vencidas nesta thread, uma por vez (testes)
+    def run_pending(self):
+        executed = 0
+        while True:
+            claimed = self.claim_available(slots=1)
+            if not claimed:
+                return executed
+            self.execute(claimed[0])
+            executed += 1
+
+    def busy(self):
+        with self._lock:
+            return sum(self._running.values())
+
+    def claim_available(self, slots=None):
+        with self._lock:
+            free = (self.concurrency if slots is None else slots) - sum(self._running.values())
+            wanted = {kind: min(free, limit - self._running[kind]) for kind, limit in self.limits.items()}
+        claimed = []
+        for kind, count in wanted.items():
+            if count > 0 and len(claimed) < free:
+                claimed += self.claim(kind, min(count, free - len(claimed)))
+        with self._lock:
+            for job in claimed:
+                self._running[job.kind] += 1
+        return claimed
+
+    def claim(self, kind, limit):
+        now = timezone.now()
+        self.requeue_stale(kind, now)
+        with transaction.atomic():
+            candidates = Job.objects.filter(kind=kind, status="pending", run_after__lte=now).order_by("run_after", "id")
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list("id", flat=True)[:limit])
+            if not ids:
+                return []
+            Job.objects.filter(id__in=ids, status="pending").update(
+                status="running", locked_by=self.name, locked_at=now, attempts=F("attempts") + 1,
+            )
+        return list(Job.objects.filter(id__in=ids, status="running", locked_by=self.name, locked_at=now))
+
+    def requeue_stale(self, kind, now):
+        expired = now - timedelta(seconds=settings.JOBS["LOCK_TIMEOUT"])
+        Job.objects.filter(kind=kind, status="running", locked_at__lt=expired).update(
+            status="pending", locked_by="", locked_at=None, run_after=now,
+        )
+
+    def _execute_in_thread(self, job):
+        close_old_connections()
+        try:
+            self.execute(job)
+        finally:
+            close_old_connections()
+
+    def execute(self, job):
+        try:
+            started = time.monotonic()
+            with background():  # tarefas não disputam a cota da API com as páginas dos usuários
+                HANDLERS[job.kind](job.key)
+        except Exception as exc:
+            self.failed(job, exc)
+        else:
+            Job.objects.filter(pk=job.pk, locked_by=self.name).delete()
+            logger.debug("Tarefa %s %s concluída em %.2fs", job.kind, job.key, time.monotonic() - started)
+        finally:
+            with self._lock:
+                self._running[job.kind] -= 1
+
+    def failed(self, job, exc):
+        error = f"{type(exc).__name__}: {exc}"
+        if job.attempts >= settings.JOBS["MAX_ATTEMPTS"]:
+            logger.error("Tarefa %s %s falhou %s vezes: %s", job.kind, job.key, job.attempts, error)
+            changes = {"status": "failed"}
+        else:
+            logger.warning("Tarefa %s %s falhou (tentativa %s): %s", job.kind, job.key, job.attempts, error)
+            changes = {"status": "pending", "run_after": timezone.now() + timedelta(seconds=backoff(job.attempts))}
+        Job.objects.filter(pk=job.pk, locked_by=self.name).update(last_error=error, locked_by="", locked_at=None, **changes)
+
+
+# Completa um livro novo com os dados do volume e agenda o download da capa
+@handler("enrich")
+def enrich_book(key):
+    book = volumes.enrich_book(int(key))
+    if book is None:
+        return
+    if book.thumbnail and not book.cover:
+        enqueue("cover", book.pk)
+    fragments.book_changed(book.pk)
+
+
+# Baixa a capa do Google e guarda uma cópia reduzida em MEDIA_ROOT/covers/, servida pelo site
+@handler("cover")
+def mirror_cover(key):
+    book = Book.objects.filter(pk=int(key)).first()
+    if book is None:
+        return
+    try:
+        changed = covers.mirror_cover(book) is not None
+    except covers.CoverError as exc:
+        logger.info("Capa do livro %s ignorada: %s", book.pk, exc)  # tentar de novo não adianta
+        return
+    if changed:
+        fragments.book_changed(book.pk)
+
+
+# Recalcula os pares "quem leu também leu" de um livro (core.recommendations)
+@handler("neighbors")
+def update_neighbors(key):
+    recommendations.update_book(int(key))
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+
+from . import fragments, jobs, reading_stats
+from .models import Book, UserBook
+from .suggest import suggest_index
+
+BOOK_FIELDS = ["title", "authors", "publisher", "published_date", "thumbnail"]
+
+
+# Operações na lista de um usuário, usadas pelas páginas (views.py) e pela API JSON (api.py)
+
+# Campos do Book recebidos do cliente, cortados no tamanho máximo das colunas
+def book_fields(data):
+    fields = {}
+    for name in BOOK_FIELDS:
+        value = str(data.get(name) or "")
+        max_length = Book._meta.get_field(name).max_length
+        fields[name] = value[:max_length] if max_length else value
+    return fields
+
+
+# Adiciona o livro à lista (criando o Book, se ainda não existir). Retorna (userbook, livro_criado, adicionado)
+def add_book(user, google_book_id, fields):
+    with transaction.atomic():
+        book, created = Book.objects.get_or_create(google_book_id=google_book_id, defaults=fields)
+        userbook, added = UserBook.objects.get_or_create(user=user, book=book, defaults={"status": "plan"})
+        if added:
+            reading_stats.books_added(user.id, [(book.id, userbook.status, userbook.added_at)])
+        # dados completos e capa do livro novo (para a página de detalhes e o perfil já saírem do site) e
+        # recomendações do livro adicionado, pelo worker (run_jobs)
+        jobs.enqueue_many([("enrich", [book.pk] if created else [], 0), jobs.neighbors_batch([book.id] if added else [])])
+    if created:
+        suggest_index.add_book(book) # o título já aparece no autocomplete deste processo
+    return userbook, created, added
+
+
+# Troca o status de um livro da lista; status desconhecidos são ignorados
+def update_status(user, userbook_id, status):
+    with transaction.atomic():
+        # select_for_update: duas alterações simultâneas não contam a mesma mudança de status duas vezes
+        userbook = get_object_or_404(UserBook.objects.select_for_update(of=("self",)).select_related("book"), id=userbook_id, user=user)
+        if status in dict(UserBook.STATUS_CHOICES) and status != userbook.status:
+            reading_stats.status_changed(user.id, [(userbook.book_id, userbook.status, status)])
+            jobs.neighbors_changed(userbook.book_id)
+            userbook.status = status
+            userbook.save()
+    return userbook
+
+
+def remove_book(user, userbook_id):
+    with transaction.atomic():
+        # select_for_update: duas remoções simultâneas (clique duplo, API e formulário) não descontam o livro
+        # duas vezes; a segunda espera a primeira e não acha mais a linha
+        userbook = get_object_or_404(UserBook.objects.select_for_update(of=("self",)).select_related("book"), id=userbook_id, user=user)
+        deleted, _ = userbook.delete()
+        if deleted:
+            reading_stats.books_removed(user.id, [(userbook.book_id, userbook.status, userbook.added_at)])
+            jobs.neighbors_changed(userbook.book_id)
+            fragments.list_changed(user.id)
+    return userbook
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import ReadingListImporter
+from core.models import CustomUser, ImportJob
+
+
+class Command(BaseCommand):
+    help = "Importa uma lista de leitura (CSV/JSON, ex.: exportação do Goodreads) para a lista de um usuário"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", nargs="?")
+        parser.add_argument("path", nargs="?")
+        parser.add_argument("--format", choices=["csv", "json"], help="padrão: pela extensão do arquivo")
+        parser.add_argument("--resume", type=int, metavar="JOB_ID", help="retoma uma importação interrompida")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--workers", type=int)
+        parser.add_argument("--rate", type=float, help="chamadas à API por segundo")
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            job = ImportJob.objects.filter(pk=options["resume"]).first()
+            if job is None:
+                raise CommandError(f"Importação {options['resume']} não encontrada")
+            if job.status == "done":
+                raise CommandError(f"Importação {job.pk} já foi concluída")
+        else:
+            if not options["username"] or not options["path"]:
+                raise CommandError("Informe o usuário e o arquivo, ou --resume JOB_ID")
+            user = CustomUser.objects.filter(username=options["username"]).first()
+            if user is None:
+                raise CommandError(f"Usuário {options['username']} não encontrado")
+            path = Path(options["path"])
+            if not path.exists():
+                raise CommandError(f"Arquivo {path} não encontrado")
+            format = options["format"] or ("json" if path.suffix.lower() in (".json", ".jsonl") else "csv")
+            with path.open("rb") as source:
+                job = ImportJob.objects.create(user=user, source=File(source, name=path.name), format=format)
+
+        self.stdout.write(f"Importação {job.pk}: começando na linha {job.rows_processed}")
+        importer = ReadingListImporter(job, batch_size=options["batch_size"], workers=options["workers"], rate=options["rate"])
+        importer.run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação {job.pk} concluída: {job.rows_imported} livros importados, {job.rows_failed} não encontrados"
+        ))
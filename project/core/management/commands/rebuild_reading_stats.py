@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import reading_stats
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Confere as estatísticas de leitura (core.reading_stats) contra as listas e recalcula as que divergirem"
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="padrão: todos os usuários")
+        parser.add_argument("--check", action="store_true", help="só relata as divergências, sem corrigir (sai com erro se houver)")
+        parser.add_argument("--force", action="store_true", help="recalcula todos, mesmo sem divergência")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by("id")
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+            missing = set(options["usernames"]) - set(users.values_list("username", flat=True))
+            if missing:
+                raise CommandError(f"Usuários não encontrados: {', '.join(sorted(missing))}")
+
+        checked = drifted = 0
+        for user in users.iterator(chunk_size=500):
+            checked += 1
+            differences = reading_stats.verify(user)
+            if differences:
+                drifted += 1
+                for field, (stored, right) in differences.items():
+                    self.stdout.write(f"{user.username}: {field} gravado {stored!r}, certo {right!r}")
+            if not options["check"] and (differences or options["force"]):
+                reading_stats.rebuild(user)
+
+        if options["check"] and drifted:
+            raise CommandError(f"{drifted} de {checked} usuários com estatísticas divergentes")
+        action = "verificados" if options["check"] else "verificados, divergentes recalculados"
+        self.stdout.write(self.style.SUCCESS(f"{checked} usuários {action} ({drifted} com divergência)"))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recalcula as recomendações \"quem leu também leu\" (BookNeighbor) a partir de todas as listas"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        engine = "NumPy/SciPy" if recommendations.np is not None else "Python"
+        count = recommendations.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} pares gravados em {time.monotonic() - started:.1f}s ({engine})"))
@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.jobs import HANDLERS, Worker
+
+
+class Command(BaseCommand):
+    help = "Executa as tarefas em segundo plano (dados completos dos livros novos, capas) guardadas no banco"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kinds", nargs="+", help=f"tipos de tarefa (padrão: todos: {', '.join(sorted(HANDLERS))})")
+        parser.add_argument("--concurrency", type=int, help="tarefas simultâneas neste worker")
+        parser.add_argument("--poll-interval", type=float, help="segundos entre consultas à fila quando ela está vazia")
+        parser.add_argument("--once", action="store_true", help="executa as tarefas vencidas e sai")
+
+    def handle(self, *args, **options):
+        unknown = set(options["kinds"] or []) - set(HANDLERS)
+        if unknown:
+            raise CommandError(f"Tipos de tarefa desconhecidos: {', '.join(sorted(unknown))}")
+        worker = Worker(kinds=options["kinds"], concurrency=options["concurrency"], poll_interval=options["poll_interval"])
+
+        # SIGTERM/SIGINT: para de pegar tarefas novas e espera as que estão rodando
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f"Worker {worker.name}: {', '.join(worker.kinds)} ({worker.concurrency} simultâneas)")
+        worker.run(once=options["once"])
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker.name} encerrado"))
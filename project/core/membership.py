@@ -0,0 +1,93 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import fragments
+from .models import UserBook
+
+logger = logging.getLogger(__name__)
+
+# Marcador, no lugar do mapa, das listas grandes demais para guardar inteiras
+LARGE = "large"
+
+_fill_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="membership")
+_filling = set()  # chaves já sendo montadas, para não ler a mesma lista duas vezes
+_filling_lock = threading.Lock()
+
+
+# Livros que cada usuário já tem na lista, para os resultados de busca mostrarem o status em vez do botão
+# de adicionar. O mapa google_book_id -> status fica no cache de fragmentos com a versão da lista
+# (core.fragments.list_version) na chave: adicionar, alterar ou remover um livro troca a versão, e o mapa
+# antigo deixa de ser lido. Para os 21 resultados de uma página:
+#   - mapa em cache: nenhuma query;
+#   - cache vazio: uma query com IN nos livros da página, e o mapa é montado em segundo plano para as
+#     próximas páginas;
+#   - listas com mais de MEMBERSHIP["MAX_CACHED"] livros ficam só com o marcador LARGE, e cada página
+#     faz a query com IN;
+#   - sem o cache de fragmentos (DummyCache), sempre a query com IN: o mapa nunca seria reaproveitado.
+def _key(user_id):
+    return f"membership:{user_id}:{fragments.list_version(user_id)}"
+
+
+# Status de cada livro da lista do usuário entre os google_book_ids pedidos (os que ele não tem ficam de fora)
+def statuses(user_id, google_book_ids):
+    google_book_ids = [google_book_id for google_book_id in google_book_ids if google_book_id]
+    if not google_book_ids:
+        return {}
+    if not fragments.enabled():
+        return _lookup(user_id, google_book_ids)
+    key = _key(user_id)
+    members = fragments.backend().get(key)
+    if members is None:
+        found = _lookup(user_id, google_book_ids)
+        schedule_fill(user_id, key)
+        return found
+    if members == LARGE:
+        return _lookup(user_id, google_book_ids)
+    return {google_book_id: members[google_book_id] for google_book_id in google_book_ids if google_book_id in members}
+
+
+def _userbooks(user_id):
+    return UserBook.objects.filter(user_id=user_id).values_list("book__google_book_id", "status")
+
+
+def _lookup(user_id, google_book_ids):
+    return dict(_userbooks(user_id).filter(book__google_book_id__in=google_book_ids))
+
+
+def _load(user_id):
+    limit = settings.MEMBERSHIP["MAX_CACHED"]
+    members = dict(_userbooks(user_id)[:limit + 1])
+    return LARGE if len(members) > limit else members
+
+
+def _fill(user_id, key):
+    fragments.backend().set(key, _load(user_id), settings.MEMBERSHIP["TIMEOUT"])
+
+
+# Monta o mapa da lista fora da requisição. Com MEMBERSHIP["FILL_IN_BACKGROUND"] desligado (ex.: testes),
+# é montado na hora
+def schedule_fill(user_id, key):
+    if not settings.MEMBERSHIP["FILL_IN_BACKGROUND"]:
+        _fill(user_id, key)
+        return
+    with _filling_lock:
+        if key in _filling:
+            return
+        _filling.add(key)
+    _fill_executor.submit(_fill_in_background, user_id, key)
+
+
+def _fill_in_background(user_id, key):
+    close_old_connections()
+    try:
+        _fill(user_id, key)
+    except Exception:
+        logger.exception("Falha ao montar o mapa da lista do usuário %s", user_id)
+    finally:
+        with _filling_lock:
+            _filling.discard(key)
+        close_old_connections()
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_userbook_book_alter_userbook_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookVolume',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='volume', serialize=False, to='core.book')),
+                ('subtitle', models.CharField(blank=True, max_length=300)),
+                ('description', models.TextField(blank=True)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('categories', models.CharField(blank=True, max_length=500)),
+                ('language', models.CharField(blank=True, max_length=20)),
+                ('preview_link', models.URLField(blank=True, max_length=500, null=True)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
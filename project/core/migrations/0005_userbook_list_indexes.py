@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_bookvolume'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userbook',
+            index=models.Index(fields=['user', '-added_at'], name='userbook_user_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbook',
+            index=models.Index(fields=['user', 'status', '-added_at'], name='userbook_user_status_added_idx'),
+        ),
+    ]
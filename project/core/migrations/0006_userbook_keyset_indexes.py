@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_userbook_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userbook',
+            name='userbook_user_added_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userbook',
+            name='userbook_user_status_added_idx',
+        ),
+        migrations.AddIndex(
+            model_name='userbook',
+            index=models.Index(fields=['user', '-added_at', '-id'], name='userbook_user_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbook',
+            index=models.Index(fields=['user', 'status', '-added_at', '-id'], name='userbook_user_status_added_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# Índices da busca local (core.search_index). Só existem no PostgreSQL: em outros bancos
+# (SQLite nos testes) a busca usa o índice em memória e esta migração não faz nada.
+# A expressão é a de core.search_index.book_search_vector no momento desta migração, copiada aqui
+# (a migração não importa o código do app, que muda depois)
+SEARCH_VECTOR = (
+    SearchVector("title", weight="A", config="simple")
+    + SearchVector("authors", weight="B", config="simple")
+    + SearchVector("publisher", weight="C", config="simple")
+)
+SEARCH_INDEXES = [
+    GinIndex(SEARCH_VECTOR, name="book_search_vector_idx"),
+    GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="book_title_trgm_idx"),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Book = apps.get_model("core", "Book")
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Book, index)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Book = apps.get_model("core", "Book")
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Book, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_importjob'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
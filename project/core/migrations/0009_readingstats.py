@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+
+
+# Estatísticas dos usuários que já existem, calculadas a partir das listas (depois disso os
+# contadores são mantidos por core.reading_stats)
+def backfill(apps, schema_editor):
+    CustomUser = apps.get_model("core", "CustomUser")
+    UserBook = apps.get_model("core", "UserBook")
+    ReadingStats = apps.get_model("core", "ReadingStats")
+    ReadingMonth = apps.get_model("core", "ReadingMonth")
+
+    stats = {user_id: ReadingStats(user_id=user_id) for user_id in CustomUser.objects.values_list("id", flat=True)}
+    for user_id, status, count in UserBook.objects.values_list("user_id", "status").annotate(count=Count("id")).order_by():
+        setattr(stats[user_id], status, count)
+    pages = (
+        UserBook.objects.filter(status="completed").values_list("user_id")
+        .annotate(pages=Sum("book__volume__page_count")).order_by()
+    )
+    for user_id, total in pages:
+        stats[user_id].pages_read = total or 0
+    ReadingStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+    months = (
+        UserBook.objects.annotate(month=TruncMonth("added_at", output_field=DateField()))
+        .values_list("user_id", "month").annotate(count=Count("id")).order_by()
+    )
+    ReadingMonth.objects.bulk_create(
+        [ReadingMonth(user_id=user_id, month=month, added=count) for user_id, month, count in months], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_book_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reading_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('plan', models.IntegerField(default=0)),
+                ('reading', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('dropped', models.IntegerField(default=0)),
+                ('pages_read', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReadingMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('added', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_months', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_job_book_cover'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='core.book')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_of', to='core.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score'], name='bookneighbor_book_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'neighbor'), name='bookneighbor_unique')],
+            },
+        ),
+    ]
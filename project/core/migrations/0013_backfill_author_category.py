@@ -0,0 +1,67 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+MAX_LENGTH = 300
+PLACEHOLDERS = {"desconhecido"}
+
+
+# Mesma normalização de core.taxonomy.split_names (a migração não importa o código do app, que muda depois)
+def split_names(text):
+    names = []
+    for part in (text or "").split(","):
+        name = " ".join(part.split())[:MAX_LENGTH]
+        if name and name.lower() not in PLACEHOLDERS and name not in names:
+            names.append(name)
+    return names
+
+
+def link(model, names_by_book):
+    if not names_by_book:
+        return
+    through = model.books.through
+    column = f"{model._meta.model_name}_id"
+    names = sorted({name for book_names in names_by_book.values() for name in book_names})
+    ids = {}
+    for start in range(0, len(names), 500):
+        batch = names[start:start + 500]
+        model.objects.bulk_create([model(name=name) for name in batch], ignore_conflicts=True)
+        ids.update(model.objects.filter(name__in=batch).values_list("name", "id"))
+    through.objects.bulk_create(
+        [through(book_id=book_id, **{column: ids[name]}) for book_id, book_names in names_by_book.items() for name in book_names],
+        ignore_conflicts=True,
+    )
+
+
+# Autores (Book.authors) e categorias (BookVolume.categories) dos livros que já existem, em lotes de
+# BATCH_SIZE livros pela chave primária, cada um na sua transação: nenhuma tabela fica travada pela migração
+# inteira, e o site pode continuar gravando livros (os novos já são ligados por core.taxonomy).
+# As categorias salvas são texto unido por vírgulas; categorias com vírgula no nome ("Body, Mind & Spirit")
+# saem partidas aqui e são corrigidas na próxima atualização do volume, que usa a lista da API
+def backfill(apps, schema_editor):
+    Book = apps.get_model("core", "Book")
+    BookVolume = apps.get_model("core", "BookVolume")
+    Author = apps.get_model("core", "Author")
+    Category = apps.get_model("core", "Category")
+
+    last = 0
+    while True:
+        books = list(Book.objects.filter(pk__gt=last).order_by("pk").values_list("pk", "authors")[:BATCH_SIZE])
+        if not books:
+            break
+        last = books[-1][0]
+        categories = BookVolume.objects.filter(book_id__in=[pk for pk, _ in books]).values_list("book_id", "categories")
+        with transaction.atomic():
+            link(Author, {pk: names for pk, authors in books if (names := split_names(authors))})
+            link(Category, {pk: names for pk, text in categories if (names := split_names(text))})
+
+
+class Migration(migrations.Migration):
+    atomic = False  # uma transação por lote (backfill), não uma para a migração inteira
+
+    dependencies = [
+        ('core', '0012_author_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
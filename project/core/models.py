@@ -1,6 +1,9 @@
+from pathlib import Path
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.urls import reverse
 
 class CustomUser(AbstractUser):
     def __str__(self):
@@ -13,10 +16,25 @@ class Book(models.Model):
     publisher = models.CharField(max_length=200, blank=True)
     published_date = models.CharField(max_length=50, blank=True)
     thumbnail = models.URLField(blank=True, null=True)
+    # capa baixada e reduzida pelo job "cover" (core/jobs.py); o nome do arquivo termina no hash do conteúdo
+    cover = models.FileField(upload_to='covers/', blank=True)
+    # muda a cada alteração do livro; entra na chave do card do perfil em cache (templates/profile.html)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    # Capa servida pelo próprio site quando já foi baixada; senão, a imagem do Google
+    @property
+    def image_url(self):
+        if self.cover:
+            return reverse('book_cover', args=[self.pk, self.cover_version])
+        return self.thumbnail
+
+    @property
+    def cover_version(self):
+        return Path(self.cover.name).stem.rsplit('-', 1)[-1]
+
 class UserBook(models.Model):
     STATUS_CHOICES = [
         ('plan', 'Planejo ler'),
@@ -32,6 +50,166 @@ class UserBook(models.Model):
 
     class Meta:
         unique_together = ('user', 'book')  # um usuário não pode adicionar o mesmo livro duas vezes
+        indexes = [
+            # listagem do perfil: livros do usuário do mais recente ao mais antigo, com ou sem filtro de status.
+            # O id desempata added_at e permite a paginação por cursor sobre o próprio índice
+            models.Index(fields=['user', '-added_at', '-id'], name='userbook_user_added_idx'),
+            models.Index(fields=['user', 'status', '-added_at', '-id'], name='userbook_user_status_added_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.book.title}"
+
+# Dados completos do volume (volumeInfo da API do Google Books) guardados ao lado do Book,
+# para que a página de detalhes não precise chamar a API a cada visualização
+class BookVolume(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='volume')
+    subtitle = models.CharField(max_length=300, blank=True)
+    description = models.TextField(blank=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
+    categories = models.CharField(max_length=500, blank=True)
+    language = models.CharField(max_length=20, blank=True)
+    preview_link = models.URLField(max_length=500, blank=True, null=True)
+    fetched_at = models.DateTimeField()  # quando os dados foram buscados na API pela última vez
+
+    def __str__(self):
+        return f"Volume de {self.book.title}"
+
+
+# Importação de uma lista de leitura (CSV/JSON, ex.: exportação do Goodreads).
+# rows_processed guarda até onde o arquivo já foi lido, para a importação poder ser retomada
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Importando'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='import_jobs')
+    source = models.FileField(upload_to='imports/')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Importação {self.id} de {self.user.username}"
+
+
+# Totais da lista de cada usuário (livros por status e páginas lidas), atualizados junto com as
+# escritas em UserBook (core/reading_stats.py). O perfil lê uma linha, em vez de COUNT ... GROUP BY
+# sobre a lista inteira. O comando rebuild_reading_stats confere e corrige divergências
+class ReadingStats(models.Model):
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='reading_stats')
+    plan = models.IntegerField(default=0)
+    reading = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    dropped = models.IntegerField(default=0)
+    pages_read = models.BigIntegerField(default=0)  # soma do pageCount (BookVolume) dos livros completos
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total(self):
+        return self.plan + self.reading + self.completed + self.dropped
+
+    def __str__(self):
+        return f"Estatísticas de {self.user.username}"
+
+
+# Livros adicionados à lista por mês (month é o primeiro dia do mês, no fuso do site)
+class ReadingMonth(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reading_months')
+    month = models.DateField()
+    added = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'month')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%m/%Y}"
+
+
+# Fila de tarefas em segundo plano guardada no próprio banco (sem broker externo), executada pelo
+# comando run_jobs (core/jobs.py). key identifica o objeto da tarefa (ex.: o id do Book); só pode haver
+# uma tarefa pendente ou em execução por tipo e objeto. Tarefas concluídas são apagadas
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Executando'),
+        ('failed', 'Falhou'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    key = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField()  # só é executada a partir daqui (novas tentativas esperam o backoff)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'key'], condition=models.Q(status__in=['pending', 'running']), name='job_unique_active',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.key} ({self.status})"
+
+
+# Recomendações "quem leu também leu": os vizinhos mais parecidos de cada livro (até RECOMMENDATIONS["TOP_K"]),
+# pela co-ocorrência nas listas dos usuários (core.recommendations). Recalculada inteira pelo comando
+# rebuild_recommendations e atualizada livro a livro pela tarefa "neighbors" quando as listas mudam
+class BookNeighbor(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbor_of')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            # vizinhos de um livro, do mais parecido ao menos: uma leitura no índice por página de detalhes
+            models.Index(fields=['book', '-score'], name='bookneighbor_book_score_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'neighbor'], name='bookneighbor_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+# Autores e categorias normalizados (core.taxonomy), para "livros deste autor" e os filtros do perfil por
+# índice, em vez de LIKE '%...%' em Book.authors e BookVolume.categories, que continuam sendo o texto exibido.
+# name é único (índice B-tree); a tabela de ligação tem índice nas duas colunas
+class Author(models.Model):
+    name = models.CharField(max_length=300, unique=True)
+    books = models.ManyToManyField(Book, blank=True)  # book.author_set, filtros por book__author
+
+    def __str__(self):
+        return self.name
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=300, unique=True)
+    books = models.ManyToManyField(Book, blank=True)  # book.category_set, filtros por book__category
+
+    class Meta:
+        verbose_name_plural = 'categories'
 
     def __str__(self):
-        return f"{self.user.username} - {self.book.title}"
\ No newline at end of file
+        return self.name
@@ -0,0 +1,99 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+# Página de uma paginação por cursor: só sabe se há página anterior/seguinte, sem COUNT(*)
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+# Paginação por cursor (keyset): em vez de OFFSET, filtra a partir da chave de ordenação do último item
+# visto, então qualquer página custa o mesmo que a primeira. A ordenação precisa terminar em um campo
+# único (ex.: "-added_at", "-id") e ter um índice que a cubra.
+#
+# Os cursores são opacos e assinados: o cliente só devolve o valor recebido em next/previous.
+class KeysetPaginator:
+    SALT = "core.pagination.cursor"
+
+    def __init__(self, queryset, per_page, ordering=("-added_at", "-id")):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [name.lstrip("-") for name in ordering]
+        self.descending = [name.startswith("-") for name in ordering]
+
+    def page(self, cursor=None):
+        if not cursor:
+            return self._forward(self.queryset, first=True)
+        values, direction = self.decode_cursor(cursor)
+        if direction == "next":
+            return self._forward(self.queryset.filter(self._after(values, reverse=False)))
+        return self._backward(self.queryset.filter(self._after(values, reverse=True)))
+
+    def _forward(self, queryset, first=False):
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor(rows[-1], "next") if has_more else None
+        previous_cursor = None if first or not rows else self.encode_cursor(rows[0], "previous")
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def _backward(self, queryset):
+        reversed_ordering = [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+        rows = list(queryset.order_by(*reversed_ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        previous_cursor = self.encode_cursor(rows[0], "previous") if has_more else None
+        next_cursor = self.encode_cursor(rows[-1], "next") if rows else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    # Filtro "depois de `values` na ordenação" (ou antes, com reverse=True), como comparação de tuplas:
+    # (a < a0) OR (a = a0 AND b < b0) OR ...
+    def _after(self, values, reverse):
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            descending = self.descending[index] != reverse
+            lookup = "lt" if descending else "gt"
+            equal = {name: values[i] for i, name in enumerate(self.fields[:index])}
+            condition |= Q(**equal, **{f"{field}__{lookup}": values[index]})
+        return condition
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, field) for field in self.fields]
+        payload = {"v": [value.isoformat() if hasattr(value, "isoformat") else value for value in values], "d": direction}
+        return signing.dumps(payload, salt=self.SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = signing.loads(cursor, salt=self.SALT)
+            model = self.queryset.model
+            values = [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, payload["v"])]
+            direction = payload["d"]
+        except (signing.BadSignature, ValidationError, KeyError, TypeError, ValueError) as exc:
+            raise InvalidCursor(str(exc)) from exc
+        if direction not in ("next", "previous") or len(values) != len(self.fields):
+            raise InvalidCursor("cursor inválido")
+        return values, direction
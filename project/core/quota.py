@@ -0,0 +1,177 @@
+import asyncio
+import functools
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.core.cache import caches
+
+from .google_books import UpstreamUnavailable
+
+INTERACTIVE = "interactive"  # o usuário está esperando a resposta (busca, detalhes)
+BACKGROUND = "background"  # páginas antecipadas, atualização de volumes, importações
+
+_priority = ContextVar("google_books_priority", default=INTERACTIVE)
+
+
+# A cota da API acabou (ou está reservada para as chamadas interativas): as páginas usam o cache e o
+# catálogo local, como quando a API está fora do ar
+class QuotaExceeded(UpstreamUnavailable):
+    pass
+
+
+# Marca as chamadas feitas dentro do bloco como de segundo plano
+@contextmanager
+def background():
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# Envolve uma função que vai rodar em outra thread (pool de prefetch, importação...) como segundo plano
+def in_background(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with background():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def current_priority():
+    return _priority.get()
+
+
+# Cota da API do Google Books compartilhada por todos os workers, guardada no cache (Redis em produção,
+# locmem nos testes). Dois limites:
+#   - um token bucket (capacity tokens, repostos a `rate` por segundo) que segura os picos;
+#   - o limite diário do Google (daily_limit chamadas por dia, contado em UTC).
+# As chamadas de segundo plano só usam a parte acima de `background_reserve` (fração do bucket e do
+# limite diário): quando o orçamento aperta, sobra cota para quem está esperando na página.
+#
+# O estado do bucket é lido e gravado sob uma trava curta no cache (cache.add com um token único de quem
+# a pegou; só quem ainda tem o token a apaga). Se a trava não sair a tempo, a chamada é recusada com
+# QuotaExceeded: sem a trava, dois workers gastariam o mesmo token e passariam do limite do Google.
+class QuotaManager:
+    def __init__(self, alias, rate, capacity, daily_limit, background_reserve=0.5, lock_timeout=2, prefix="gb-quota"):
+        self.alias = alias
+        self.rate = rate
+        self.capacity = capacity
+        self.daily_limit = daily_limit
+        self.background_reserve = background_reserve
+        self.lock_timeout = lock_timeout
+        self.bucket_key = f"{prefix}:bucket"
+        self.lock_key = f"{prefix}:lock"
+        self.prefix = prefix
+        self._rejected = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def day_key(self, now):
+        return f"{self.prefix}:day:{datetime.fromtimestamp(now, timezone.utc):%Y-%m-%d}"
+
+    # Gasta uma chamada da cota ou levanta QuotaExceeded
+    def acquire(self, priority=None):
+        priority = priority or current_priority()
+        now = time.time()
+        day_key = self.day_key(now)
+        with self._locked():
+            tokens = self._refill(self.backend.get(self.bucket_key), now)
+            used = self.backend.get(day_key, 0)
+            allowed = self._allows(tokens, used, priority)
+            if allowed:
+                tokens -= 1
+                self._count_call(day_key)
+            self.backend.set(self.bucket_key, {"tokens": tokens, "updated": now}, None)
+        if not allowed:
+            self._reject(priority)
+
+    async def aacquire(self, priority=None):
+        priority = priority or current_priority()
+        now = time.time()
+        day_key = self.day_key(now)
+        async with self._alocked():
+            tokens = self._refill(await self.backend.aget(self.bucket_key), now)
+            used = await self.backend.aget(day_key, 0)
+            allowed = self._allows(tokens, used, priority)
+            if allowed:
+                tokens -= 1
+                await self.backend.aadd(day_key, 0, 2 * 24 * 60 * 60)
+                await self.backend.aincr(day_key)
+            await self.backend.aset(self.bucket_key, {"tokens": tokens, "updated": now}, None)
+        if not allowed:
+            self._reject(priority)
+
+    def _refill(self, state, now):
+        if state is None:
+            return self.capacity
+        return min(self.capacity, state["tokens"] + max(0.0, now - state["updated"]) * self.rate)
+
+    def _allows(self, tokens, used, priority):
+        reserve = self.background_reserve if priority == BACKGROUND else 0.0
+        if used >= self.daily_limit * (1 - reserve):
+            return False
+        return tokens >= 1 + self.capacity * reserve
+
+    def _count_call(self, day_key):
+        self.backend.add(day_key, 0, 2 * 24 * 60 * 60)  # a contagem do dia expira sozinha
+        self.backend.incr(day_key)
+
+    def _reject(self, priority):
+        with self._stats_lock:
+            self._rejected[priority] += 1
+        raise QuotaExceeded(f"cota da API do Google Books esgotada ({priority})")
+
+    def _lock_busy(self):
+        return QuotaExceeded("cota da API do Google Books indisponível (trava ocupada)")
+
+    @contextmanager
+    def _locked(self):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.backend.add(self.lock_key, token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                raise self._lock_busy()
+            time.sleep(0.002)
+        try:
+            yield
+        finally:
+            # A trava pode ter expirado e sido pega por outro worker: só apaga se ainda for a nossa
+            if self.backend.get(self.lock_key) == token:
+                self.backend.delete(self.lock_key)
+
+    @asynccontextmanager
+    async def _alocked(self):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not await self.backend.aadd(self.lock_key, token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                raise self._lock_busy()
+            await asyncio.sleep(0.002)
+        try:
+            yield
+        finally:
+            if await self.backend.aget(self.lock_key) == token:
+                await self.backend.adelete(self.lock_key)
+
+    # Cota restante (métricas): tokens no bucket agora e chamadas que ainda cabem no dia
+    def stats(self):
+        now = time.time()
+        used = self.backend.get(self.day_key(now), 0)
+        with self._stats_lock:
+            rejected = dict(self._rejected)
+        return {
+            "tokens": self._refill(self.backend.get(self.bucket_key), now),
+            "capacity": self.capacity,
+            "daily_limit": self.daily_limit,
+            "used_today": used,
+            "remaining_today": max(0, self.daily_limit - used),
+            "rejected": rejected,
+        }
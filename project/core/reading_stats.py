@@ -0,0 +1,186 @@
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import replicas
+from .models import BookVolume, CustomUser, ReadingMonth, ReadingStats, UserBook
+
+STATUSES = [status for status, _ in UserBook.STATUS_CHOICES]
+
+
+# Primeiro dia do mês de added_at, no fuso do site (o mesmo corte do TruncMonth usado no rebuild)
+def month_of(added_at):
+    return timezone.localtime(added_at).date().replace(day=1)
+
+
+# Mudanças na lista de um usuário, acumuladas e gravadas de uma vez em apply()
+class Delta:
+    def __init__(self):
+        self.statuses = Counter()
+        self.months = Counter()
+        self.completed_books = Counter()  # book_id -> +1/-1 nos livros completos, para as páginas lidas
+
+    def add(self, book_id, status, added_at, sign=1):
+        self.statuses[status] += sign
+        self.months[month_of(added_at)] += sign
+        if status == "completed":
+            self.completed_books[book_id] += sign
+
+    def change(self, book_id, old, new):
+        if old == new:
+            return
+        self.statuses[old] -= 1
+        self.statuses[new] += 1
+        if old == "completed":
+            self.completed_books[book_id] -= 1
+        if new == "completed":
+            self.completed_books[book_id] += 1
+
+    def pages(self):
+        books = [book_id for book_id, sign in self.completed_books.items() if sign]
+        if not books:
+            return 0
+        page_counts = BookVolume.objects.filter(book_id__in=books, page_count__isnull=False).values_list("book_id", "page_count")
+        return sum(self.completed_books[book_id] * pages for book_id, pages in page_counts)
+
+
+# Soma o delta nos contadores do usuário com UPDATE ... SET x = x + n. Deve rodar na mesma transação
+# da escrita em UserBook: se ela for desfeita, os contadores também são
+def apply(user_id, delta):
+    changes = {status: F(status) + count for status, count in delta.statuses.items() if count}
+    pages = delta.pages()
+    if pages:
+        changes["pages_read"] = F("pages_read") + pages
+    if not changes and not any(delta.months.values()):
+        return
+    changes["updated_at"] = timezone.now()
+    if not ReadingStats.objects.filter(user_id=user_id).update(**changes):
+        return  # ainda sem estatísticas: get_stats monta tudo a partir da lista quando precisar
+    for month, count in delta.months.items():
+        if not count:
+            continue
+        row = ReadingMonth.objects.filter(user_id=user_id, month=month)
+        if not row.update(added=F("added") + count):
+            # primeiro livro do mês: cria a linha zerada (sem conflito se outra requisição criar junto) e soma
+            ReadingMonth.objects.bulk_create([ReadingMonth(user_id=user_id, month=month)], ignore_conflicts=True)
+            row.update(added=F("added") + count)
+
+
+# rows: (book_id, status, added_at) de cada UserBook criado
+def books_added(user_id, rows):
+    delta = Delta()
+    for book_id, status, added_at in rows:
+        delta.add(book_id, status, added_at)
+    apply(user_id, delta)
+
+
+# rows: (book_id, status, added_at) de cada UserBook removido
+def books_removed(user_id, rows):
+    delta = Delta()
+    for book_id, status, added_at in rows:
+        delta.add(book_id, status, added_at, sign=-1)
+    apply(user_id, delta)
+
+
+# rows: (book_id, status anterior, status novo)
+def status_changed(user_id, rows):
+    delta = Delta()
+    for book_id, old, new in rows:
+        delta.change(book_id, old, new)
+    apply(user_id, delta)
+
+
+# O pageCount de um livro mudou (volume buscado ou atualizado na API): corrige as páginas lidas de
+# quem já marcou o livro como completo
+def page_count_changed(book_id, old, new):
+    difference = (new or 0) - (old or 0)
+    if difference:
+        readers = UserBook.objects.filter(book_id=book_id, status="completed").values("user_id")
+        ReadingStats.objects.filter(user_id__in=readers).update(pages_read=F("pages_read") + difference)
+
+
+# Estatísticas do usuário; se ainda não existirem (usuário anterior à tabela), são calculadas agora
+def get_stats(user):
+    alias = replicas.read_alias(user.pk)
+    stats = ReadingStats.objects.using(alias).filter(user=user).first()
+    if stats is None and alias != DEFAULT_DB_ALIAS:
+        stats = ReadingStats.objects.filter(user=user).first()  # usuário novo que a réplica ainda não recebeu
+    return stats if stats is not None else rebuild(user)
+
+
+# Livros adicionados nos últimos `count` meses (inclusive o atual), do mais antigo ao mais recente
+def recent_months(user, count=12):
+    today = timezone.localdate()
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        months.append(today.replace(year=year, month=month, day=1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    rows = ReadingMonth.objects.using(replicas.read_alias(user.pk)).filter(user=user, month__gte=months[-1])
+    added = dict(rows.values_list("month", "added"))
+    return [(month, added.get(month, 0)) for month in reversed(months)]
+
+
+# Valores certos, calculados a partir da lista (COUNT/SUM sobre UserBook). Usado pelo rebuild e pela verificação
+def expected(user):
+    userbooks = UserBook.objects.filter(user=user)
+    counts = dict(userbooks.values_list("status").annotate(count=Count("id")).order_by())
+    pages = userbooks.filter(status="completed").aggregate(pages=Sum("book__volume__page_count"))["pages"]
+    months = (
+        userbooks.annotate(month=TruncMonth("added_at", output_field=DateField()))
+        .values_list("month").annotate(count=Count("id")).order_by()
+    )
+    return {
+        **{status: counts.get(status, 0) for status in STATUSES},
+        "pages_read": pages or 0,
+        "months": dict(months),
+    }
+
+
+def current(user):
+    stats = ReadingStats.objects.filter(user=user).first()
+    if stats is None:
+        return None
+    return {
+        **{status: getattr(stats, status) for status in STATUSES},
+        "pages_read": stats.pages_read,
+        "months": dict(ReadingMonth.objects.filter(user=user).exclude(added=0).values_list("month", "added")),
+    }
+
+
+# Campos em que as estatísticas gravadas divergem da lista ({} se estiverem certas)
+def verify(user):
+    right, stored = expected(user), current(user)
+    if stored is None:
+        return {"missing": (None, right)}
+    return {name: (stored[name], value) for name, value in right.items() if stored[name] != value}
+
+
+# Recalcula as estatísticas do usuário a partir da lista. A linha de ReadingStats é travada antes da contagem:
+# uma escrita na lista que já somou seu delta (apply) termina antes e entra na contagem; uma que ainda vai
+# somar espera o rebuild e soma em cima do valor recalculado. Sem a trava, o delta podia ser contado duas
+# vezes ou se perder
+@transaction.atomic
+def rebuild(user):
+    ReadingStats.objects.get_or_create(user=user)
+    stats = ReadingStats.objects.select_for_update().get(user=user)
+    values = expected(user)
+    months = values.pop("months")
+    for name, value in values.items():
+        setattr(stats, name, value)
+    stats.save()
+    ReadingMonth.objects.filter(user=user).delete()
+    ReadingMonth.objects.bulk_create([ReadingMonth(user=user, month=month, added=added) for month, added in months.items()])
+    return stats
+
+
+# Usuários novos já começam com as estatísticas zeradas, e os contadores seguem a partir daí
+@receiver(post_save, sender=CustomUser)
+def _create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ReadingStats.objects.get_or_create(user=instance)
@@ -0,0 +1,231 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice, permutations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, FloatField, Min, Sum, Value, When
+
+from .models import Book, BookNeighbor, UserBook
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # sem NumPy/SciPy, o cálculo completo roda em Python puro (serve para alguns milhares de usuários)
+    np = sparse = None
+
+
+# Recomendações "quem leu também leu". As listas formam uma matriz usuários × livros em que cada célula é o
+# peso do status (RECOMMENDATIONS["WEIGHTS"]: completo > lendo > planejo ler > abandonado). A semelhança
+# entre dois livros é o cosseno entre as suas colunas, considerando só pares com pelo menos MIN_COMMON
+# leitores em comum; cada livro guarda os TOP_K vizinhos mais parecidos em BookNeighbor.
+#   - rebuild(): recalcula tudo (comando rebuild_recommendations, periódico). Com NumPy/SciPy, a matriz é
+#     esparsa e os produtos são feitos em blocos de BLOCK_SIZE livros;
+#   - update_book(): recalcula os pares de um livro cuja presença nas listas mudou (tarefa "neighbors").
+#     Só os pares que envolvem o livro mudam, então o resultado é o mesmo do rebuild, exceto pelo limite de
+#     MAX_BOOKS_PER_USER livros por usuário, que só o rebuild aplica;
+#   - as páginas só leem BookNeighbor (similar_books, for_user), sem nenhum cálculo na requisição.
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# (user_id, book_id, peso) de todas as listas, lidos em blocos; de cada usuário entram os
+# MAX_BOOKS_PER_USER livros mais recentes (uma lista enorme geraria pares demais e diria pouco)
+def load_interactions():
+    config = settings.RECOMMENDATIONS
+    weights = config["WEIGHTS"]
+    current, taken = None, 0
+    rows = UserBook.objects.order_by("user_id", "-added_at", "-id").values_list("user_id", "book_id", "status")
+    for user_id, book_id, status in rows.iterator(chunk_size=10000):
+        if user_id != current:
+            current, taken = user_id, 0
+        if taken < config["MAX_BOOKS_PER_USER"]:
+            taken += 1
+            yield user_id, book_id, weights[status]
+
+
+# Vizinhos de todos os livros a partir das colunas (usuários, livros, pesos) das interações.
+# Gera (book_id, neighbor_id, score), do vizinho mais parecido ao menos; empates pelo menor id
+def compute_neighbors(users, books, weights, top_k, min_common, block_size=None):
+    if np is None:
+        return _compute_python(users, books, weights, top_k, min_common)
+    return _compute_numpy(users, books, weights, top_k, min_common, block_size or settings.RECOMMENDATIONS["BLOCK_SIZE"])
+
+
+def _compute_numpy(users, books, weights, top_k, min_common, block_size):
+    weights = np.asarray(weights, dtype=np.float64)
+    user_ids, user_index = np.unique(np.asarray(users), return_inverse=True)
+    book_ids, book_index = np.unique(np.asarray(books), return_inverse=True)
+    shape = (len(user_ids), len(book_ids))
+    ratings = sparse.csr_matrix((weights, (user_index, book_index)), shape=shape)
+    readers = sparse.csr_matrix((np.ones_like(weights), (user_index, book_index)), shape=shape)
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    ratings_t, readers_t = ratings.T.tocsr(), readers.T.tocsr()
+
+    for start in range(0, len(book_ids), block_size):
+        # produtos escalares e leitores em comum de um bloco de livros com todos os outros. Os pesos são
+        # positivos, então as duas matrizes têm as mesmas células, e na forma canônica os arrays se alinham
+        dots = (ratings_t[start:start + block_size] @ ratings).tocsr()
+        common = (readers_t[start:start + block_size] @ readers).tocsr()
+        for matrix in (dots, common):
+            matrix.sum_duplicates()
+            matrix.sort_indices()
+        rows = np.repeat(np.arange(start, start + dots.shape[0]), np.diff(dots.indptr))
+        cols = dots.indices
+        scores = dots.data / (norms[rows] * norms[cols])
+        keep = (rows != cols) & (common.data >= min_common)
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)  # posição de cada par dentro do seu livro
+        keep = rank < top_k
+        yield from zip(book_ids[rows[keep]].tolist(), book_ids[cols[keep]].tolist(), scores[keep].tolist())
+
+
+def _compute_python(users, books, weights, top_k, min_common):
+    lists = defaultdict(list)
+    squares = defaultdict(float)
+    for user, book, weight in zip(users, books, weights):
+        lists[user].append((book, weight))
+        squares[book] += weight * weight
+    dots = defaultdict(float)
+    common = defaultdict(int)
+    for items in lists.values():
+        for (a, weight_a), (b, weight_b) in permutations(items, 2):
+            dots[a, b] += weight_a * weight_b
+            common[a, b] += 1
+    candidates = defaultdict(list)
+    for (a, b), dot in dots.items():
+        if common[a, b] >= min_common:
+            candidates[a].append((b, dot / (math.sqrt(squares[a]) * math.sqrt(squares[b]))))
+    for book in sorted(candidates):
+        for neighbor, score in _top(candidates[book], top_k):
+            yield book, neighbor, score
+
+
+def _top(scores, top_k):
+    return heapq.nsmallest(top_k, scores, key=lambda item: (-item[1], item[0]))
+
+
+# Recalcula a tabela inteira. Retorna o número de pares gravados
+def rebuild():
+    config = settings.RECOMMENDATIONS
+    interactions = list(load_interactions())
+    users, books, weights = zip(*interactions) if interactions else ((), (), ())
+    rows = compute_neighbors(users, books, weights, config["TOP_K"], config["MIN_COMMON"])
+    count = 0
+    with transaction.atomic():  # as páginas continuam lendo a tabela antiga até o commit
+        BookNeighbor.objects.all().delete()
+        for batch in _chunked(rows, 5000):
+            BookNeighbor.objects.bulk_create(BookNeighbor(book_id=a, neighbor_id=b, score=score) for a, b, score in batch)
+            count += len(batch)
+    return count
+
+
+def _squares_by_book(book_ids):
+    weights = settings.RECOMMENDATIONS["WEIGHTS"]
+    square = Case(*[When(status=status, then=Value(weight * weight)) for status, weight in weights.items()], output_field=FloatField())
+    squares = {}
+    for batch in _chunked(book_ids, 500):
+        squares.update(
+            UserBook.objects.filter(book_id__in=batch).values("book_id").annotate(total=Sum(square)).values_list("book_id", "total")
+        )
+    return squares
+
+
+# Semelhança do livro com cada livro que divide leitores com ele: {neighbor_id: score}
+def book_scores(book_id):
+    config = settings.RECOMMENDATIONS
+    weights = config["WEIGHTS"]
+    readers = {user_id: weights[status] for user_id, status in UserBook.objects.filter(book_id=book_id).values_list("user_id", "status")}
+    if not readers:
+        return {}
+    dots = defaultdict(float)
+    common = defaultdict(int)
+    others = UserBook.objects.filter(user_id__in=UserBook.objects.filter(book_id=book_id).values("user_id")).exclude(book_id=book_id)
+    for user_id, other, status in others.values_list("user_id", "book_id", "status").iterator(chunk_size=10000):
+        dots[other] += readers[user_id] * weights[status]
+        common[other] += 1
+    candidates = [other for other, count in common.items() if count >= config["MIN_COMMON"]]
+    squares = _squares_by_book(candidates)
+    norm = math.sqrt(sum(weight * weight for weight in readers.values()))
+    return {other: dots[other] / (norm * math.sqrt(squares[other])) for other in candidates}
+
+
+# Atualiza os pares de um livro nos dois sentidos: a lista de vizinhos dele e a presença dele na lista dos outros
+def update_book(book_id):
+    top_k = settings.RECOMMENDATIONS["TOP_K"]
+    scores = book_scores(book_id)
+    with transaction.atomic():
+        BookNeighbor.objects.filter(book_id=book_id).delete()
+        BookNeighbor.objects.bulk_create(
+            BookNeighbor(book_id=book_id, neighbor_id=neighbor, score=score) for neighbor, score in _top(scores.items(), top_k)
+        )
+
+        listed = {row.book_id: row for row in BookNeighbor.objects.filter(neighbor_id=book_id)}
+        gone = [row.pk for other, row in listed.items() if other not in scores]
+        for batch in _chunked(gone, 500):
+            BookNeighbor.objects.filter(pk__in=batch).delete()
+        changed = []
+        for other, row in listed.items():
+            if other in scores and row.score != scores[other]:
+                row.score = scores[other]
+                changed.append(row)
+        BookNeighbor.objects.bulk_update(changed, ["score"], batch_size=500)
+
+        # entra na lista dos livros em que ficaria entre os TOP_K, tirando o último de quem passar do limite
+        fresh = [other for other in scores if other not in listed]
+        sizes = {}
+        for batch in _chunked(fresh, 500):
+            for row in BookNeighbor.objects.filter(book_id__in=batch).values("book_id").annotate(size=Count("id"), lowest=Min("score")):
+                sizes[row["book_id"]] = (row["size"], row["lowest"])
+        added = [other for other in fresh if other not in sizes or sizes[other][0] < top_k or scores[other] > sizes[other][1]]
+        BookNeighbor.objects.bulk_create(
+            (BookNeighbor(book_id=other, neighbor_id=book_id, score=scores[other]) for other in added), batch_size=500,
+        )
+        full = [other for other in added if other in sizes and sizes[other][0] >= top_k]
+        extra = []
+        for batch in _chunked(full, 500):
+            ranked = defaultdict(list)
+            for pk, other, neighbor, score in BookNeighbor.objects.filter(book_id__in=batch).values_list("pk", "book_id", "neighbor_id", "score"):
+                ranked[other].append((pk, neighbor, score))
+            for rows in ranked.values():
+                rows.sort(key=lambda row: (-row[2], row[1]))
+                extra += [pk for pk, _, _ in rows[top_k:]]
+        for batch in _chunked(extra, 500):
+            BookNeighbor.objects.filter(pk__in=batch).delete()
+
+
+# Livros parecidos com o da página de detalhes: uma leitura no índice (book, -score)
+def similar_books(google_book_id, limit=None):
+    return [row.neighbor for row in _similar_queryset(google_book_id, limit)]
+
+
+async def asimilar_books(google_book_id, limit=None):
+    return [row.neighbor async for row in _similar_queryset(google_book_id, limit)]
+
+
+def _similar_queryset(google_book_id, limit):
+    limit = limit or settings.RECOMMENDATIONS["SHOW"]
+    rows = BookNeighbor.objects.filter(book__google_book_id=google_book_id).select_related("neighbor")
+    return rows.order_by("-score", "neighbor_id")[:limit]
+
+
+# Recomendações para o perfil: vizinhos dos PROFILE_SEEDS livros mais recentes da lista (fora os abandonados),
+# somando as semelhanças, sem os livros que o usuário já tem. Uma query, feita só quando o fragmento
+# do template não está em cache
+def for_user(user_id, limit=None):
+    config = settings.RECOMMENDATIONS
+    userbooks = UserBook.objects.filter(user_id=user_id)
+    seeds = userbooks.exclude(status="dropped").order_by("-added_at", "-id").values("book_id")[:config["PROFILE_SEEDS"]]
+    return (
+        Book.objects.filter(neighbor_of__book_id__in=seeds)
+        .exclude(id__in=userbooks.values("book_id"))
+        .annotate(recommendation_score=Sum("neighbor_of__score"))
+        .order_by("-recommendation_score", "id")[:limit or config["SHOW"]]
+    )
@@ -0,0 +1,49 @@
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Réplicas de leitura (settings.DATABASE_REPLICAS). As leituras só vão para uma réplica quando o código pede
+# (read_alias / QuerySet.using): listagem do perfil, índice de busca local, estatísticas e filtros. O resto,
+# incluindo leituras dentro de transações de escrita e SELECT ... FOR UPDATE, continua no default.
+# Leia-o-que-escreveu: quem muda a lista (fragments.list_changed) fica preso ao default por
+# REPLICA_PIN_SECONDS s. A marca fica no cache de fragmentos (compartilhado entre os workers), por usuário,
+# então vale para todas as sessões dele, para a API e para o que o worker gravar em nome dele
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def _backend():
+    return caches[settings.FRAGMENT_CACHE["ALIAS"]]
+
+
+def pin(user_id):
+    if settings.DATABASE_REPLICAS:
+        _backend().set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return _backend().get(_pin_key(user_id)) is not None
+
+
+# Banco para leituras que aceitam o atraso das réplicas. Com user_id, respeita a marca de leia-o-que-escreveu
+def read_alias(user_id=None):
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or (user_id is not None and is_pinned(user_id)):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    # Objetos lidos de uma réplica e depois salvos (ex.: um UserBook do perfil) são gravados no default;
+    # sem o roteador, o Django gravaria no banco de onde o objeto veio
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # as réplicas têm os mesmos dados do default
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
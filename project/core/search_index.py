@@ -0,0 +1,177 @@
+import bisect
+import difflib
+import re
+import threading
+import unicodedata
+
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import replicas
+from .models import Book
+
+# Configuração de texto do PostgreSQL: "simple" não aplica stemming, porque o catálogo mistura idiomas
+SEARCH_CONFIG = "simple"
+
+
+# Documento pesquisável do livro: título pesa mais que autores, que pesam mais que a editora.
+# É a mesma expressão do índice GIN (migração 0008, que tem uma cópia dela), para o PostgreSQL poder
+# usá-lo nas buscas: mudar a expressão pede uma migração nova para o índice
+def book_search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("authors", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("publisher", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+# Busca no PostgreSQL: full-text (websearch, ex.: "harry potter -chamber") com fallback de trigramas
+# no título para erros de digitação. As duas condições usam índices GIN
+class PostgresSearchBackend:
+    def search(self, query, limit):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return list(
+            Book.objects.using(replicas.read_alias()).alias(document=book_search_vector())
+            .filter(Q(document=search_query) | Q(title__trigram_similar=query))
+            .annotate(rank=SearchRank(F("document"), search_query) + TrigramSimilarity("title", query))
+            .order_by("-rank", "title")[:limit]
+        )
+
+    def add(self, books):
+        pass  # o índice é mantido pelo próprio banco
+
+
+# Índice invertido em memória para bancos sem full-text (SQLite nos testes e em desenvolvimento).
+# Palavra -> ids dos livros; o último termo da busca também casa por prefixo e termos que não existem
+# no vocabulário são trocados pelos mais parecidos (erros de digitação). O índice é montado na
+# primeira busca e atualizado a cada livro salvo; os candidatos são sempre relidos do banco
+class InMemorySearchIndex:
+    FIELD_WEIGHTS = {"title": 3, "authors": 2, "publisher": 1}
+
+    def __init__(self):
+        self._postings = {}  # palavra -> {book_id: peso}
+        self._documents = {}  # book_id -> palavras do livro
+        self._vocabulary = []  # palavras ordenadas, para a busca por prefixo
+        self._dirty = False
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            scores = None
+            for position, term in enumerate(terms):
+                matches = self._match(term, prefix=position == len(terms) - 1)
+                scores = matches if scores is None else {
+                    book_id: score + matches[book_id] for book_id, score in scores.items() if book_id in matches
+                }
+                if not scores:
+                    return []
+        books = Book.objects.in_bulk(list(scores))  # descarta ids de livros que já não existem
+        ranked = sorted(books.values(), key=lambda book: (-scores[book.id], book.title))
+        return ranked[:limit]
+
+    # {book_id: peso} dos livros que contêm o termo (ou uma palavra que começa com ele)
+    def _match(self, term, prefix):
+        if self._dirty:
+            self._vocabulary = sorted(self._postings)
+            self._dirty = False
+        words = [term] if term in self._postings else []
+        if prefix:
+            start = bisect.bisect_left(self._vocabulary, term)
+            for word in self._vocabulary[start:]:
+                if not word.startswith(term):
+                    break
+                words.append(word)
+        if not words:
+            words = difflib.get_close_matches(term, self._vocabulary, n=3, cutoff=0.8)
+        matches = {}
+        for word in words:
+            for book_id, weight in self._postings[word].items():
+                matches[book_id] = max(matches.get(book_id, 0), weight)
+        return matches
+
+    def add(self, books):
+        with self._lock:
+            for book in books:
+                self._add(book)
+
+    def _add(self, book):
+        self._remove(book.id)  # ids podem ser reaproveitados (ex.: rollback nos testes)
+        weights = {}
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for word in tokenize(getattr(book, field) or ""):
+                weights[word] = max(weights.get(word, 0), weight)
+        for word, weight in weights.items():
+            if word not in self._postings:
+                self._postings[word] = {}
+                self._dirty = True
+            self._postings[word][book.id] = weight
+        self._documents[book.id] = list(weights)
+
+    def _remove(self, book_id):
+        for word in self._documents.pop(book_id, []):
+            postings = self._postings.get(word, {})
+            postings.pop(book_id, None)
+            if not postings:
+                self._postings.pop(word, None)
+                self._dirty = True
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        books = Book.objects.only("id", *self.FIELD_WEIGHTS).iterator(chunk_size=2000)
+        with self._lock:
+            if not self._loaded:
+                for book in books:
+                    self._add(book)
+                self._loaded = True
+
+    def reset(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._vocabulary = []
+            self._loaded = False
+
+
+# Palavras normalizadas: minúsculas e sem acentos ("Memórias" e "memorias" são o mesmo termo)
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"\w+", text)
+
+
+_postgres_backend = PostgresSearchBackend()
+_memory_index = InMemorySearchIndex()
+
+
+def get_backend():
+    return _postgres_backend if connection.vendor == "postgresql" else _memory_index
+
+
+# Livros do catálogo local que casam com a busca, do mais para o menos relevante
+def search_books(query, limit=20):
+    query = " ".join(query.split())
+    if not query:
+        return []
+    return get_backend().search(query, limit)
+
+
+# Livros criados com bulk_create não disparam post_save: quem cria em lote avisa o índice
+def index_books(books):
+    get_backend().add(list(books))
+
+
+@receiver(post_save, sender=Book)
+def _index_saved_book(sender, instance, **kwargs):
+    index_books([instance])
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from django.core.cache import caches
+
+_MISSING = object()
+
+
+# Chamada em andamento dentro do processo: quem chega depois espera o mesmo resultado
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Coalescência de chamadas idênticas ("single-flight"): enquanto uma chamada para a chave está em
+# andamento, as chamadas iguais esperam por ela em vez de repetir o pedido à API.
+#
+# Dentro do processo, as threads esperam a primeira. Entre processos (workers do gunicorn), quem vai
+# buscar pega uma trava no cache compartilhado (cache.add) e publica o resultado por alguns segundos;
+# os outros workers esperam esse resultado. Se a trava expirar sem resultado (ex.: o worker morreu),
+# quem estava esperando faz a chamada por conta própria.
+class SingleFlight:
+    def __init__(self, alias=None, lock_timeout=15, result_timeout=10, wait_timeout=10, poll_interval=0.05, prefix="flight"):
+        self.alias = alias  # sem alias, só coalesce dentro do processo
+        self.lock_timeout = lock_timeout
+        self.result_timeout = result_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._calls = {}  # chave -> _Call
+        self._async_calls = weakref.WeakKeyDictionary()  # event loop -> {chave: Future}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executed": 0, "shared_local": 0, "shared_remote": 0}
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, *parts):
+        digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    # Executa fn() uma vez por chave, entre todas as threads (e processos) que pedirem a mesma chave
+    def do(self, key, fn):
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._stats["shared_local"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _do_shared(self, key, fn):
+        if self.alias is None:
+            return self._execute(fn)
+        lock_key, result_key = f"{key}:lock", f"{key}:result"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while not self.backend.add(lock_key, token, self.lock_timeout):
+            waited = True
+            # outro worker está buscando: espera o resultado publicado ou a trava sumir
+            published = self.backend.get(result_key, _MISSING)
+            if published is not _MISSING:
+                self._count("shared_remote")
+                return published
+            if time.monotonic() >= deadline:
+                return self._execute(fn)
+            time.sleep(self.poll_interval)
+        try:
+            if waited:
+                # o outro worker pode ter publicado e soltado a trava entre duas verificações
+                published = self.backend.get(result_key, _MISSING)
+                if published is not _MISSING:
+                    self._count("shared_remote")
+                    return published
+            result = self._execute(fn)
+            self.backend.set(result_key, result, self.result_timeout)
+            return result
+        finally:
+            self._release(lock_key, token)
+
+    def _release(self, lock_key, token):
+        # o cache não tem compare-and-delete: confere o dono antes para não soltar a trava de outro worker
+        if self.backend.get(lock_key) == token:
+            self.backend.delete(lock_key)
+
+    # Versão para as views assíncronas: as corrotinas do mesmo event loop esperam o mesmo Future
+    async def ado(self, key, fn):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats["calls"] += 1
+            calls = self._async_calls.setdefault(loop, {})
+            future = calls.get(key)
+            leader = future is None
+            if leader:
+                future = calls[key] = loop.create_future()
+            else:
+                self._stats["shared_local"] += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await self._ado_shared(key, fn)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # marca como lida: sem ninguém esperando, não gera aviso no log
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                calls.pop(key, None)
+
+    async def _ado_shared(self, key, fn):
+        if self.alias is None:
+            return await self._aexecute(fn)
+        lock_key, result_key = f"{key}:lock", f"{key}:result"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while not await self.backend.aadd(lock_key, token, self.lock_timeout):
+            waited = True
+            published = await self.backend.aget(result_key, _MISSING)
+            if published is not _MISSING:
+                self._count("shared_remote")
+                return published
+            if time.monotonic() >= deadline:
+                return await self._aexecute(fn)
+            await asyncio.sleep(self.poll_interval)
+        try:
+            if waited:
+                # o outro worker pode ter publicado e soltado a trava entre duas verificações
+                published = await self.backend.aget(result_key, _MISSING)
+                if published is not _MISSING:
+                    self._count("shared_remote")
+                    return published
+            result = await self._aexecute(fn)
+            await self.backend.aset(result_key, result, self.result_timeout)
+            return result
+        finally:
+            if await self.backend.aget(lock_key) == token:
+                await self.backend.adelete(lock_key)
+
+    def _execute(self, fn):
+        self._count("executed")
+        return fn()
+
+    async def _aexecute(self, fn):
+        self._count("executed")
+        return await fn()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    # saved: chamadas à API evitadas (esperaram a de outra thread, corrotina ou worker)
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["saved"] = stats["shared_local"] + stats["shared_remote"]
+        return stats
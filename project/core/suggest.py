@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+from .models import Book
+from .search_index import tokenize
+
+
+# Sugestões da busca (autocomplete) por prefixo de título, de autor ou de pesquisas populares.
+# As chaves normalizadas ficam em um array ordenado: o prefixo é localizado com bisect e as entradas
+# seguintes são lidas até o prefixo deixar de casar. Inserções usam insort, sem reconstruir o array.
+# As respostas por prefixo ficam em um LRU, invalidado só para os prefixos das chaves novas
+class SuggestIndex:
+    MAX_SCAN = 400  # entradas lidas por consulta, para prefixos muito comuns ("a", "the") não pesarem
+    MAX_PREFIX = 32  # prefixos maiores que isso não vão para o cache de respostas
+
+    def __init__(self, cache_size=2048, min_query_count=3, max_tracked_queries=10000, refresh_interval=60):
+        self.cache_size = cache_size
+        self.min_query_count = min_query_count
+        self.max_tracked_queries = max_tracked_queries
+        self.refresh_interval = refresh_interval
+        self._keys = []  # chaves normalizadas, ordenadas
+        self._entries = []  # (tipo, texto) da chave na mesma posição
+        self._scores = {}  # (tipo, texto) -> peso no ranking
+        self._queries = Counter()  # pesquisas feitas, até virarem sugestão
+        self._results = OrderedDict()  # prefixo -> sugestões (LRU)
+        self._last_book_id = 0
+        self._refreshed_at = None
+        self._lock = threading.RLock()
+
+    def suggest(self, prefix, limit=8):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self._refresh()
+        with self._lock:
+            cached = self._results.get(prefix)
+            if cached is None:
+                cached = self._lookup(prefix)
+                if len(prefix) <= self.MAX_PREFIX:
+                    self._results[prefix] = cached
+                    while len(self._results) > self.cache_size:
+                        self._results.popitem(last=False)
+            else:
+                self._results.move_to_end(prefix)
+        return cached[:limit]
+
+    def _lookup(self, prefix, size=20):
+        start = bisect.bisect_left(self._keys, prefix)
+        seen = {}
+        for index in range(start, min(start + self.MAX_SCAN, len(self._keys))):
+            if not self._keys[index].startswith(prefix):
+                break
+            entry = self._entries[index]
+            seen[entry] = self._scores.get(entry, 0)
+        ranked = sorted(seen, key=lambda entry: (-seen[entry], len(entry[1]), entry[1]))
+        return [{"text": text, "type": kind} for kind, text in ranked[:size]]
+
+    def add_book(self, book):
+        self.add_books([book])
+
+    # Poucos livros (cadastro pela busca) entram com insort; muitos de uma vez (carga inicial,
+    # importações) são anexados e o array é reordenado uma vez só
+    def add_books(self, books):
+        with self._lock:
+            pending = []
+            for book in books:
+                pending.append(("title", book.title))
+                pending.extend(("author", author.strip()) for author in (book.authors or "").split(","))
+                self._last_book_id = max(self._last_book_id, book.id or 0)
+            if len(pending) <= 64:
+                for kind, text in pending:
+                    self._add(kind, text)
+                return
+            for kind, text in pending:
+                key = normalize(text)
+                if key and (kind, text) not in self._scores:
+                    self._scores[(kind, text)] = 1
+                    self._keys.append(key)
+                    self._entries.append((kind, text))
+            order = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+            self._keys = [self._keys[i] for i in order]
+            self._entries = [self._entries[i] for i in order]
+            self._results.clear()
+
+    # Conta uma pesquisa feita na página de busca; a partir de min_query_count vezes ela vira sugestão,
+    # e cada nova ocorrência aumenta o peso dela no ranking
+    def record_query(self, query):
+        text = " ".join(query.split())
+        if not normalize(text):
+            return
+        with self._lock:
+            self._queries[text] += 1
+            count = self._queries[text]
+            if count >= self.min_query_count:
+                self._add("query", text, score=count)
+            if len(self._queries) > self.max_tracked_queries:
+                # esquece as pesquisas feitas uma vez só; as que já são sugestão continuam no índice
+                for stale in [text for text, count in self._queries.items() if count == 1]:
+                    del self._queries[stale]
+
+    def _add(self, kind, text, score=1):
+        key = normalize(text)
+        if not key:
+            return
+        entry = (kind, text)
+        if entry in self._scores:
+            self._scores[entry] = max(self._scores[entry], score)
+        else:
+            self._scores[entry] = score
+            position = bisect.bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._entries.insert(position, entry)
+        for length in range(1, min(len(key), self.MAX_PREFIX) + 1):
+            self._results.pop(key[:length], None)
+
+    # Na primeira consulta carrega todos os livros; depois, a cada refresh_interval segundos, só os
+    # criados desde então (por outros workers, importações, cadastros em lote)
+    def _refresh(self):
+        now = time.monotonic()
+        if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+                return
+            books = Book.objects.filter(id__gt=self._last_book_id).only("id", "title", "authors").order_by("id")
+            self.add_books(books.iterator(chunk_size=5000))
+            self._refreshed_at = now
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._keys), "cached_prefixes": len(self._results), "tracked_queries": len(self._queries)}
+
+    def reset(self):
+        with self._lock:
+            self._keys.clear()
+            self._entries.clear()
+            self._scores.clear()
+            self._queries.clear()
+            self._results.clear()
+            self._last_book_id = 0
+            self._refreshed_at = None
+
+
+def normalize(text):
+    return " ".join(tokenize(text))
+
+
+def _build_suggest_index():
+    config = settings.SEARCH_SUGGEST
+    return SuggestIndex(
+        cache_size=config["CACHE_SIZE"],
+        min_query_count=config["MIN_QUERY_COUNT"],
+        refresh_interval=config["REFRESH_INTERVAL"],
+    )
+
+
+# Índice compartilhado pelas views do processo
+suggest_index = _build_suggest_index()
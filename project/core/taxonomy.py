@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, Count, Value
+from django.db.models.functions import Cast
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import fragments, replicas
+from .models import Author, Book, Category, UserBook
+
+# Texto dos resultados sem autor (BookSearchView), que vai para Book.authors pelo formulário de adicionar
+PLACEHOLDERS = {"desconhecido"}
+
+
+# Autores e categorias normalizados (Author, Category) a partir dos textos exibidos: Book.authors é a lista
+# de autores da API unida por vírgulas; as categorias vêm da lista volumeInfo.categories do volume.
+#   - livros criados um por vez (views, admin) e autores preenchidos depois (tarefa "enrich") passam pelo
+#     post_save; quem cria em lote chama link_authors;
+#   - store_volume (core.volumes) troca as categorias quando o volume muda;
+#   - o perfil filtra por status × autor × categoria, e as contagens de cada filtro (facets) saem de uma
+#     query agrupada, guardada no cache de fragmentos pela versão da lista.
+def split_names(text):
+    return clean_names((text or "").split(","))
+
+
+# Sem espaços sobrando, repetições e o texto de "sem autor"
+def clean_names(names):
+    cleaned = []
+    for name in names:
+        name = " ".join(str(name).split())[:Author._meta.get_field("name").max_length]
+        if name and name.lower() not in PLACEHOLDERS and name not in cleaned:
+            cleaned.append(name)
+    return cleaned
+
+
+def _chunked(items, size=500):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# name -> id, criando os que ainda não existem (bulk_create ignora os nomes que outra requisição já criou)
+def _ensure(model, names):
+    ids = {}
+    for batch in _chunked(sorted(names)):
+        model.objects.bulk_create([model(name=name) for name in batch], ignore_conflicts=True)
+        ids.update(model.objects.filter(name__in=batch).values_list("name", "id"))
+    return ids
+
+
+# Liga cada livro aos nomes dados ({book_id: [nomes]}). Com replace, as ligações antigas dos livros saem antes
+def _link(model, names_by_book, replace=False):
+    through = model.books.through
+    column = f"{model._meta.model_name}_id"
+    with transaction.atomic():
+        if replace:
+            through.objects.filter(book_id__in=list(names_by_book)).delete()
+        ids = _ensure(model, {name for names in names_by_book.values() for name in names})
+        through.objects.bulk_create(
+            [through(book_id=book_id, **{column: ids[name]}) for book_id, names in names_by_book.items() for name in names],
+            ignore_conflicts=True, batch_size=1000,
+        )
+
+
+# Livros criados com bulk_create não disparam post_save: quem cria em lote liga os autores
+def link_authors(books):
+    names = {book.pk: split_names(book.authors) for book in books if book.pk}
+    names = {book_id: book_names for book_id, book_names in names.items() if book_names}
+    if names:
+        _link(Author, names)
+
+
+def set_authors(book):
+    _link(Author, {book.pk: split_names(book.authors)}, replace=True)
+
+
+# Troca as categorias do livro pelas do volume. Retorna True se mudaram
+def set_categories(book_id, names):
+    names = clean_names(names)
+    if set(Category.books.through.objects.filter(book_id=book_id).values_list("category__name", flat=True)) == set(names):
+        return False
+    _link(Category, {book_id: names}, replace=True)
+    return True
+
+
+@receiver(post_save, sender=Book)
+def _book_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        link_authors([instance])
+    elif update_fields is None or "authors" in update_fields:
+        set_authors(instance)
+
+
+# Filtros do perfil: {"status": ..., "author": id, "category": id}, só os informados
+def filter_userbooks(queryset, filters, skip=None):
+    lookups = {"status": "status", "author": "book__author", "category": "book__category"}
+    for name, lookup in lookups.items():
+        if name != skip and filters.get(name):
+            queryset = queryset.filter(**{lookup: filters[name]})
+    return queryset
+
+
+# Contagens dos filtros do perfil com os outros filtros aplicados (ex.: com um autor escolhido, quantos
+# livros dele há em cada status e categoria). Uma query: os três GROUP BY unidos com UNION ALL.
+# Retorna {"status": [(status, rótulo, n)], "author": [(id, nome, n)], "category": [...], "total": n}
+def facet_counts(user_id, filters):
+    userbooks = UserBook.objects.using(replicas.read_alias(user_id)).filter(user_id=user_id)
+
+    def grouped(facet, key, label):
+        rows = filter_userbooks(userbooks, filters, skip=facet).filter(**{f"{key}__isnull": False})
+        return (
+            rows.values(key, label).annotate(count=Count("id")).order_by()
+            .values_list(Value(facet), Cast(key, CharField()), Cast(label, CharField()), "count")
+        )
+
+    query = grouped("status", "status", "status").union(
+        grouped("author", "book__author__id", "book__author__name"),
+        grouped("category", "book__category__id", "book__category__name"),
+        all=True,
+    )
+    counts = {"status": {}, "author": [], "category": []}
+    for facet, key, label, count in query:
+        if facet == "status":
+            counts["status"][key] = count
+        else:
+            counts[facet].append((int(key), label, count))
+
+    limit = settings.FACETS["LIMIT"]
+    result = {"total": sum(counts["status"].values())}
+    result["status"] = [(status, label, counts["status"].get(status, 0)) for status, label in UserBook.STATUS_CHOICES]
+    for facet in ("author", "category"):
+        ranked = sorted(counts[facet], key=lambda row: (-row[2], row[1]))
+        shown = ranked[:limit]
+        shown += [row for row in ranked[limit:] if row[0] == filters.get(facet)]  # o filtro escolhido fica visível
+        result[facet] = shown
+    return result
+
+
+# facet_counts em cache: a chave leva a versão da lista, que muda com os livros e com as categorias deles
+def facets(user_id, filters):
+    key = f"facets:{user_id}:{fragments.list_version(user_id)}:{fragments.digest(filters)}"
+    result = fragments.backend().get(key)
+    if result is None:
+        result = facet_counts(user_id, filters)
+        fragments.backend().set(key, result, settings.FRAGMENT_CACHE["TIMEOUT"])
+    return result
@@ -1,3 +1,1310 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent import futures
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import AsyncRequestFactory, Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import Prefetcher, ResponseCache, search_cache, search_prefetcher, volume_cache
+from .fakes import FakeGoogleBooksServer
+from .google_books import CircuitBreaker, GoogleBooksClient, UpstreamUnavailable, get_client
+from . import covers, fragments, hydration, jobs as jobs_module, library, reading_stats, recommendations, replicas, search_index, volumes
+from .importers import ReadingListImporter, iter_json
+from .jobs import HANDLERS, Worker
+from .models import Author, Book, BookNeighbor, BookVolume, Category, CustomUser, ImportJob, Job, ReadingStats, UserBook
+from .quota import QuotaExceeded, QuotaManager, background
+from .singleflight import SingleFlight
+from .suggest import suggest_index
+from .views import AsyncBookDetailView, AsyncBookSearchView, BulkBooksView
+
+
+PROJECT_CACHES = settings.CACHES
+PROJECT_COVERS = settings.COVERS
+
+
+# Caches compartilhados ligados, como em produção com o Redis: nos testes há um processo só, então um LocMem serve
+def shared_caches(*aliases, **overrides):
+    caches_config = dict(settings.CACHES)
+    for alias in aliases:
+        caches_config[alias] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"{alias}-tests"}
+    return override_settings(CACHES=caches_config, **overrides)
+
+
+def shared_fragment_cache():
+    return shared_caches("fragments")
+
+
+# Sessões e usuário logado em cache (settings com GOOGLE_BOOKS_CACHE_URL)
+def cached_sessions():
+    return shared_caches(
+        "sessions",
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+        AUTHENTICATION_BACKENDS=["core.auth.CachedModelBackend", "django.contrib.auth.backends.ModelBackend"],
+    )
+
+
+def api_settings(base_url, **overrides):
+    config = dict(settings.GOOGLE_BOOKS_API, BASE_URL=base_url, BACKOFF=0, **overrides)
+    return override_settings(GOOGLE_BOOKS_API=config, BOOK_VOLUME_REFRESH_IN_BACKGROUND=False)
+
+
+class GoogleBooksClientTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer().start()
+        self.addCleanup(self.fake.stop)
+
+    def test_retries_server_errors(self):
+        client = GoogleBooksClient(self.fake.base_url, backoff=0, max_retries=2)
+        self.fake.fail_next = 2
+        data = client.search("intitle:duna", max_results=5)
+        self.assertEqual(len(data["items"]), 5)
+        self.assertEqual(self.fake.request_count, 3)
+        self.assertEqual(client.stats()["latency"]["search"]["errors"], 2)
+
+    def test_missing_volume_returns_none(self):
+        client = GoogleBooksClient(self.fake.base_url, backoff=0)
+        self.assertIsNone(client.volume("missing-1"))
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_circuit_opens_and_fails_fast(self):
+        client = GoogleBooksClient(self.fake.base_url, backoff=0, max_retries=0, breaker_threshold=2)
+        self.fake.error_rate = 1.0
+        for _ in range(2):
+            with self.assertRaises(UpstreamUnavailable):
+                client.volume("abc")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+        self.assertEqual(self.fake.request_count, 2)  # a terceira chamada nem saiu do processo
+
+    def test_quota_exceeded_does_not_leave_breaker_half_open(self):
+        quota = mock.Mock()
+        client = GoogleBooksClient(self.fake.base_url, backoff=0, max_retries=0, breaker_threshold=1,
+                                   breaker_reset_timeout=0.05, quota=quota)
+        self.fake.error_rate = 1.0
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+        self.assertEqual(quota.acquire.call_count, 1)  # circuito aberto: não gasta cota
+        time.sleep(0.06)
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        quota.acquire.side_effect = QuotaExceeded("sem cota")
+        with self.assertRaises(QuotaExceeded):
+            client.volume("abc")
+        quota.acquire.side_effect = None
+        self.fake.error_rate = 0.0
+        self.assertEqual(client.volume("abc")["id"], "abc")  # a chamada de teste ainda pode sair
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_calls_refused_while_probing_do_not_spend_quota(self):
+        quota = mock.Mock()
+        client = GoogleBooksClient(self.fake.base_url, backoff=0, max_retries=0, breaker_threshold=1,
+                                   breaker_reset_timeout=0.05, quota=quota)
+        self.fake.error_rate = 1.0
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+        time.sleep(0.06)
+        self.assertEqual(client.breaker.allow(), CircuitBreaker.HALF_OPEN)  # outra chamada está testando a API
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+        self.assertEqual(quota.acquire.call_count, 1)
+
+    def test_quota_exceeded_on_retry_gives_up_with_upstream_error(self):
+        quota = mock.Mock()
+        quota.acquire.side_effect = [None, QuotaExceeded("sem cota")]
+        client = GoogleBooksClient(self.fake.base_url, backoff=0, max_retries=2, breaker_threshold=1, quota=quota)
+        self.fake.fail_next = 1
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+        self.assertEqual(self.fake.request_count, 1)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+    def test_read_timeout(self):
+        client = GoogleBooksClient(self.fake.base_url, backoff=0, max_retries=0, read_timeout=0.05)
+        self.fake.latency = 0.2
+        with self.assertRaises(UpstreamUnavailable):
+            client.volume("abc")
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_identical_calls_hit_upstream_once(self):
+        fake = FakeGoogleBooksServer(latency=0.2).start()
+        self.addCleanup(fake.stop)
+        client = GoogleBooksClient(fake.base_url, backoff=0)
+        with futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: client.volume("abc"), range(8)))
+        self.assertEqual({result["id"] for result in results}, {"abc"})
+        self.assertEqual(fake.request_count, 1)
+        self.assertEqual(client.stats()["singleflight"]["saved"], 7)
+
+    def test_waits_for_call_made_by_another_worker(self):
+        caches["google_books"].clear()
+        worker_a, worker_b = SingleFlight(alias="google_books"), SingleFlight(alias="google_books", poll_interval=0.01)
+        key = worker_a.make_key("/volumes/abc")
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fetch():
+            started.set()
+            release.wait(5)
+            return {"id": "abc"}
+
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(worker_a.do, key, slow_fetch)
+            started.wait(5)
+            second = executor.submit(worker_b.do, key, lambda: self.fail("o segundo worker não deveria chamar a API"))
+            time.sleep(0.05)
+            release.set()
+            self.assertEqual(first.result(), second.result())
+        self.assertEqual(worker_b.stats()["shared_remote"], 1)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["google_books"].clear()
+        self.now = 1000.0
+        for name in ("time", "monotonic"):
+            patcher = mock.patch.object(time, name, lambda: self.now)  # o LocMem também usa time.time
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_cache(self, **options):
+        return ResponseCache("google_books", **{"timeout": 60, "max_entries": 10, "prefix": "test", **options})
+
+    def test_entries_expire_after_the_timeout(self):
+        cache = self.make_cache()
+        cache.set("a", {"id": 1})
+        self.now += 59
+        self.assertEqual(cache.get("a"), {"id": 1})
+        self.now += 2
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_backend_hit_keeps_only_the_remaining_ttl(self):
+        self.make_cache().set("a", {"id": 1})  # outro worker
+        self.now += 50
+        cache = self.make_cache()
+        self.assertEqual(cache.get("a"), {"id": 1})
+        self.now += 11
+        self.assertIsNone(cache.get("a"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self.make_cache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("b"), 2)  # fora do LRU local, ainda no backend
+        self.assertIsNone(cache.get("d"))
+        stats = cache.stats()
+        self.assertEqual(
+            {name: stats[name] for name in ("hits", "local_hits", "misses", "evictions", "sets", "size")},
+            {"hits": 2, "local_hits": 1, "misses": 1, "evictions": 2, "sets": 3, "size": 2},
+        )
+        self.assertAlmostEqual(stats["hit_ratio"], 2 / 3)
+
+
+class PrefetcherTests(SimpleTestCase):
+    def test_submit_does_not_deadlock_on_finished_future(self):
+        prefetcher = Prefetcher(max_workers=1)
+        self.addCleanup(prefetcher._executor.shutdown)
+
+        def submit_many():
+            for i in range(500):
+                prefetcher.submit(f"key-{i % 3}", lambda: None).result()
+
+        thread = threading.Thread(target=submit_many, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "submit travou com a busca já concluída")
+        self.assertEqual(prefetcher._inflight, {})
+
+    def test_concurrent_submits_share_the_future(self):
+        prefetcher = Prefetcher(max_workers=2)
+        self.addCleanup(prefetcher._executor.shutdown)
+        release = threading.Event()
+        first = prefetcher.submit("key", lambda: release.wait(5))
+        self.assertIs(prefetcher.submit("key", lambda: self.fail("busca repetida")), first)
+        release.set()
+        first.result()
+
+
+class UpstreamViewsTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer().start()
+        self.addCleanup(self.fake.stop)
+        search_cache.clear()
+        volume_cache.clear()
+        override = api_settings(self.fake.base_url, MAX_RETRIES=0, BREAKER_THRESHOLD=1)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def wait_for_prefetch(self):
+        futures.wait(list(search_prefetcher._inflight.values()))
+
+    def test_search_is_cached(self):
+        url = reverse("search") + "?q=Duna"
+        self.assertEqual(len(self.client.get(url).context["results"]), 21)
+        self.wait_for_prefetch()
+        calls = self.fake.request_count
+        self.client.get(reverse("search") + "?q=duna")
+        self.assertEqual(self.fake.request_count, calls)
+
+    def test_search_prefetches_result_window(self):
+        self.client.get(reverse("search") + "?q=duna")
+        self.wait_for_prefetch()
+        self.assertEqual(self.fake.request_count, 5)
+
+        response = self.client.get(reverse("search") + "?q=duna&page=4")
+        self.assertTrue(response.context["results"][0]["google_book_id"].endswith("-63"))
+        self.assertEqual(self.fake.request_count, 5)
+
+    def test_search_degrades_when_upstream_is_down(self):
+        self.fake.error_rate = 1.0
+        response = self.client.get(reverse("search") + "?q=duna")
+        self.assertTrue(response.context["unavailable"])
+        self.assertContains(response, "temporariamente indisponível")
+
+    def test_search_is_answered_from_local_catalogue(self):
+        Book.objects.bulk_create(
+            Book(google_book_id=f"local-{i}", title=f"Memórias do Subsolo {i}", authors="Dostoiévski") for i in range(25)
+        )
+        search_index.index_books(Book.objects.all())
+        response = self.client.get(reverse("search") + "?q=memorias dosto")
+        self.assertEqual(len(response.context["results"]), 21)
+        self.assertEqual(response.context["total_pages"], 2)
+        self.assertEqual(self.fake.request_count, 0)
+
+    def test_search_merges_local_hits_with_upstream(self):
+        Book.objects.create(google_book_id="local-1", title="Duna")
+        results = self.client.get(reverse("search") + "?q=duna").context["results"]
+        self.assertEqual(results[0]["google_book_id"], "local-1")
+        self.assertEqual(len(results), 21)
+        self.assertEqual(len({result["google_book_id"] for result in results}), 21)
+
+        self.wait_for_prefetch()
+        self.fake.error_rate = 1.0
+        search_cache.clear()
+        response = self.client.get(reverse("search") + "?q=dun")  # API fora do ar: sobra o catálogo local
+        self.assertEqual([result["google_book_id"] for result in response.context["results"]], ["local-1"])
+        self.assertFalse(response.context["unavailable"])
+        self.assertTrue(self.client.get(reverse("search") + "?q=dun&page=2").context["unavailable"])
+        self.wait_for_prefetch()
+
+    def test_merged_pages_keep_every_upstream_result(self):
+        upstream = [f"{hashlib.md5(b'intitle:duna').hexdigest()[:6]}-{i}" for i in range(105)]
+        Book.objects.create(google_book_id="local-1", title="Duna")
+        Book.objects.create(google_book_id=upstream[0], title="Duna")  # também vem da API
+        first = self.client.get(reverse("search") + "?q=duna").context
+        second = self.client.get(reverse("search") + "?q=duna&page=2").context
+        ids = [result["google_book_id"] for result in first["results"] + second["results"]]
+        self.assertEqual(ids[:2], ["local-1", upstream[0]])
+        self.assertEqual(ids[2:], upstream[1:41])  # a página 2 continua de onde a 1 parou
+        self.assertEqual(first["total_pages"], 5)
+        self.wait_for_prefetch()
+
+    def test_async_merged_pages_keep_every_upstream_result(self):
+        upstream = [f"{hashlib.md5(b'intitle:duna').hexdigest()[:6]}-{i}" for i in range(105)]
+        Book.objects.create(google_book_id="local-1", title="Duna")
+        view = AsyncBookSearchView()
+        results, total, unavailable = async_to_sync(view.aload_results)("duna", 2)
+        self.assertEqual([result["google_book_id"] for result in results], upstream[20:41])
+        self.assertEqual(total, 106)
+        self.wait_for_prefetch()
+
+    def test_saved_book_detail_is_served_from_store(self):
+        book = Book.objects.create(google_book_id="abc", title="Duna")
+        self.client.get(reverse("book_detail", args=["abc"]))
+        self.assertTrue(BookVolume.objects.filter(book=book).exists())
+
+        self.fake.error_rate = 1.0
+        response = self.client.get(reverse("book_detail", args=["abc"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page_count"], 200)
+        self.assertEqual(self.fake.request_count, 1)
+
+    def test_fresh_stored_volume_skips_upstream(self):
+        book = Book.objects.create(google_book_id="abc", title="Duna")
+        BookVolume.objects.create(book=book, description="Guardada", page_count=412, fetched_at=timezone.now())
+        with mock.patch("core.volumes.schedule_refresh") as refresh:
+            response = self.client.get(reverse("book_detail", args=["abc"]))
+        self.assertEqual(response.context["description"], "Guardada")
+        self.assertEqual(self.fake.request_count, 0)
+        refresh.assert_not_called()
+
+    def test_stale_stored_volume_is_served_and_refreshed(self):
+        book = Book.objects.create(google_book_id="abc", title="Duna")
+        fetched_at = timezone.now() - timedelta(seconds=settings.BOOK_VOLUME_TTL + 1)
+        BookVolume.objects.create(book=book, description="Antiga", page_count=412, fetched_at=fetched_at)
+        with mock.patch("core.volumes.schedule_refresh") as refresh:
+            response = self.client.get(reverse("book_detail", args=["abc"]))
+            context = async_to_sync(volumes.aget_volume_context)("abc")
+        self.assertEqual(response.context["description"], "Antiga")  # não espera a API
+        self.assertEqual(context["description"], "Antiga")
+        self.assertEqual(self.fake.request_count, 0)
+        self.assertEqual([call.args[0].pk for call in refresh.call_args_list], [book.pk, book.pk])
+
+    def test_detail_degrades_when_upstream_is_down(self):
+        self.fake.error_rate = 1.0
+        response = self.client.get(reverse("book_detail", args=["xyz"]))
+        self.assertEqual(response.status_code, 503)
+
+    def test_search_degrades_when_quota_runs_out(self):
+        with override_settings(GOOGLE_BOOKS_QUOTA=dict(settings.GOOGLE_BOOKS_QUOTA, DAILY_LIMIT=1)):
+            self.client.get(reverse("search") + "?q=duna")
+            self.wait_for_prefetch()
+            self.assertEqual(self.fake.request_count, 1)  # as páginas antecipadas não couberam na cota
+            self.assertEqual(get_client().stats()["quota"]["remaining_today"], 0)
+
+            response = self.client.get(reverse("search") + "?q=outra busca")
+            self.assertTrue(response.context["unavailable"])
+            self.assertEqual(self.fake.request_count, 1)
+
+
+    def test_requests_report_timings_and_metrics(self):
+        response = self.client.get(reverse("search") + "?q=duna")
+        timing = dict(entry.split(";", 1) for entry in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"upstream", "db", "template", "total"})
+        self.assertIn('desc="Google Books (1)"', timing["upstream"])
+        self.wait_for_prefetch()
+
+        user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'bookly_request_seconds_count{view="search",component="upstream"}')
+        self.assertContains(response, 'bookly_request_db_queries{view="metrics",quantile="0.99"}')
+        self.assertContains(response, "bookly_quota_remaining_today")
+        self.assertContains(response, "bookly_search_cache_evictions_total")
+
+
+class QuotaManagerTests(SimpleTestCase):
+    def setUp(self):
+        caches["google_books"].clear()
+
+    def test_background_calls_leave_reserve_for_interactive(self):
+        manager = QuotaManager("google_books", rate=0, capacity=4, daily_limit=100, background_reserve=0.5)
+        with background():
+            manager.acquire()
+            manager.acquire()
+            with self.assertRaises(QuotaExceeded):
+                manager.acquire()
+        manager.acquire()
+        manager.acquire()
+        with self.assertRaises(QuotaExceeded):
+            manager.acquire()
+        stats = manager.stats()
+        self.assertEqual(stats["rejected"], {"interactive": 1, "background": 1})
+        self.assertEqual(stats["remaining_today"], 96)
+
+    def test_daily_limit_is_shared_by_workers(self):
+        worker_a = QuotaManager("google_books", rate=100, capacity=10, daily_limit=2)
+        worker_b = QuotaManager("google_books", rate=100, capacity=10, daily_limit=2)
+        worker_a.acquire()
+        worker_b.acquire()
+        with self.assertRaises(QuotaExceeded):
+            worker_a.acquire()
+
+
+    def test_busy_lock_refuses_the_call_instead_of_running_unlocked(self):
+        manager = QuotaManager("google_books", rate=0, capacity=4, daily_limit=100, lock_timeout=0.05)
+        caches["google_books"].add(manager.lock_key, "other-worker", 60)
+        with self.assertRaises(QuotaExceeded):
+            manager.acquire()
+        self.assertEqual(manager.stats()["used_today"], 0)
+
+    async def test_busy_lock_refuses_async_calls_too(self):
+        manager = QuotaManager("google_books", rate=0, capacity=4, daily_limit=100, lock_timeout=0.05)
+        await caches["google_books"].aadd(manager.lock_key, "other-worker", 60)
+        with self.assertRaises(QuotaExceeded):
+            await manager.aacquire()
+
+    def test_expired_holder_does_not_release_another_workers_lock(self):
+        manager = QuotaManager("google_books", rate=0, capacity=4, daily_limit=100)
+        with manager._locked():
+            caches["google_books"].set(manager.lock_key, "other-worker", 60)  # a nossa expirou e outro pegou
+        self.assertEqual(caches["google_books"].get(manager.lock_key), "other-worker")
+
+
+class AsyncViewsTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer().start()
+        self.addCleanup(self.fake.stop)
+        search_cache.clear()
+        volume_cache.clear()
+        override = api_settings(self.fake.base_url, MAX_RETRIES=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.factory = AsyncRequestFactory()
+
+    async def render(self, view, path, **kwargs):
+        response = await view.as_view()(self.factory.get(path), **kwargs)
+        await sync_to_async(response.render)()
+        return response
+
+    async def test_async_search(self):
+        response = await self.render(AsyncBookSearchView, "/search/?q=duna&page=2")
+        self.assertEqual(response.context_data["page"], 2)
+        self.assertEqual(len(response.context_data["results"]), 21)
+        self.assertEqual(response.context_data["total_pages"], 5)
+
+    async def test_async_detail_uses_store(self):
+        await Book.objects.acreate(google_book_id="abc", title="Duna")
+        response = await self.render(AsyncBookDetailView, "/book/abc/", google_book_id="abc")
+        self.assertEqual(response.context_data["description"], "Descrição de teste.")
+        self.assertTrue(await BookVolume.objects.filter(book__google_book_id="abc").aexists())
+
+
+class ProfileQueriesTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+        self.client.get(reverse("home"))  # com o cache compartilhado, a partir daqui o usuário logado sai do cache
+
+    def add_books(self, count, status="plan"):
+        start = Book.objects.count()
+        for i in range(start, start + count):
+            book = Book.objects.create(google_book_id=f"id{i}", title=f"Livro {i}", authors="Autor")
+            UserBook.objects.create(user=self.user, book=book, status=status)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_list_size(self):
+        self.add_books(2)
+        few = self.count_queries(reverse("profile"))
+        self.add_books(10)
+        self.assertEqual(self.count_queries(reverse("profile")), few)
+
+    def test_status_filter_query_count_does_not_grow(self):
+        self.add_books(1, status="reading")
+        few = self.count_queries(reverse("profile") + "?status=reading")
+        self.add_books(11, status="reading")
+        self.assertEqual(self.count_queries(reverse("profile") + "?status=reading"), few)
+
+    def test_cursor_pagination_walks_list_without_count(self):
+        self.add_books(30)
+        UserBook.objects.update(added_at=UserBook.objects.first().added_at)  # empates em added_at são desfeitos pelo id
+        expected = list(UserBook.objects.order_by("-added_at", "-id").values_list("id", flat=True))
+
+        seen, cursor = [], ""
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("profile"), {"cursor": cursor})
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+            page = response.context["page_obj"]
+            seen += [userbook.id for userbook in page]
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        back = self.client.get(reverse("profile"), {"cursor": page.previous_cursor}).context["page_obj"]
+        self.assertEqual([userbook.id for userbook in back], expected[12:24])
+
+    def test_cursor_pagination_with_status_filter_and_bad_cursor(self):
+        self.add_books(3, status="reading")
+        self.add_books(3, status="plan")
+        response = self.client.get(reverse("profile"), {"cursor": "lixo", "status": "reading"})
+        self.assertEqual([userbook.status for userbook in response.context["books"]], ["reading"] * 3)
+
+
+@shared_fragment_cache()
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE["ALIAS"]].clear()
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.userbooks = [
+            UserBook.objects.create(user=self.user, book=Book.objects.create(google_book_id=f"f{i}", title=f"Livro {i}"))
+            for i in range(3)
+        ]
+
+    def login(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        return client
+
+    def get_profile(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("profile"))
+        listed = any('"core_userbook"' in query["sql"] and "LIMIT" in query["sql"] for query in queries)
+        return response.content.decode(), listed
+
+    def test_unchanged_list_is_served_from_cache_until_a_write(self):
+        client = self.login()
+        html, listed = self.get_profile(client)
+        self.assertTrue(listed)
+        self.assertFalse(self.get_profile(client)[1])  # nem a página de livros é lida do banco
+
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', html).group(1)
+        response = client.post(reverse("update_status", args=[self.userbooks[0].id]), {"status": "reading", "csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code, 302)
+        html, listed = self.get_profile(client)
+        self.assertTrue(listed)
+        self.assertIn('<option value="reading" selected>', html)
+
+        client.post(reverse("remove_book", args=[self.userbooks[1].id]), {"csrfmiddlewaretoken": token})
+        self.assertNotIn(">Livro 1</h5>", self.get_profile(client)[0])
+
+    def test_changed_book_is_not_served_from_a_cached_card(self):
+        client = self.login()
+        self.get_profile(client)
+        book = self.userbooks[0].book
+        book.title, book.publisher = "Livro 0 (2ª edição)", "Editora Nova"
+        book.save()
+        fragments.book_changed(book.pk)
+        html, listed = self.get_profile(client)
+        self.assertTrue(listed)
+        self.assertIn(">Livro 0 (2ª edição)</h5>", html)
+        self.assertIn("Editora Nova", html)
+
+    def test_fragments_are_off_without_a_shared_cache(self):
+        with override_settings(CACHES=PROJECT_CACHES):
+            client = self.login()
+            self.get_profile(client)
+            Book.objects.filter(pk=self.userbooks[0].book_id).update(title="Alterado em outro worker")
+            html, listed = self.get_profile(client)
+        self.assertTrue(listed)
+        self.assertIn(">Alterado em outro worker</h5>", html)
+
+    def test_cached_forms_carry_the_current_sessions_csrf_token(self):
+        self.get_profile(self.login())
+        client = self.login()  # outra sessão: outro segredo CSRF
+        html, _ = self.get_profile(client)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', html).group(1)
+        response = client.post(reverse("update_status", args=[self.userbooks[2].id]), {"status": "completed", "csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(BOOK_VOLUME_REFRESH_IN_BACKGROUND=False)
+class SearchSuggestTests(TestCase):
+    def setUp(self):
+        suggest_index.reset()
+        self.addCleanup(suggest_index.reset)
+        Book.objects.create(google_book_id="a1", title="Harry Potter e a Pedra Filosofal", authors="J. K. Rowling")
+        Book.objects.create(google_book_id="a2", title="O Hobbit", authors="J. R. R. Tolkien")
+
+    def suggest(self, prefix):
+        response = self.client.get(reverse("search_suggest"), {"q": prefix})
+        return response, [(item["type"], item["text"]) for item in response.json()["suggestions"]]
+
+    def test_suggests_titles_and_authors_by_prefix(self):
+        response, suggestions = self.suggest("Har")
+        self.assertEqual(suggestions, [("title", "Harry Potter e a Pedra Filosofal")])
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertEqual(self.suggest("j r")[1], [("author", "J. R. R. Tolkien")])
+        self.assertEqual(self.suggest("h")[1], [])  # prefixo curto demais
+
+    def test_new_books_and_popular_queries_are_added_incrementally(self):
+        self.suggest("ho")
+        user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(user)
+        with mock.patch("core.volumes.schedule_refresh"):
+            self.client.post(reverse("add_book"), {"google_book_id": "a3", "title": "Hobbits e Dragões"})
+        self.assertEqual(self.suggest("ho")[1], [("title", "Hobbits e Dragões")])
+
+        for _ in range(3):
+            suggest_index.record_query("hobbit filme")
+        self.assertEqual(self.suggest("hobbit")[1][0], ("query", "hobbit filme"))
+
+
+@shared_fragment_cache()
+class SearchMembershipTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer().start()
+        self.addCleanup(self.fake.stop)
+        search_cache.clear()
+        volume_cache.clear()
+        caches[settings.FRAGMENT_CACHE["ALIAS"]].clear()
+        # o mapa da lista é montado na hora, para os testes verem as queries
+        for override in (api_settings(self.fake.base_url, MAX_RETRIES=0),
+                         override_settings(MEMBERSHIP=dict(settings.MEMBERSHIP, FILL_IN_BACKGROUND=False))):
+            override.enable()
+            self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+
+    # (resultados por google_book_id, queries em core_userbook)
+    def search(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("search") + "?q=duna")
+        results = {result["google_book_id"]: result for result in response.context["results"]}
+        return response, results, [query for query in queries if '"core_userbook"' in query["sql"]]
+
+    def test_results_show_the_users_status_until_the_list_changes(self):
+        _, results, _ = self.search()
+        first, second = list(results.values())[:2]
+        userbook, _, _ = library.add_book(self.user, first["google_book_id"], library.book_fields(first))
+
+        response, results, queries = self.search()
+        self.assertEqual(len(queries), 2)  # IN nos livros da página e o mapa da lista, montado para as próximas
+        self.assertIn(" IN (", queries[0]["sql"])
+        self.assertEqual(results[first["google_book_id"]]["list_status"], "plan")
+        self.assertIsNone(results[second["google_book_id"]]["list_status"])
+        self.assertContains(response, "Na sua lista: Planejo ler")
+        self.assertEqual(self.search()[2], [])  # mapa em cache: nenhuma query
+
+        library.update_status(self.user, userbook.id, "completed")
+        response, results, queries = self.search()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(results[first["google_book_id"]]["list_status"], "completed")
+        self.assertContains(response, "Na sua lista: Completo")
+
+        library.remove_book(self.user, userbook.id)
+        self.assertIsNone(self.search()[1][first["google_book_id"]]["list_status"])
+
+    def test_large_lists_only_look_up_the_page(self):
+        _, results, _ = self.search()
+        first = next(iter(results.values()))
+        library.add_book(self.user, first["google_book_id"], library.book_fields(first))
+        with override_settings(MEMBERSHIP=dict(settings.MEMBERSHIP, MAX_CACHED=0)):
+            self.search()
+            _, results, queries = self.search()
+        self.assertEqual(len(queries), 1)
+        self.assertIn(" IN (", queries[0]["sql"])
+        self.assertEqual(results[first["google_book_id"]]["list_status"], "plan")
+
+    def test_without_the_fragment_cache_only_the_page_is_looked_up(self):
+        _, results, _ = self.search()
+        first = next(iter(results.values()))
+        library.add_book(self.user, first["google_book_id"], library.book_fields(first))
+        with override_settings(CACHES=PROJECT_CACHES):
+            for _ in range(2):
+                _, results, queries = self.search()
+                self.assertEqual(len(queries), 1)
+                self.assertIn(" IN (", queries[0]["sql"])
+                self.assertIn(first["google_book_id"], queries[0]["sql"])
+        self.assertEqual(results[first["google_book_id"]]["list_status"], "plan")
+
+
+@shared_fragment_cache()
+class TaxonomyTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE["ALIAS"]].clear()
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+
+    def add(self, google_book_id, authors, categories, status="plan"):
+        book = Book.objects.create(google_book_id=google_book_id, title=google_book_id, authors=authors)
+        volumes.store_volume(book, {"volumeInfo": {"categories": categories}})
+        return UserBook.objects.create(user=self.user, book=book, status=status)
+
+    def test_books_are_linked_to_authors_and_categories(self):
+        book = self.add("a", "Ana Souza,  Bruno Lima", ["Fiction", "Body, Mind & Spirit"]).book
+        self.assertEqual(sorted(book.author_set.values_list("name", flat=True)), ["Ana Souza", "Bruno Lima"])
+        self.assertEqual(sorted(book.category_set.values_list("name", flat=True)), ["Body, Mind & Spirit", "Fiction"])
+        self.assertFalse(self.add("b", "Desconhecido", []).book.author_set.exists())
+
+        volumes.store_volume(book, {"volumeInfo": {"categories": ["History"]}})
+        self.assertEqual(list(book.category_set.values_list("name", flat=True)), ["History"])
+
+        response = self.client.post(reverse("bulk_add_books"), data=json.dumps({"books": [
+            {"google_book_id": "c", "title": "C", "authors": "Ana Souza"},
+        ]}), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Author.objects.get(name="Ana Souza").books.count(), 2)
+
+    def test_profile_filters_with_facet_counts_in_one_query(self):
+        self.add("a", "Ana", ["Fiction"], "completed")
+        self.add("b", "Ana, Bruno", ["History"], "reading")
+        self.add("c", "Bruno", ["Fiction"], "reading")
+        ana, fiction = Author.objects.get(name="Ana"), Category.objects.get(name="Fiction")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("profile"), {"author": ana.id})
+        self.assertEqual(len([query for query in queries if "UNION ALL" in query["sql"]]), 1)
+        self.assertEqual(sorted(userbook.book.google_book_id for userbook in response.context["books"]), ["a", "b"])
+        facets = response.context["facets"]
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(dict((key, count) for key, _, count in facets["status"]), {"plan": 0, "reading": 1, "completed": 1, "dropped": 0})
+        self.assertEqual([(name, count) for _, name, count in facets["author"]], [("Ana", 2), ("Bruno", 2)])  # sem o filtro de autor
+        self.assertEqual([(name, count) for _, name, count in facets["category"]], [("Fiction", 1), ("History", 1)])
+
+        response = self.client.get(reverse("profile"), {"status": "reading", "category": fiction.id})
+        self.assertEqual([userbook.book.google_book_id for userbook in response.context["books"]], ["c"])
+
+    def test_facets_are_skipped_in_cursor_mode_and_without_the_fragment_cache(self):
+        self.add("a", "Ana", ["Fiction"], "completed")
+        for url, caches_config in ((reverse("profile") + "?cursor=", settings.CACHES), (reverse("profile"), PROJECT_CACHES)):
+            with override_settings(CACHES=caches_config), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertIsNone(response.context["facets"])
+            self.assertFalse(any("UNION ALL" in query["sql"] for query in queries))
+            self.assertContains(response, '<option value="">Todos os status</option>')  # filtro sem contagens
+
+    def test_backfill_migration_links_existing_books(self):
+        self.add("a", "Ana, Bruno", ["Fiction"])
+        Author.objects.all().delete()
+        Category.objects.all().delete()
+
+        backfill = import_module("core.migrations.0013_backfill_author_category").backfill
+        backfill(django_apps, None)
+        self.assertEqual(sorted(Author.objects.values_list("name", flat=True)), ["Ana", "Bruno"])
+        self.assertEqual(list(Category.objects.get().books.values_list("google_book_id", flat=True)), ["a"])
+
+
+@shared_fragment_cache()
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE["ALIAS"]].clear()
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.other = CustomUser.objects.create_user("outro", password="senha-segura-123")
+
+    def test_reads_stay_on_default_without_replicas(self):
+        library.add_book(self.other, "a", {"title": "A"})
+        self.assertEqual(replicas.read_alias(self.user.id), "default")
+        self.assertEqual(replicas.read_alias(), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica_1"])
+    def test_users_who_just_wrote_read_from_default(self):
+        self.assertEqual(replicas.read_alias(self.user.id), "replica_1")
+        library.add_book(self.user, "a", {"title": "A"})
+        self.assertEqual(replicas.read_alias(self.user.id), "default")
+        self.assertEqual(replicas.read_alias(self.other.id), "replica_1")
+        self.assertEqual(replicas.read_alias(), "replica_1")
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            library.update_status(self.user, UserBook.objects.get().id, "reading")
+        self.assertEqual(replicas.read_alias(self.user.id), "replica_1")  # a marca expirou
+
+    def test_router_writes_and_migrates_only_on_default(self):
+        router = replicas.ReplicaRouter()
+        userbook = UserBook(user=self.user)
+        userbook._state.db = "replica_1"  # objeto lido de uma réplica
+        self.assertEqual(router.db_for_write(UserBook, instance=userbook), "default")
+        self.assertTrue(router.allow_migrate("default", "core"))
+        self.assertFalse(router.allow_migrate("replica_1", "core"))
+
+
+@cached_sessions()
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+
+    def login(self):
+        client = Client()
+        self.assertTrue(client.login(username="leitor", password="senha-segura-123"))
+        return client
+
+    def test_cached_session_and_user_cost_no_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            Client().get(reverse("home"))
+        self.assertEqual(len(queries), 0)
+
+        client = self.login()
+        client.get(reverse("home"))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("home"))
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, "Bem-vindo ao Bookly, leitor!")
+
+    def test_saving_the_user_refreshes_the_cached_copy(self):
+        client = self.login()
+        client.get(reverse("home"))
+        self.user.username = "leitora"
+        self.user.save()
+        self.assertContains(client.get(reverse("home")), "Bem-vindo ao Bookly, leitora!")
+
+        self.user.set_password("outra-senha-456")
+        self.user.save()
+        response = client.get(reverse("profile"))  # hash de sessão antigo: a sessão deixa de valer
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith(settings.LOGIN_URL))
+
+    def test_flash_messages_do_not_write_the_session(self):
+        client = self.login()
+        userbook = UserBook.objects.create(user=self.user, book=Book.objects.create(google_book_id="a", title="Duna"))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse("update_status", args=[userbook.id]), {"status": "reading"})
+        self.assertFalse(any("django_session" in query["sql"] for query in queries))
+        self.assertIn("messages", response.cookies)
+        self.assertContains(client.get(response["Location"]), "Alterado status de &quot;Duna&quot; para &quot;Lendo&quot;")
+
+
+class BulkEndpointsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+
+    def post_json(self, name, payload):
+        return self.client.post(reverse(name), data=json.dumps(payload), content_type="application/json")
+
+    def test_bulk_add_is_idempotent_and_reports_each_item(self):
+        Book.objects.create(google_book_id="b0", title="Já salvo")
+        books = [{"google_book_id": f"b{i}", "title": f"Livro {i}"} for i in range(50)] + [{"title": "sem id"}]
+        with mock.patch("core.volumes.schedule_refresh"), CaptureQueriesContext(connection) as queries:
+            response = self.post_json("bulk_add_books", {"books": books})
+        self.assertLess(len(queries), 15)
+        self.assertEqual(response.json()["counts"], {"added": 50, "invalid": 1})
+        self.assertEqual(UserBook.objects.filter(user=self.user).count(), 50)
+
+        response = self.post_json("bulk_add_books", {"books": books[:3]})
+        self.assertEqual(response.json()["counts"], {"already_in_list": 3})
+
+    def test_bulk_add_reports_every_item_in_order(self):
+        UserBook.objects.create(user=self.user, book=Book.objects.create(google_book_id="x1", title="Já na lista"))
+        suggest_index.reset()
+        self.addCleanup(suggest_index.reset)
+        suggest_index.suggest("ja")  # índice carregado: os livros novos só entram por add_books
+        books = [
+            {"google_book_id": "n1", "title": "Neuromancer"},
+            {"title": "sem id"},
+            {"google_book_id": "x1", "title": "Já na lista"},
+            {"google_book_id": "n1", "title": "Neuromancer"},
+            "não é um objeto",
+            {"google_book_id": "n2", "title": "Fundação"},
+        ]
+        with mock.patch("core.volumes.schedule_refresh"), self.captureOnCommitCallbacks(execute=True):
+            response = self.post_json("bulk_add_books", {"books": books})
+        self.assertEqual(
+            [(item["google_book_id"], item["result"]) for item in response.json()["results"]],
+            [("n1", "added"), (None, "invalid"), ("x1", "already_in_list"), ("n1", "already_in_list"),
+             (None, "invalid"), ("n2", "added")],
+        )
+        self.assertEqual(UserBook.objects.filter(user=self.user).count(), 3)
+        self.assertIn("Neuromancer", [suggestion["text"] for suggestion in suggest_index.suggest("neuro", 5)])
+
+    def test_bulk_base_view_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BulkBooksView()
+
+    def test_bulk_update_and_remove_only_touch_own_books(self):
+        other = CustomUser.objects.create_user("outro", password="senha-segura-123")
+        mine = [UserBook.objects.create(user=self.user, book=Book.objects.create(google_book_id=f"m{i}", title="x")) for i in range(3)]
+        theirs = UserBook.objects.create(user=other, book=mine[0].book)
+        ids = [userbook.id for userbook in mine] + [theirs.id]
+
+        response = self.post_json("bulk_update_status", {"status": "completed", "userbook_ids": ids})
+        self.assertEqual(response.json()["counts"], {"updated": 3, "not_found": 1})
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.status, "plan")
+
+        response = self.post_json("bulk_remove_books", {"userbook_ids": ids})
+        self.assertEqual(response.json()["counts"], {"removed": 3, "not_found": 1})
+        self.assertTrue(UserBook.objects.filter(id=theirs.id).exists())
+
+    def test_bulk_rejects_bad_payload(self):
+        self.assertEqual(self.post_json("bulk_update_status", {"status": "lendo", "userbook_ids": [1]}).status_code, 400)
+        self.assertEqual(self.post_json("bulk_remove_books", {"userbook_ids": "1"}).status_code, 400)
+
+
+@shared_fragment_cache()
+class ApiTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE["ALIAS"]].clear()
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+        self.userbooks = [
+            UserBook.objects.create(user=self.user, book=Book.objects.create(google_book_id=f"a{i}", title=f"Livro {i}"))
+            for i in range(5)
+        ]
+
+    def test_unchanged_list_answers_304_without_reading_it(self):
+        url = reverse("api_user_books") + "?fields=id,title"
+        response = self.client.get(url)
+        self.assertEqual(response.json()["results"][0], {"id": self.userbooks[-1].id, "title": "Livro 4"})
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('"core_userbook"' in query["sql"] for query in queries))
+
+        self.client.patch(reverse("api_user_book", args=[self.userbooks[0].id]), data={"status": "reading"}, content_type="application/json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cursor_pagination_and_compression(self):
+        url = reverse("api_user_books")
+        ids, cursor = [], ""
+        while cursor is not None:
+            data = self.client.get(url, {"limit": 2, "cursor": cursor, "fields": "id"}).json()
+            ids += [item["id"] for item in data["results"]]
+            cursor = data["next"]
+        self.assertEqual(ids, [userbook.id for userbook in reversed(self.userbooks)])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].endswith('-gzip"'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(url, {"cursor": "adulterado"}).status_code, 400)
+
+    def test_add_update_and_remove(self):
+        url = reverse("api_user_books")
+        book = {"google_book_id": "novo", "title": "Livro novo", "authors": "Autora"}
+        response = self.client.post(url, data=json.dumps(book), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "plan")
+        self.assertEqual(self.client.post(url, data=json.dumps(book), content_type="application/json").status_code, 200)
+        self.assertEqual(self.client.post(url, data=json.dumps({"title": "sem id"}), content_type="application/json").status_code, 400)
+
+        item = reverse("api_user_book", args=[response.json()["id"]])
+        self.assertEqual(self.client.patch(item, data={"status": "lendo"}, content_type="application/json").status_code, 400)
+        response = self.client.patch(item, data={"status": "completed"}, content_type="application/json")
+        self.assertEqual(response.json()["status"], "completed")
+        self.assertEqual(reading_stats.get_stats(self.user).completed, 1)
+        self.assertEqual(self.client.delete(item).status_code, 204)
+        self.assertEqual(self.client.get(item).status_code, 404)
+
+        other = CustomUser.objects.create_user("outro", password="senha-segura-123")
+        theirs = UserBook.objects.create(user=other, book=self.userbooks[0].book)
+        self.assertEqual(self.client.delete(reverse("api_user_book", args=[theirs.id])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class ReadingStatsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+        patcher = mock.patch("core.volumes.schedule_refresh")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stats(self):
+        stats = ReadingStats.objects.get(user=self.user)
+        return {status: getattr(stats, status) for status in reading_stats.STATUSES} | {"pages_read": stats.pages_read}
+
+    def test_counters_follow_each_write(self):
+        for i in range(3):
+            self.client.post(reverse("add_book"), {"google_book_id": f"s{i}", "title": f"Livro {i}"})
+        BookVolume.objects.create(book=Book.objects.get(google_book_id="s0"), page_count=300, fetched_at=timezone.now())
+        first, second, third = UserBook.objects.filter(user=self.user).order_by("id")
+
+        self.client.post(reverse("update_status", args=[first.id]), {"status": "completed"})
+        self.client.post(reverse("update_status", args=[second.id]), {"status": "reading"})
+        self.client.post(reverse("remove_book", args=[third.id]))
+        self.assertEqual(self.stats(), {"plan": 0, "reading": 1, "completed": 1, "dropped": 0, "pages_read": 300})
+
+        volumes.store_volume(first.book, {"volumeInfo": {"pageCount": 320}})  # pageCount corrigido na API
+        self.assertEqual(self.stats()["pages_read"], 320)
+        self.assertEqual(reading_stats.verify(self.user), {})
+
+        response = self.client.get(reverse("profile"))
+        self.assertEqual(response.context["reading_stats"].total, 2)
+        self.assertEqual(response.context["recent_months"][-1][1], 2)
+
+    def test_concurrent_remove_counts_the_book_once(self):
+        self.client.post(reverse("add_book"), {"google_book_id": "r1", "title": "Livro"})
+        stale = UserBook.objects.get(user=self.user)
+        UserBook.objects.filter(pk=stale.pk).delete()  # a outra remoção já apagou a linha
+        ReadingStats.objects.filter(user=self.user).update(plan=1)
+        with mock.patch("core.library.get_object_or_404", return_value=stale):
+            library.remove_book(self.user, stale.pk)
+        self.assertEqual(self.stats()["plan"], 1)
+
+    def test_bulk_writes_and_rebuild_command(self):
+        books = [{"google_book_id": f"b{i}", "title": f"Livro {i}"} for i in range(5)]
+        self.client.post(reverse("bulk_add_books"), data=json.dumps({"books": books}), content_type="application/json")
+        ids = list(UserBook.objects.filter(user=self.user).values_list("id", flat=True))
+        self.client.post(reverse("bulk_update_status"), data=json.dumps({"status": "dropped", "userbook_ids": ids[:3]}),
+                         content_type="application/json")
+        self.client.post(reverse("bulk_remove_books"), data=json.dumps({"userbook_ids": ids[:1]}), content_type="application/json")
+        self.assertEqual(self.stats(), {"plan": 2, "reading": 0, "completed": 0, "dropped": 2, "pages_read": 0})
+
+        UserBook.objects.filter(id__in=ids[3:]).update(status="reading")  # escrita por fora dos contadores
+        with self.assertRaises(CommandError):
+            call_command("rebuild_reading_stats", "--check", stdout=io.StringIO())
+        call_command("rebuild_reading_stats", stdout=io.StringIO())
+        self.assertEqual(self.stats(), {"plan": 0, "reading": 2, "completed": 0, "dropped": 2, "pages_read": 0})
+        self.assertEqual(reading_stats.verify(self.user), {})
+
+    def test_rebuild_locks_the_stats_row_before_counting(self):
+        ReadingStats.objects.filter(user=self.user).delete()
+        events = []
+        select_for_update, expected = QuerySet.select_for_update, reading_stats.expected
+
+        def locking(queryset, *args, **kwargs):
+            events.append(("lock", queryset.model))
+            return select_for_update(queryset, *args, **kwargs)
+
+        def counting(user):
+            events.append(("count", ReadingStats.objects.filter(user=user).exists()))
+            return expected(user)
+
+        with mock.patch.object(QuerySet, "select_for_update", locking), \
+                mock.patch("core.reading_stats.expected", counting):
+            reading_stats.rebuild(self.user)
+        self.assertEqual(events, [("lock", ReadingStats), ("count", True)])
+        self.assertEqual(self.stats(), {"plan": 0, "reading": 0, "completed": 0, "dropped": 0, "pages_read": 0})
+
+
+GOODREADS_CSV = "\n".join([
+    "Book Id,Title,Author,ISBN,ISBN13,Exclusive Shelf",
+    '1,Duna,Frank Herbert,"=""0441013597""","=""9780441013593""",read',
+    "2,Neuromancer,William Gibson,,,currently-reading",
+    "3,Sem Match,,,,to-read",
+    '4,Fundação,Isaac Asimov,"=""0553293354""",,to-read',
+]) + "\n"
+
+
+class ReadingListImportTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer().start()
+        self.addCleanup(self.fake.stop)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client_api = GoogleBooksClient(self.fake.base_url, backoff=0)
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+
+    def make_job(self, content, format="csv"):
+        return ImportJob.objects.create(user=self.user, source=ContentFile(content.encode(), name=f"lista.{format}"), format=format)
+
+    def test_goodreads_csv_import_maps_statuses(self):
+        job = self.make_job(GOODREADS_CSV)
+        ReadingListImporter(job, batch_size=2, workers=2, rate=0, client=self.client_api).run()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.rows_imported), ("done", 4, 4))
+        self.assertEqual(self.fake.request_count, 4)
+        self.assertEqual(
+            sorted(UserBook.objects.filter(user=self.user).values_list("status", flat=True)),
+            ["completed", "plan", "plan", "reading"],
+        )
+
+    def test_import_resumes_after_last_batch(self):
+        job = self.make_job(GOODREADS_CSV)
+        job.rows_processed = 2
+        job.save()
+        ReadingListImporter(job, batch_size=10, rate=0, client=self.client_api).run()
+        self.assertEqual(self.fake.request_count, 2)
+
+    def test_json_is_read_incrementally(self):
+        rows = [{"google_book_id": f"g{i}", "title": f"Livro {i}", "status": "reading"} for i in range(5)]
+        self.assertEqual(list(iter_json(io.StringIO(json.dumps(rows)), chunk_size=7)), rows)
+        lines = "\n".join(json.dumps(row) for row in rows)
+        self.assertEqual(list(iter_json(io.StringIO(lines), chunk_size=7)), rows)
+
+    def test_export_round_trips_through_import(self):
+        self.client.force_login(self.user)
+        for i in range(3):
+            UserBook.objects.create(user=self.user, book=Book.objects.create(google_book_id=f"e{i}", title=f"Livro {i}"), status="reading")
+        response = self.client.get(reverse("export_reading_list"), {"format": "json"})
+        self.assertTrue(response.streaming)
+        exported = b"".join(response.streaming_content).decode()
+
+        other = CustomUser.objects.create_user("outro", password="senha-segura-123")
+        job = ImportJob.objects.create(user=other, source=ContentFile(exported.encode(), name="l.json"), format="json")
+        ReadingListImporter(job, rate=0, client=self.client_api).run()
+        self.assertEqual(UserBook.objects.filter(user=other, status="reading").count(), 3)
+        self.assertEqual(self.fake.request_count, 0)
+
+
+class HydrationTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer(latency=0.2).start()
+        self.addCleanup(self.fake.stop)
+        search_cache.clear()
+        volume_cache.clear()
+        override = api_settings(self.fake.base_url)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.books = [Book.objects.create(google_book_id=f"h{i}", title=f"Livro {i}") for i in range(8)]
+        BookVolume.objects.create(book=self.books[0], description="Salva no banco", fetched_at=timezone.now())
+
+    def test_missing_volumes_are_fetched_concurrently_and_kept(self):
+        ids = [book.google_book_id for book in self.books] + ["fora-1", "fora-2", "missing-1"]
+        started = time.monotonic()
+        details = hydration.hydrate(ids)
+        self.assertLess(time.monotonic() - started, 1.0)  # 10 chamadas de 0,2s em paralelo
+        self.assertEqual(self.fake.request_count, 10)
+        self.assertEqual(details["h0"]["description"], "Salva no banco")
+        self.assertEqual(details["fora-1"]["page_count"], 200)
+        self.assertIsNone(details["missing-1"])
+        self.assertEqual(BookVolume.objects.count(), 8)
+
+        hydration.hydrate(ids[:-1])  # agora do banco e de volume_cache
+        self.assertEqual(self.fake.request_count, 10)
+
+    def test_expanded_profile_and_export(self):
+        self.client.force_login(self.user)
+        for book in self.books[:3]:
+            UserBook.objects.create(user=self.user, book=book)
+        response = self.client.get(reverse("profile_expanded"))
+        self.assertContains(response, "Salva no banco")
+        self.assertContains(response, "Descrição de teste.", count=2)
+
+        response = self.client.get(reverse("export_reading_list"), {"expanded": "1"})
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["page_count"] for row in rows], ["", "200", "200"])
+        self.assertEqual(self.fake.request_count, 2)
+
+
+class RecommendationsTests(TestCase):
+    LISTS = {
+        "u0": {"r0": "completed", "r1": "completed", "r2": "plan"},
+        "u1": {"r0": "completed", "r1": "reading", "r3": "dropped"},
+        "u2": {"r0": "reading", "r1": "completed", "r2": "completed"},
+        "u3": {"r0": "plan", "r2": "completed"},
+        "u4": {"r3": "completed", "r4": "completed"},
+    }
+
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE["ALIAS"]].clear()
+        self.books = {f"r{i}": Book.objects.create(google_book_id=f"r{i}", title=f"Livro r{i}") for i in range(5)}
+        self.users = {}
+        for username, items in self.LISTS.items():
+            self.users[username] = CustomUser.objects.create_user(username, password="senha-segura-123")
+            for google_book_id, status in items.items():
+                UserBook.objects.create(user=self.users[username], book=self.books[google_book_id], status=status)
+
+    def pairs(self):
+        return {(row.book.google_book_id, row.neighbor.google_book_id): round(row.score, 9) for row in BookNeighbor.objects.select_related("book", "neighbor")}
+
+    def test_neighbors_are_ranked_by_weighted_cooccurrence(self):
+        call_command("rebuild_recommendations", stdout=io.StringIO())
+        self.assertEqual(set(self.pairs()), {("r0", "r1"), ("r1", "r0"), ("r0", "r2"), ("r2", "r0"), ("r1", "r2"), ("r2", "r1")})
+        self.assertEqual([book.google_book_id for book in recommendations.similar_books("r0")], ["r1", "r2"])
+
+        BookVolume.objects.create(book=self.books["r0"], fetched_at=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("book_detail", args=["r0"]))
+        self.assertContains(response, "Livro r1")
+        self.assertEqual(sum('"core_bookneighbor"' in query["sql"] for query in queries), 1)
+
+        self.client.force_login(self.users["u3"])
+        response = self.client.get(reverse("profile"))
+        self.assertEqual([book.google_book_id for book in response.context["recommendations"]], ["r1"])
+
+    def test_incremental_updates_match_rebuild(self):
+        recommendations.rebuild()
+        library.add_book(self.users["u4"], "r0", {})
+        library.update_status(self.users["u1"], UserBook.objects.get(user=self.users["u1"], book=self.books["r3"]).id, "completed")
+        library.remove_book(self.users["u0"], UserBook.objects.get(user=self.users["u0"], book=self.books["r2"]).id)
+        self.assertEqual(sorted(Job.objects.filter(kind="neighbors").values_list("key", flat=True)),
+                         sorted(str(self.books[name].id) for name in ("r0", "r2", "r3")))
+
+        Job.objects.update(run_after=timezone.now())
+        Worker(kinds=["neighbors"]).run_pending()
+        incremental = self.pairs()
+        recommendations.rebuild()
+        self.assertEqual(incremental, self.pairs())
+        self.assertIn(("r0", "r3"), incremental)
+
+    @skipUnless(recommendations.np is not None, "NumPy/SciPy não instalados")
+    def test_vectorized_and_python_computations_agree(self):
+        rng = random.Random(7)
+        interactions = {(rng.randrange(300), rng.randrange(80)): rng.choice([1.0, 0.8, 0.5, 0.1]) for _ in range(3000)}
+        users, books = zip(*interactions)
+        weights = list(interactions.values())
+        vectorized = list(recommendations._compute_numpy(users, books, weights, 5, 2, block_size=16))
+        python = list(recommendations._compute_python(users, books, weights, 5, 2))
+        self.assertEqual([row[:2] for row in vectorized], [row[:2] for row in python])
+        for (_, _, a), (_, _, b) in zip(vectorized, python):
+            self.assertAlmostEqual(a, b)
+
+
+class JobsTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGoogleBooksServer().start()
+        self.addCleanup(self.fake.stop)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        # o servidor falso serve as capas por http em 127.0.0.1
+        covers_settings = override_settings(COVERS=dict(settings.COVERS, ALLOWED_SCHEMES=["http"], ALLOWED_HOSTS=["127.0.0.1"]))
+        for override in (api_settings(self.fake.base_url), override_settings(MEDIA_ROOT=media.name), covers_settings):
+            override.enable()
+            self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user("leitor", password="senha-segura-123")
+        self.client.force_login(self.user)
+
+    def test_new_book_is_enriched_and_cover_is_served_locally(self):
+        self.client.post(reverse("add_book"), {"google_book_id": "j1", "title": "Livro"})
+        self.assertEqual(list(Job.objects.order_by("kind").values_list("kind", "status")), [("enrich", "pending"), ("neighbors", "pending")])
+
+        self.assertEqual(Worker().run_pending(), 2)  # enrich agenda a capa, que roda em seguida; neighbors espera UPDATE_DELAY
+        book = Book.objects.get(google_book_id="j1")
+        self.assertEqual(book.volume.page_count, 200)
+        self.assertEqual(book.publisher, "Editora Fictícia")
+        self.assertTrue(book.cover.name.startswith("covers/"))
+        self.assertEqual(list(Job.objects.values_list("kind", flat=True)), ["neighbors"])
+
+        self.assertContains(self.client.get(reverse("profile")), f'src="{book.image_url}"')
+        response = self.client.get(book.image_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(b"".join(response.streaming_content)[:4], b"\x89PNG")
+        self.assertEqual(self.client.get(reverse("book_cover", args=[book.pk, "antiga"])).status_code, 302)
+
+    def test_user_posted_thumbnail_is_replaced_by_the_apis(self):
+        self.client.post(reverse("add_book"), {"google_book_id": "j2", "title": "Livro",
+                                               "thumbnail": "http://169.254.169.254/latest/meta-data/"})
+        Worker().run_pending()
+        book = Book.objects.get(google_book_id="j2")
+        self.assertTrue(book.thumbnail.startswith(self.fake.base_url))
+        self.assertTrue(book.cover.name.startswith("covers/"))
+
+    def test_cover_is_only_downloaded_from_google_hosts(self):
+        urls = [
+            "http://169.254.169.254/latest/meta-data/",
+            "https://localhost/capa.png",
+            "https://books.google.com.example.org/capa.png",
+            "http://lh3.googleusercontent.com/capa.png",
+            "ftp://books.google.com/capa.png",
+        ]
+        with override_settings(COVERS=PROJECT_COVERS), mock.patch.object(covers._session, "get") as get:
+            for url in urls:
+                with self.assertRaises(covers.CoverError):
+                    covers.download(url)
+            get.assert_not_called()
+            self.assertTrue(covers.is_allowed("https://books.google.com/books/content?id=x"))
+            self.assertTrue(covers.is_allowed("https://lh3.googleusercontent.com/capa.png"))
+
+    def test_cover_redirects_are_not_followed(self):
+        response = mock.MagicMock(is_redirect=True)
+        response.__enter__.return_value = response
+        with mock.patch.object(covers._session, "get", return_value=response) as get:
+            with self.assertRaises(covers.CoverError):
+                covers.download(f"{self.fake.base_url}/covers/x")
+        self.assertFalse(get.call_args.kwargs["allow_redirects"])
+
+    def test_failed_jobs_are_retried_with_backoff_then_given_up(self):
+        calls = []
+
+        def flaky(key):
+            calls.append(key)
+            raise RuntimeError("falhou")
+
+        with mock.patch.dict(HANDLERS, {"flaky": flaky}), override_settings(JOBS=dict(settings.JOBS, MAX_ATTEMPTS=2)):
+            jobs_module.enqueue("flaky", 7)
+            jobs_module.enqueue("flaky", 7)  # já está na fila: não duplica
+            self.assertEqual(Worker().run_pending(), 1)
+            job = Job.objects.get()
+            self.assertEqual((job.status, job.attempts), ("pending", 1))
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertEqual(Worker().run_pending(), 0)  # ainda no backoff
+
+            Job.objects.update(run_after=timezone.now())
+            Worker().run_pending()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("failed", 2))
+            self.assertIn("RuntimeError: falhou", job.last_error)
+        self.assertEqual(calls, ["7", "7"])
@@ -1,14 +1,33 @@
+from django.conf import settings
 from django.urls import path
 from .views import *
+from . import api
+
+# Sob ASGI (BOOKLY_ASYNC_VIEWS=1), busca e detalhes usam as views assíncronas
+SearchView = AsyncBookSearchView if settings.USE_ASYNC_VIEWS else BookSearchView
+DetailView = AsyncBookDetailView if settings.USE_ASYNC_VIEWS else BookDetailView
 
 urlpatterns = [
     path('', HomeView.as_view(), name = 'home'),
-    path('search/', BookSearchView.as_view(), name = 'search'),
+    path('search/', SearchView.as_view(), name = 'search'),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search_suggest'),
     path('login/', CustomLoginView.as_view(), name = 'login'),
     path('signup/', SignUpView.as_view(), name='signup'),
     path('profile/', ProfileView.as_view(), name='profile'),
+    path('profile/expanded/', ExpandedProfileView.as_view(), name='profile_expanded'),
     path('add-book/', AddBookToListView.as_view(), name='add_book'),
     path('remove-book/<int:userbook_id>/', RemoveBookFromListView.as_view(), name='remove_book'),
     path('update-status/<int:userbook_id>/', UpdateBookStatusView.as_view(), name='update_status'),
-    path('book/<slug:google_book_id>/', BookDetailView.as_view(), name='book_detail')
+    path('bulk/add-books/', BulkAddBooksView.as_view(), name='bulk_add_books'),
+    path('bulk/update-status/', BulkUpdateStatusView.as_view(), name='bulk_update_status'),
+    path('bulk/remove-books/', BulkRemoveBooksView.as_view(), name='bulk_remove_books'),
+    path('import/', ImportReadingListView.as_view(), name='import_reading_list'),
+    path('import/<int:job_id>/', ImportStatusView.as_view(), name='import_status'),
+    path('export/', ExportReadingListView.as_view(), name='export_reading_list'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/v1/books/', api.UserBooksApiView.as_view(), name='api_user_books'),
+    path('api/v1/books/<int:userbook_id>/', api.UserBookApiView.as_view(), name='api_user_book'),
+    path('api/v1/search/', api.SearchApiView.as_view(), name='api_search'),
+    path('covers/<int:book_id>/<slug:version>/', BookCoverView.as_view(), name='book_cover'),
+    path('book/<slug:google_book_id>/', DetailView.as_view(), name='book_detail')
 ]
\ No newline at end of file
@@ -1,75 +1,282 @@
 from django.views.generic import TemplateView, CreateView, ListView
+from django.conf import settings
 from django.contrib.auth.views import LoginView
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
-from .models import CustomUser, UserBook, Book
+from .models import CustomUser, UserBook, Book, ImportJob
+from .pagination import InvalidCursor, KeysetPaginator
 from django.shortcuts import redirect, get_object_or_404
-from django.http import Http404
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
 from django.views import View
-import requests, math
+from django.utils.cache import patch_cache_control
+from .cache import search_cache, search_prefetcher
+from .suggest import suggest_index
+from .google_books import get_async_client, get_client, UpstreamUnavailable
+from . import fragments, hydration, importers, instrumentation, jobs, library, membership, quota, reading_stats, recommendations, replicas, search_index, taxonomy, volumes
+from .quota import QuotaExceeded
+from asgiref.sync import sync_to_async
+import json, math, mimetypes
+from abc import ABCMeta, abstractmethod
+from urllib.parse import urlencode
 
 class HomeView(TemplateView):
     template_name = 'home.html'
 
 
-# Busca livros na API do google
+# Busca livros no catálogo local e, quando ele não basta, na API do google
 class BookSearchView(TemplateView):
     template_name = "search.html"
     RESULTS_PER_PAGE = 21
     MAX_VISIBLE_PAGES = 5
     MAX_RESULTS_API = RESULTS_PER_PAGE * 5 # máximo de 5 páginas
+    PRINT_TYPE = "books" # Mostra apenas livros, excluindo revistas, artigos, jornais, etc
+    WINDOW_PAGES = MAX_RESULTS_API // RESULTS_PER_PAGE # páginas buscadas em paralelo quando a pesquisa é nova
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         query = self.request.GET.get("q", "") # string de pesquisa enviada pelo usuário
-        page_str = self.request.GET.get("page", "1")  
-
-        # pega a página como string
-        try:
-            page = int(page_str)
-            if page < 1:
-                page = 1
-        except ValueError:
-            page = 1
-        total_items = 0 # contador de livros na página para paginação
-        results = [] # lista de dicionários contendo as informações dos livros
-
-        if query:
-            start_index = (page - 1) * self.RESULTS_PER_PAGE # pula os livros já exibidos para não haver repetição na página seguinte
-            url = "https://www.googleapis.com/books/v1/volumes"
-            params = {
-                "q": f"intitle:{query}", # Buscar apenas os livros com a query de busca em seu título
-                "maxResults": self.RESULTS_PER_PAGE,
-                "startIndex": start_index,
-                "printType": "books" # Mostra apenas livros, excluindo revistas, artigos, jornais, etc
-            }
-            response = requests.get(url, params=params) # faz a chamada para a API do Google Books
-            if response.status_code == 200:
-                data = response.json()
-                total_items = data.get("totalItems", 0)
-                for item in data.get("items", []):
-                    info = item.get("volumeInfo", {}) # dicionário com os dados do livro retornado pela API
-                    results.append({
-                        "google_book_id": item.get("id"),
-                        "title": info.get("title", "Sem título"),
-                        "authors": ", ".join(info.get("authors") or ["Desconhecido"]),
-                        "publisher": info.get("publisher", "Desconhecido"),
-                        "published_date": info.get("publishedDate", "Desconhecido"),
-                        "thumbnail": (info.get("imageLinks") or {}).get("thumbnail"),
-                    })
-
-                total_items = min(data.get("totalItems", 0), self.MAX_RESULTS_API)
-        total_pages = math.ceil(total_items / self.RESULTS_PER_PAGE)
+        page = self.get_page()
+        # results: lista de dicionários com as informações dos livros; total_items: contador para a paginação
+        # unavailable: API fora do ar, a página avisa o usuário em vez de dizer "nenhum resultado"
+        results, total_items, unavailable = self.load_results(query, page) if query else ([], 0, False)
+        if query and page == 1:
+            suggest_index.record_query(query) # pesquisas repetidas viram sugestões do autocomplete
+        total_pages = math.ceil(min(total_items, self.MAX_RESULTS_API) / self.RESULTS_PER_PAGE)
 
+        self.annotate_list_statuses(results)
         context["results"] = results
         context["query"] = query
         context["pages"] = list(range(1, total_pages + 1))
         context["page"] = page
         context["total_pages"] = total_pages
+        context["unavailable"] = unavailable
+        # a grade de resultados sai do cache de fragmentos enquanto os resultados forem os mesmos
+        context.update(fragments.template_context(self.request, results_digest=fragments.digest(results)))
         return context
-    
+
+    # Marca nos resultados os livros que o usuário já tem (list_status), para a grade mostrar o status no lugar
+    # do botão de adicionar. Entra no hash dos resultados, então a grade em cache muda junto com a lista
+    def annotate_list_statuses(self, results):
+        statuses = self.get_list_statuses(results)
+        labels = dict(UserBook.STATUS_CHOICES)
+        for result in results:
+            result["list_status"] = statuses.get(result["google_book_id"])
+            result["list_status_display"] = labels.get(result["list_status"])
+
+    def get_list_statuses(self, results):
+        user = getattr(self.request, "user", None)
+        if user is None or not user.is_authenticated:
+            return {}
+        return membership.statuses(user.id, [result["google_book_id"] for result in results])
+
+    # pega a página como string
+    def get_page(self):
+        try:
+            page = int(self.request.GET.get("page", "1"))
+            if page < 1:
+                page = 1
+        except ValueError:
+            page = 1
+        return page
+
+    # Retorna (resultados, total, api_indisponivel) para a página pedida. O catálogo local responde primeiro;
+    # a API só é chamada quando ele não tem livros suficientes para preencher a página
+    def load_results(self, query, page):
+        local = self.search_local(query)
+        if self.local_is_enough(local, page):
+            return self.page_slice(local, page), len(local), False
+        pages, merged, total_items = [], local, len(local)
+        try:
+            while self.needs_upstream(merged, pages, page):
+                pages.append(self.fetch_page(query, len(pages) + 1))
+                merged, total_items = self.merge_results(local, pages)
+        except UpstreamUnavailable:
+            return self.local_fallback(merged, page)
+        return self.page_slice(merged, page), total_items, False
+
+    def search_local(self, query):
+        if not settings.LOCAL_SEARCH_ENABLED:
+            return []
+        return [self.book_result(book) for book in search_index.search_books(query, limit=self.MAX_RESULTS_API)]
+
+    def local_is_enough(self, local, page):
+        return len(local) >= min(page * self.RESULTS_PER_PAGE, self.MAX_RESULTS_API)
+
+    def page_slice(self, results, page):
+        start = (page - 1) * self.RESULTS_PER_PAGE
+        return results[start:start + self.RESULTS_PER_PAGE]
+
+    # API fora do ar: a página mostra o que houver no catálogo local (e nas páginas da API já lidas) e só avisa
+    # o usuário se não houver nada
+    def local_fallback(self, results, page):
+        page_results = self.page_slice(results, page)
+        return page_results, len(results), not page_results
+
+    # Lista única de resultados: os locais primeiro, depois os das páginas da API na ordem dela, sem repetir
+    # livros. As páginas da busca são fatias dessa lista, então nenhum resultado da API fica de fora.
+    # Retorna (lista, total): o totalItems da API sem os livros que já vieram do catálogo local
+    def merge_results(self, local, pages):
+        merged = list(local)
+        seen = {result["google_book_id"] for result in local}
+        duplicates = 0
+        for data in pages:
+            for result in self.api_results(data):
+                if result["google_book_id"] in seen:
+                    duplicates += 1
+                    continue
+                seen.add(result["google_book_id"])
+                merged.append(result)
+        total_items = (pages[-1] or {}).get("totalItems", 0) if pages else 0
+        return merged, max(len(merged), len(local) + total_items - duplicates)
+
+    # A página pedida ainda não está coberta pela lista e a API pode ter mais (a última página veio cheia)
+    def needs_upstream(self, merged, pages, page):
+        if len(merged) >= min(page * self.RESULTS_PER_PAGE, self.MAX_RESULTS_API):
+            return False
+        if not pages:
+            return True
+        last = pages[-1] or {}
+        return len(pages) < self.WINDOW_PAGES and len(last.get("items", [])) >= self.RESULTS_PER_PAGE
+
+    def api_results(self, data):
+        results = []
+        for item in (data or {}).get("items", []):
+            info = item.get("volumeInfo", {}) # dicionário com os dados do livro retornado pela API
+            results.append({
+                "google_book_id": item.get("id"),
+                "title": info.get("title", "Sem título"),
+                "authors": ", ".join(info.get("authors") or ["Desconhecido"]),
+                "publisher": info.get("publisher", "Desconhecido"),
+                "published_date": info.get("publishedDate", "Desconhecido"),
+                "thumbnail": (info.get("imageLinks") or {}).get("thumbnail"),
+            })
+        return results
+
+    # Livro do catálogo local no mesmo formato dos resultados da API
+    def book_result(self, book):
+        return {
+            "google_book_id": book.google_book_id,
+            "title": book.title,
+            "authors": book.authors or "Desconhecido",
+            "publisher": book.publisher or "Desconhecido",
+            "published_date": book.published_date or "Desconhecido",
+            "thumbnail": book.image_url,
+        }
+
+    def cache_key(self, query, start_index):
+        return search_cache.make_key(query, start_index, self.RESULTS_PER_PAGE, self.PRINT_TYPE)
+
+    # Serve a página do cache; se ela não estiver lá (pesquisa nova), busca-a nesta thread
+    # enquanto as demais páginas da janela são buscadas em paralelo, para os próximos cliques saírem da memória
+    def fetch_page(self, query, page):
+        start_index = (page - 1) * self.RESULTS_PER_PAGE # pula os livros já exibidos para não haver repetição na página seguinte
+        key = self.cache_key(query, start_index)
+        data = search_cache.get(key)
+        if data is not None:
+            return data
+
+        pending = search_prefetcher.inflight(key) # a página já pode estar sendo buscada por um clique anterior
+        if pending is not None:
+            try:
+                return pending.result()
+            except QuotaExceeded:
+                pass # a busca antecipada ficou sem cota de segundo plano; esta, interativa, ainda pode ter
+
+        self.prefetch_window(query, page)
+        return self.fetch_results(query, start_index)
+
+    def prefetch_window(self, query, page):
+        for other in range(1, self.WINDOW_PAGES + 1):
+            if other == page:
+                continue
+            start_index = (other - 1) * self.RESULTS_PER_PAGE
+            # fetch_results consulta o cache antes, então páginas já guardadas não geram chamada
+            # páginas antecipadas são de segundo plano: não gastam a cota reservada para as buscas dos usuários
+            search_prefetcher.submit(
+                self.cache_key(query, start_index),
+                quota.in_background(lambda start_index=start_index: self.fetch_results(query, start_index)),
+            )
+
+    # Busca uma página de resultados, passando antes pelo cache compartilhado (mesma busca = mesma chave)
+    def fetch_results(self, query, start_index):
+        def fetch():
+            return get_client().search(
+                f"intitle:{query}", # Buscar apenas os livros com a query de busca em seu título
+                start_index=start_index,
+                max_results=self.RESULTS_PER_PAGE,
+                print_type=self.PRINT_TYPE,
+            )
+
+        return search_cache.get_or_set(self.cache_key(query, start_index), fetch)
+
+
+# Sugestões para o campo de busca (autocomplete): /search/suggest/?q=har. Responde do índice em memória,
+# sem banco nem API, e pode ser guardada pelo navegador para o mesmo prefixo não voltar ao servidor
+class SearchSuggestView(View):
+    def get(self, request, *args, **kwargs):
+        config = settings.SEARCH_SUGGEST
+        query = request.GET.get("q", "")
+        try:
+            limit = min(int(request.GET.get("limit", config["LIMIT"])), config["MAX_LIMIT"])
+        except ValueError:
+            limit = config["LIMIT"]
+        suggestions = suggest_index.suggest(query, limit) if len(query.strip()) >= config["MIN_LENGTH"] else []
+        response = JsonResponse({"query": query, "suggestions": suggestions})
+        patch_cache_control(response, public=True, max_age=config["MAX_AGE"])
+        return response
+
+
+# Versão assíncrona da busca, para rodar sob ASGI: a chamada à API não prende uma thread
+class AsyncBookSearchView(BookSearchView):
+    async def get(self, request, *args, **kwargs):
+        query = request.GET.get("q", "")
+        self.loaded = await self.aload_results(query, self.get_page()) if query else ([], 0, False)
+        self.list_statuses = await sync_to_async(super().get_list_statuses)(self.loaded[0]) # sessão e cache fora do event loop
+        return self.render_to_response(self.get_context_data(**kwargs)) # o template é renderizado pelo Django fora do event loop
+
+    def load_results(self, query, page):
+        return self.loaded
+
+    def get_list_statuses(self, results):
+        return self.list_statuses
+
+    async def aload_results(self, query, page):
+        local = await sync_to_async(self.search_local)(query)
+        if self.local_is_enough(local, page):
+            return self.page_slice(local, page), len(local), False
+        pages, merged, total_items = [], local, len(local)
+        try:
+            while self.needs_upstream(merged, pages, page):
+                pages.append(await self.afetch_page(query, len(pages) + 1))
+                merged, total_items = self.merge_results(local, pages)
+        except UpstreamUnavailable:
+            return self.local_fallback(merged, page)
+        return self.page_slice(merged, page), total_items, False
+
+    async def afetch_page(self, query, page):
+        start_index = (page - 1) * self.RESULTS_PER_PAGE
+        data = await search_cache.aget(self.cache_key(query, start_index))
+        if data is None:
+            # as outras páginas da janela vão para o pool de threads, sem ocupar o event loop
+            self.prefetch_window(query, page)
+            data = await self.afetch_results(query, start_index)
+        return data
+
+    async def afetch_results(self, query, start_index):
+        async def fetch():
+            return await get_async_client().search(
+                f"intitle:{query}",
+                start_index=start_index,
+                max_results=self.RESULTS_PER_PAGE,
+                print_type=self.PRINT_TYPE,
+            )
+
+        return await search_cache.aget_or_set(self.cache_key(query, start_index), fetch)
+
 
 # Página de login
 class CustomLoginView(LoginView):
@@ -102,15 +309,78 @@ class ProfileView(LoginRequiredMixin, ListView): #LoginRequiredMixin: apenas usu
 
     # retorna os livros com filtro de status, caso selecionado
     def get_queryset(self):
-        queryset = UserBook.objects.filter(user=self.request.user).order_by("-added_at")
-        status = self.request.GET.get("status")
-        if status:
-            queryset = queryset.filter(status=status)
-        return queryset
+        # select_related traz o Book no mesmo SELECT: o template lê userbook.book.* de cada card
+        # réplica de leitura, exceto logo depois de o usuário mudar a lista (core.replicas)
+        queryset = UserBook.objects.using(replicas.read_alias(self.request.user.id)).filter(user=self.request.user)
+        queryset = queryset.select_related("book").order_by("-added_at", "-id")
+        return taxonomy.filter_userbooks(queryset, self.get_filters())
+
+    # Filtros da lista: status e, pelos índices de Author/Category, autor e categoria (ids inválidos são ignorados)
+    def get_filters(self):
+        filters = {}
+        if self.request.GET.get("status"):
+            filters["status"] = self.request.GET["status"]
+        for name in ("author", "category"):
+            value = self.request.GET.get(name, "")
+            if value.isdigit():
+                filters[name] = int(value)
+        return filters
+
+    # Modo cursor (?cursor=... ou PROFILE_PAGINATION = "cursor"): sem COUNT(*) nem OFFSET, para listas muito grandes
+    def use_cursor(self):
+        return "cursor" in self.request.GET or settings.PROFILE_PAGINATION == "cursor"
+
+    def show_facets(self):
+        return not self.use_cursor() and fragments.enabled()
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, ordering=("-added_at", "-id"))
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            page = paginator.page() # cursor adulterado ou antigo: volta para o início
+        return paginator, page, page.object_list, page.has_other_pages()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        filters = self.get_filters()
         context["status_selected"] = self.request.GET.get("status", "")
+        context["author_selected"] = filters.get("author")
+        context["category_selected"] = filters.get("category")
+        context["filter_query"] = urlencode(filters) # mantém os filtros nos links de paginação
+        # contagens de cada filtro (status × autor × categoria): uma query agrupada sobre a lista inteira, em cache
+        # pela versão da lista. Fora do modo cursor (que não conta a lista) e só com o cache de fragmentos ligado;
+        # sem elas, o filtro de status aparece sem contagens
+        context["cursor_mode"] = self.use_cursor()
+        context["facets"] = taxonomy.facets(self.request.user.id, filters) if self.show_facets() else None
+        context["status_choices"] = UserBook.STATUS_CHOICES
+        # totais por status, páginas lidas e livros por mês: uma linha de ReadingStats, sem COUNT sobre a lista
+        context["reading_stats"] = reading_stats.get_stats(self.request.user)
+        context["recent_months"] = reading_stats.recent_months(self.request.user)
+        # QuerySet preguiçoso: só vai ao banco quando o fragmento de recomendações não está em cache
+        context["recommendations"] = recommendations.for_user(self.request.user.id)
+        context["recommendations_timeout"] = settings.RECOMMENDATIONS["CACHE_TIMEOUT"]
+        # lista e cards saem do cache de fragmentos enquanto a lista não mudar (ver core.fragments)
+        context.update(fragments.template_context(self.request, list_version=fragments.list_version(self.request.user.id)))
+        return context
+
+
+# Lista do usuário com os dados completos de cada livro (descrição, páginas, categorias), como na página
+# de detalhes. Os volumes da página são hidratados de uma vez (core.hydration), não um por livro
+class ExpandedProfileView(ProfileView):
+    template_name = 'profile_expanded.html'
+
+    def use_cursor(self):
+        return True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        books = context["books"]
+        details = hydration.hydrate([userbook.book.google_book_id for userbook in books])
+        for userbook in books:
+            userbook.details = details[userbook.book.google_book_id] or {}
         return context
 
 
@@ -120,31 +390,9 @@ class AddBookToListView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         # Dados do livro vindos do formulário
         google_book_id = request.POST.get("google_book_id")
-        title = request.POST.get("title")
-        authors = request.POST.get("authors", "")
-        publisher = request.POST.get("publisher", "")
-        published_date = request.POST.get("published_date", "")
-        thumbnail = request.POST.get("thumbnail", "")
-
-        # cria ou pega o objeto Book no banco de dados
-        book_obj, created = Book.objects.get_or_create(
-            google_book_id=google_book_id,
-            defaults={
-                "title": title,
-                "authors": authors,
-                "publisher": publisher,
-                "published_date": published_date,
-                "thumbnail": thumbnail,
-            }
-        )
+        userbook, created, added = library.add_book(request.user, google_book_id, library.book_fields(request.POST))
+        book_obj = userbook.book
 
-        # cria ou pega o objeto UserBook no banco de dados
-        UserBook.objects.get_or_create(
-            user=request.user,
-            book=book_obj,
-            defaults={"status": "plan"}
-        )
-        
         if created:
             messages.success(request, f'Livro "{book_obj.title}" adiconado à sua lista!')
         else:
@@ -156,9 +404,7 @@ class AddBookToListView(LoginRequiredMixin, View):
 class RemoveBookFromListView(LoginRequiredMixin, View):
     # Recebe o ID do livro por formulário preenchido automaticamente
     def post(self, request, userbook_id, *args, **kwargs):
-        userbook = get_object_or_404(UserBook, id=userbook_id, user=request.user)
-        title = userbook.book.title
-        userbook.delete()
+        title = library.remove_book(request.user, userbook_id).book.title
         messages.success(request, f'Livro "{title}" removido de sua lista')
         return redirect('profile')
     
@@ -166,45 +412,266 @@ class RemoveBookFromListView(LoginRequiredMixin, View):
 # Atualiza o status de um livro na lista do usuário (lendo, planejo ler...)
 class UpdateBookStatusView(LoginRequiredMixin, View):
     def post(self, request, userbook_id, *args, **kwargs):
-        userbook = get_object_or_404(UserBook, id=userbook_id, user=request.user)
-        title = userbook.book.title
         new_status = request.POST.get("status")
-        if new_status in dict(UserBook.STATUS_CHOICES):
-            userbook.status = new_status
-            userbook.save()
+        userbook = library.update_status(request.user, userbook_id, new_status)
+        title = userbook.book.title
         new_status_display = userbook.get_status_display() # get_status_display pega o valor "amigável" do status ("Planejo ler" ao invés de "plan")
         messages.success(request, f'Alterado status de "{title}" para "{new_status_display}"')
         return redirect("profile")
     
 
-# Exibe informações completas do livro com base nos dados da API
+# Operações em lote: recebem JSON com vários livros de uma vez e respondem com o resultado de cada item.
+# Cada lote roda em uma única transação, com um número fixo de queries (bulk_create / update / delete).
+# Classe abstrata: as rotas usam as subclasses, que definem process
+class BulkBooksView(LoginRequiredMixin, View, metaclass=ABCMeta):
+    MAX_ITEMS = 500 # limite de itens por requisição
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("o corpo deve ser um objeto JSON")
+            with transaction.atomic():
+                results = self.process(payload)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+        counts = {}
+        for item in results:
+            counts[item["result"]] = counts.get(item["result"], 0) + 1
+        return JsonResponse({"results": results, "counts": counts})
+
+    def get_list(self, payload, name):
+        values = payload.get(name)
+        if not isinstance(values, list) or not values:
+            raise ValueError(f'"{name}" deve ser uma lista não vazia')
+        if len(values) > self.MAX_ITEMS:
+            raise ValueError(f"no máximo {self.MAX_ITEMS} itens por requisição")
+        return values
+
+    def get_ids(self, payload):
+        try:
+            return [int(value) for value in self.get_list(payload, "userbook_ids")]
+        except (TypeError, ValueError):
+            raise ValueError('"userbook_ids" deve conter apenas números')
+
+    # Executa a operação dentro da transação e retorna o resultado de cada item
+    @abstractmethod
+    def process(self, payload):
+        pass
+
+
+# Adiciona vários livros à lista: {"books": [{"google_book_id": ..., "title": ..., "authors": ...}, ...]}.
+# Responde um resultado por item, na ordem do pedido; um livro repetido no pedido entra uma vez e as
+# repetições saem como "already_in_list"
+class BulkAddBooksView(BulkBooksView):
+    def process(self, payload):
+        books = {}
+        requested = []  # (google_book_id, válido) de cada item, na ordem do pedido
+        for item in self.get_list(payload, "books"):
+            google_book_id = item.get("google_book_id") if isinstance(item, dict) else None
+            if not google_book_id or not item.get("title"):
+                requested.append((google_book_id, False))
+                continue
+            requested.append((google_book_id, True))
+            books.setdefault(google_book_id, Book(google_book_id=google_book_id, **library.book_fields(item)))
+
+        existing_books = set(Book.objects.filter(google_book_id__in=books).values_list("google_book_id", flat=True))
+        Book.objects.bulk_create(books.values(), ignore_conflicts=True)
+        saved = {book.google_book_id: book for book in Book.objects.filter(google_book_id__in=books)}
+        new_books = [book for google_book_id, book in saved.items() if google_book_id not in existing_books]
+        search_index.index_books(saved.values()) # bulk_create não dispara post_save
+        taxonomy.link_authors(new_books)
+        if new_books:
+            # os títulos novos entram no autocomplete deste processo, como em library.add_book
+            transaction.on_commit(lambda: suggest_index.add_books(new_books))
+
+        already_listed = set(
+            UserBook.objects.filter(user=self.request.user, book__in=saved.values()).values_list("book_id", flat=True)
+        )
+        created = UserBook.objects.bulk_create(
+            [UserBook(user=self.request.user, book=book, status="plan") for book in saved.values() if book.id not in already_listed],
+            ignore_conflicts=True,
+        )
+        reading_stats.books_added(self.request.user.id, [(userbook.book_id, userbook.status, userbook.added_at) for userbook in created])
+        if created:
+            fragments.list_changed(self.request.user.id) # bulk_create não dispara post_save
+
+        results = []
+        for google_book_id, valid in requested:
+            if not valid:
+                result = "invalid"
+            elif saved[google_book_id].id in already_listed:
+                result = "already_in_list"
+            else:
+                result = "added"
+                already_listed.add(saved[google_book_id].id)  # repetições do mesmo livro no pedido
+            results.append({"google_book_id": google_book_id, "result": result})
+        # dados completos e capas dos livros novos e recomendações dos livros adicionados, pelo worker (run_jobs)
+        jobs.enqueue_many([
+            ("enrich", [book.id for book in new_books], 0),
+            jobs.neighbors_batch([userbook.book_id for userbook in created]),
+        ])
+        return results
+
+
+# Altera o status de vários livros da lista: {"status": "reading", "userbook_ids": [1, 2, 3]}
+class BulkUpdateStatusView(BulkBooksView):
+    def process(self, payload):
+        status = payload.get("status")
+        if status not in dict(UserBook.STATUS_CHOICES):
+            raise ValueError("status inválido")
+        ids = self.get_ids(payload)
+        owned = UserBook.objects.filter(user=self.request.user, id__in=ids)
+        previous = list(owned.select_for_update().values_list("id", "book_id", "status"))
+        found = {id for id, _, _ in previous}
+        owned.update(status=status)
+        reading_stats.status_changed(self.request.user.id, [(book_id, old, status) for _, book_id, old in previous])
+        if previous:
+            fragments.list_changed(self.request.user.id) # update() não dispara post_save
+            jobs.neighbors_changed(*[book_id for _, book_id, old in previous if old != status])
+        return [{"userbook_id": id, "result": "updated" if id in found else "not_found"} for id in ids]
+
+
+# Remove vários livros da lista: {"userbook_ids": [1, 2, 3]}
+class BulkRemoveBooksView(BulkBooksView):
+    def process(self, payload):
+        ids = self.get_ids(payload)
+        owned = UserBook.objects.filter(user=self.request.user, id__in=ids)
+        removed = list(owned.select_for_update().values_list("id", "book_id", "status", "added_at"))
+        found = {row[0] for row in removed}
+        owned.delete()
+        reading_stats.books_removed(self.request.user.id, [row[1:] for row in removed])
+        if removed:
+            fragments.list_changed(self.request.user.id)
+            jobs.neighbors_changed(*[row[1] for row in removed])
+        return [{"userbook_id": id, "result": "removed" if id in found else "not_found"} for id in ids]
+
+
+# Importa uma lista de leitura (CSV ou JSON, ex.: exportação do Goodreads). O arquivo é salvo e
+# processado em segundo plano; o andamento pode ser acompanhado em import_status
+class ImportReadingListView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            messages.error(request, "Selecione um arquivo para importar.")
+            return redirect("profile")
+        if upload.size > settings.READING_LIST_IMPORT["MAX_UPLOAD_SIZE"]:
+            messages.error(request, "Arquivo grande demais para importar.")
+            return redirect("profile")
+
+        format = "json" if upload.name.lower().endswith((".json", ".jsonl")) else "csv"
+        job = ImportJob.objects.create(user=request.user, source=upload, format=format)
+        transaction.on_commit(lambda: importers.schedule_import(job))
+        messages.success(request, f'Importação de "{upload.name}" iniciada. Os livros vão aparecer na sua lista aos poucos.')
+        return redirect("profile")
+
+
+# Andamento de uma importação, em JSON
+class ImportStatusView(LoginRequiredMixin, View):
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+        return JsonResponse({
+            "id": job.id,
+            "status": job.status,
+            "rows_processed": job.rows_processed,
+            "rows_imported": job.rows_imported,
+            "rows_failed": job.rows_failed,
+            "error": job.error,
+        })
+
+
+# Exporta a lista do usuário (CSV ou ?format=json) em streaming: as linhas são lidas do banco em
+# blocos e enviadas conforme são geradas, sem montar o arquivo inteiro na memória.
+# Com ?expanded=1, leva também descrição, páginas e categorias de cada livro (core.hydration)
+class ExportReadingListView(LoginRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        expanded = request.GET.get("expanded") == "1"
+        rows = importers.export_rows(request.user, expanded=expanded)
+        if request.GET.get("format") == "json":
+            response = StreamingHttpResponse(importers.stream_json(rows), content_type="application/json")
+            filename = "bookly.json"
+        else:
+            fields = importers.EXPORT_FIELDS + (importers.EXPANDED_FIELDS if expanded else [])
+            response = StreamingHttpResponse(importers.stream_csv(rows, fields), content_type="text/csv; charset=utf-8")
+            filename = "bookly.csv"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+# Capa copiada pelo job "cover" (core/jobs.py). A URL leva o hash da imagem, então o navegador pode
+# guardá-la por COVERS["MAX_AGE"] sem perguntar de novo ao servidor
+class BookCoverView(View):
+    def get(self, request, book_id, version, *args, **kwargs):
+        book = get_object_or_404(Book.objects.only("id", "cover").exclude(cover=""), pk=book_id)
+        if version != book.cover_version:
+            return redirect(book.image_url) # a capa foi trocada depois que a página foi gerada
+        response = FileResponse(book.cover.open("rb"), content_type=mimetypes.guess_type(book.cover.name)[0])
+        patch_cache_control(response, public=True, max_age=settings.COVERS["MAX_AGE"], immutable=True)
+        return response
+
+
+# Exibe informações completas do livro (do banco, para livros já salvos, ou da API)
 class BookDetailView(TemplateView):
     template_name = 'book_detail.html'
-    
+
+    # Se a API estiver fora do ar e o livro não estiver salvo, mostra a página em modo degradado
+    def get(self, request, *args, **kwargs):
+        try:
+            return super().get(request, *args, **kwargs)
+        except UpstreamUnavailable:
+            return self.render_unavailable(kwargs.get("google_book_id"))
+
+    def render_unavailable(self, google_book_id):
+        context = {"google_book_id": google_book_id, "unavailable": True}
+        return self.render_to_response(context, status=503)
+
+    def get_volume(self, google_book_id):
+        return volumes.get_volume_context(google_book_id) # Dados salvos no banco ou, se não houver, da API do google
+
+    # "Quem leu também leu": vizinhos pré-calculados em BookNeighbor, uma consulta no índice
+    def get_recommendations(self, google_book_id):
+        return recommendations.similar_books(google_book_id)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         google_book_id = kwargs.get("google_book_id") # Pega o id do livro pela URL
-        url = f"https://www.googleapis.com/books/v1/volumes/{google_book_id}"
-        response = requests.get(url) # Pega os dados completos na API do google
+        volume = self.get_volume(google_book_id)
 
-        if response.status_code != 200:
+        if volume is None:
             raise Http404("Livro não encontrado")
 
-        data = response.json()
-        info = data.get("volumeInfo", {})
-
-        context.update({
-            "google_book_id": google_book_id,
-            "title": info.get("title", "Sem título"),
-            "subtitle": info.get("subtitle", ""),
-            "authors": ", ".join(info.get("authors") or ["Desconhecido"]),
-            "publisher": info.get("publisher", "Desconhecido"),
-            "published_date": info.get("publishedDate", "Desconhecido"),
-            "description": info.get("description", "Sem descrição"),
-            "page_count": info.get("pageCount", "Desconhecido"),
-            "categories": ", ".join(info.get("categories") or ["Sem categoria"]),
-            "thumbnail": (info.get("imageLinks") or {}).get("thumbnail"),
-            "language": info.get("language", "Desconhecido"),
-            "preview_link": info.get("previewLink"),
-        })
-        return context
\ No newline at end of file
+        context.update(volume)
+        context["recommendations"] = self.get_recommendations(google_book_id)
+        return context
+
+
+# Versão assíncrona dos detalhes, para rodar sob ASGI
+class AsyncBookDetailView(BookDetailView):
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.volume = await volumes.aget_volume_context(kwargs.get("google_book_id"))
+        except UpstreamUnavailable:
+            return self.render_unavailable(kwargs.get("google_book_id"))
+        self.recommendations = await recommendations.asimilar_books(kwargs.get("google_book_id"))
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    def get_volume(self, google_book_id):
+        return self.volume
+
+    def get_recommendations(self, google_book_id):
+        return self.recommendations
+
+
+# Métricas de desempenho no formato do Prometheus: tempos por view (API, banco, template, total), cache,
+# API do Google (latência, disjuntor, coalescência, cota) e autocomplete. Só para staff ou com o token
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        token = settings.PERFORMANCE_METRICS["TOKEN"]
+        authorized = request.user.is_staff or (token and request.headers.get("Authorization") == f"Bearer {token}")
+        if not authorized:
+            raise PermissionDenied
+        writer = instrumentation.PrometheusWriter()
+        instrumentation.write_request_metrics(writer)
+        instrumentation.write_app_metrics(writer)
+        return HttpResponse(writer.render(), content_type=writer.CONTENT_TYPE)
@@ -0,0 +1,225 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import volume_cache
+from .google_books import GoogleBooksError, get_async_client, get_client
+from .models import Book, BookVolume
+from .quota import QuotaExceeded, background
+from . import fragments, reading_stats, taxonomy
+
+logger = logging.getLogger(__name__)
+
+# Pool pequeno para atualizar volumes vencidos fora do ciclo da requisição
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="volume-refresh")
+_refreshing = set()  # ids que já estão sendo atualizados, para não enfileirar o mesmo livro duas vezes
+_refreshing_lock = threading.Lock()
+
+
+# Busca o volume completo na API do Google. Retorna o JSON ou None se o livro não existir;
+# levanta UpstreamUnavailable se a API estiver fora do ar
+def fetch_volume(google_book_id):
+    return get_client().volume(google_book_id)
+
+
+# Volume de um livro que não está no banco, guardado em volume_cache. Os ids do Google diferenciam
+# maiúsculas de minúsculas, por isso a chave não passa por make_key
+def volume_key(google_book_id):
+    return f"{volume_cache.prefix}:{google_book_id}"
+
+
+def fetch_volume_cached(google_book_id):
+    return volume_cache.get_or_set(volume_key(google_book_id), lambda: fetch_volume(google_book_id))
+
+
+# Converte o volumeInfo da API nos campos guardados em BookVolume
+def volume_fields(data):
+    info = data.get("volumeInfo", {})
+    return {
+        "subtitle": info.get("subtitle", ""),
+        "description": info.get("description", ""),
+        "page_count": info.get("pageCount"),
+        "categories": ", ".join(info.get("categories") or []),
+        "language": info.get("language", ""),
+        "preview_link": info.get("previewLink"),
+    }
+
+
+# Grava (ou atualiza) os dados do volume para um Book já existente. Se o número de páginas mudar,
+# as páginas lidas de quem completou o livro são corrigidas na mesma transação; se as categorias mudarem,
+# as ligações com Category são trocadas e os filtros do perfil de quem tem o livro, recalculados
+@transaction.atomic
+def store_volume(book, data):
+    fields = volume_fields(data)
+    fields["fetched_at"] = timezone.now()
+    old_page_count = BookVolume.objects.filter(book=book).values_list("page_count", flat=True).first()
+    volume, _ = BookVolume.objects.update_or_create(book=book, defaults=fields)
+    reading_stats.page_count_changed(book.pk, old_page_count, volume.page_count)
+    if taxonomy.set_categories(book.pk, data.get("volumeInfo", {}).get("categories") or []):
+        fragments.book_changed(book.pk)
+    return volume
+
+
+def is_stale(volume):
+    return volume.fetched_at < timezone.now() - timedelta(seconds=settings.BOOK_VOLUME_TTL)
+
+
+# Contexto da página de detalhes a partir do banco (Book + BookVolume)
+def context_from_store(book, volume):
+    return {
+        "google_book_id": book.google_book_id,
+        "title": book.title,
+        "subtitle": volume.subtitle,
+        "authors": book.authors or "Desconhecido",
+        "publisher": book.publisher or "Desconhecido",
+        "published_date": book.published_date or "Desconhecido",
+        "description": volume.description or "Sem descrição",
+        "page_count": volume.page_count or "Desconhecido",
+        "categories": volume.categories or "Sem categoria",
+        "thumbnail": book.image_url,
+        "language": volume.language or "Desconhecido",
+        "preview_link": volume.preview_link,
+    }
+
+
+# Contexto da página de detalhes direto da resposta da API
+def context_from_api(google_book_id, data):
+    info = data.get("volumeInfo", {})
+    return {
+        "google_book_id": google_book_id,
+        "title": info.get("title", "Sem título"),
+        "subtitle": info.get("subtitle", ""),
+        "authors": ", ".join(info.get("authors") or ["Desconhecido"]),
+        "publisher": info.get("publisher", "Desconhecido"),
+        "published_date": info.get("publishedDate", "Desconhecido"),
+        "description": info.get("description", "Sem descrição"),
+        "page_count": info.get("pageCount", "Desconhecido"),
+        "categories": ", ".join(info.get("categories") or ["Sem categoria"]),
+        "thumbnail": (info.get("imageLinks") or {}).get("thumbnail"),
+        "language": info.get("language", "Desconhecido"),
+        "preview_link": info.get("previewLink"),
+    }
+
+
+# Retorna o contexto da página de detalhes, ou None se o livro não existir na API.
+# Livros já salvos com volume fresco saem do banco sem chamada externa; volumes vencidos
+# também saem do banco, mas são atualizados em segundo plano (stale-while-revalidate).
+def get_volume_context(google_book_id):
+    book = Book.objects.select_related("volume").filter(google_book_id=google_book_id).first()
+    volume = getattr(book, "volume", None) if book else None
+
+    if volume is not None:
+        if is_stale(volume):
+            schedule_refresh(book)
+        return context_from_store(book, volume)
+
+    if book is None:
+        data = fetch_volume_cached(google_book_id)
+    else:
+        data = fetch_volume(google_book_id)
+        if data is not None:
+            store_volume(book, data)
+    if data is None:
+        return None
+    return context_from_api(google_book_id, data)
+
+
+# Versão assíncrona de get_volume_context, usada pela view ASGI de detalhes
+async def aget_volume_context(google_book_id):
+    book = await Book.objects.select_related("volume").filter(google_book_id=google_book_id).afirst()
+    volume = getattr(book, "volume", None) if book else None
+
+    if volume is not None:
+        if is_stale(volume):
+            await sync_to_async(schedule_refresh)(book)
+        return context_from_store(book, volume)
+
+    if book is None:
+        data = await volume_cache.aget_or_set(volume_key(google_book_id), lambda: get_async_client().volume(google_book_id))
+    else:
+        data = await get_async_client().volume(google_book_id)
+        if data is not None:
+            await sync_to_async(store_volume)(book, data)
+    if data is None:
+        return None
+    return context_from_api(google_book_id, data)
+
+
+# Agenda a atualização do volume de um livro salvo. Com BOOK_VOLUME_REFRESH_IN_BACKGROUND
+# desligado (ex.: testes), a atualização é feita na hora
+def schedule_refresh(book):
+    if not settings.BOOK_VOLUME_REFRESH_IN_BACKGROUND:
+        try:
+            with background():
+                refresh_volume(book.pk)
+        except GoogleBooksError:
+            logger.warning("Falha ao atualizar o volume do livro %s", book.pk, exc_info=True)
+        return
+    with _refreshing_lock:
+        if book.pk in _refreshing:
+            return
+        _refreshing.add(book.pk)
+    _refresh_executor.submit(_refresh_in_background, book.pk)
+
+
+# Completa um Book recém-criado (que só tem os campos vindos do formulário de busca) com o volume da API:
+# grava o BookVolume, preenche os campos do Book que vieram vazios e troca o thumbnail pelo da API.
+# Retorna o Book, ou None se o livro não existir mais (no banco ou na API)
+def enrich_book(book_id):
+    book = Book.objects.filter(pk=book_id).first()
+    if book is None:
+        return None
+    data = fetch_volume(book.google_book_id)
+    if data is None:
+        return None
+    info = data.get("volumeInfo", {})
+    found = {
+        "authors": ", ".join(info.get("authors") or []),
+        "publisher": info.get("publisher", ""),
+        "published_date": info.get("publishedDate", ""),
+        "thumbnail": (info.get("imageLinks") or {}).get("thumbnail"),
+    }
+    changed = []
+    for name, value in found.items():
+        # o thumbnail da API substitui o enviado pelo usuário: é dele que o job "cover" baixa a capa
+        replace = name == "thumbnail" and value != book.thumbnail
+        if value and (replace or not getattr(book, name)):
+            max_length = Book._meta.get_field(name).max_length
+            setattr(book, name, value[:max_length])
+            changed.append(name)
+    with transaction.atomic():
+        store_volume(book, data)
+        if changed:
+            book.save(update_fields=[*changed, "updated_at"])
+    return book
+
+
+def refresh_volume(book_id):
+    book = Book.objects.filter(pk=book_id).first()
+    if book is None:
+        return None
+    data = fetch_volume(book.google_book_id)
+    if data is None:
+        return None
+    return store_volume(book, data)
+
+
+def _refresh_in_background(book_id):
+    close_old_connections()
+    try:
+        with background():  # atualização de volume não disputa cota com as buscas dos usuários
+            refresh_volume(book_id)
+    except QuotaExceeded:
+        logger.info("Atualização do volume do livro %s adiada: cota da API reservada", book_id)
+    except Exception:
+        logger.exception("Falha ao atualizar o volume do livro %s", book_id)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(book_id)
+        close_old_connections()
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'bootstrap4',
 ]
@@ -47,6 +51,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'core.CustomUser'
 
 MIDDLEWARE = [
+    'core.instrumentation.PerformanceMiddleware',  # primeiro, para medir também os outros middlewares
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,15 +84,314 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Conexão pelo ambiente (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT), com os valores de desenvolvimento
+# como padrão. DB_ENGINE=sqlite usa arquivos SQLite (DB_NAME é o caminho), para testar sem PostgreSQL.
+#   - conexões persistentes: cada worker reaproveita a conexão por até DB_CONN_MAX_AGE s, conferindo antes se
+#     ela ainda responde (CONN_HEALTH_CHECKS);
+#   - DB_POOL=1: pool de conexões do próprio Django (psycopg 3 + psycopg-pool), com DB_POOL_MIN_SIZE a
+#     DB_POOL_MAX_SIZE conexões por processo. É o indicado sob ASGI, onde as conexões persistentes não são
+#     reaproveitadas entre requisições; não combina com CONN_MAX_AGE, que fica em 0;
+#   - DB_REPLICAS: hosts das réplicas de leitura, separados por vírgula (no SQLite, caminhos de arquivos, ex.:
+#     cópias do banco para simular réplicas atrasadas). Viram os aliases replica_1, replica_2...,
+#     usados pelas leituras de core.replicas.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'postgresql')
+DB_POOL = os.environ.get('DB_POOL') == '1'
+
+
+def database(host=None):
+    if DB_ENGINE == 'sqlite':
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': host or os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3')}
+    config = {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'bookly',
-        'USER': 'postgres',
-        'PASSWORD': 'postgres',
-        'HOST': 'localhost',
-        'PORT': '5432'
+        'NAME': os.environ.get('DB_NAME', 'bookly'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'postgres'),
+        'HOST': host or os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
+    if DB_POOL:
+        config['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': 10,  # segundos esperando uma conexão livre antes de dar erro
+        }
+    return config
+
+
+DATABASES = {'default': database()}
+
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    # nos testes as réplicas são o próprio banco de testes
+    DATABASES[alias] = dict(database(host.strip()), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+# Escritas e migrações sempre no default (core.replicas)
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Depois de mudar a lista, as leituras do usuário ficam no default por REPLICA_PIN_SECONDS s, o atraso
+# máximo esperado das réplicas: quem acabou de adicionar um livro o vê no perfil
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Em produção, defina GOOGLE_BOOKS_CACHE_URL (ex.: redis://localhost:6379/1) para
+# compartilhar as respostas da API do Google Books entre todos os workers.
+
+GOOGLE_BOOKS_CACHE_URL = os.environ.get('GOOGLE_BOOKS_CACHE_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'google_books': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'google-books',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # sem um cache compartilhado, o cache de fragmentos fica desligado: com um LocMem por processo, a versão da
+    # lista trocada por um worker não chegaria aos outros, que continuariam servindo o HTML antigo
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    # só usado com o cache compartilhado (sessões e usuários logados, abaixo)
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+if GOOGLE_BOOKS_CACHE_URL:
+    CACHES['google_books'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': GOOGLE_BOOKS_CACHE_URL,
+    }
+    # as versões das listas precisam ser as mesmas em todos os workers
+    CACHES['fragments'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': GOOGLE_BOOKS_CACHE_URL,
+        'KEY_PREFIX': 'fragments',
+    }
+    # sessões e usuários logados: os mesmos em todos os workers
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': GOOGLE_BOOKS_CACHE_URL,
+        'KEY_PREFIX': 'sessions',
+    }
+
+# Leia-o-que-escreveu (core.replicas) marca no cache de fragmentos quem acabou de escrever; sem um cache
+# compartilhado, os outros workers não veriam a marca e leriam a lista antiga das réplicas
+if DATABASE_REPLICAS and not GOOGLE_BOOKS_CACHE_URL:
+    raise ImproperlyConfigured('DB_REPLICAS exige GOOGLE_BOOKS_CACHE_URL (cache compartilhado entre os workers)')
+
+# Com o cache compartilhado, sessões lidas do cache e gravadas no cache e no banco (cached_db): uma requisição
+# com a sessão em cache não consulta django_session, e as sessões sobrevivem a um cache esvaziado. Sem ele,
+# as sessões ficam só no banco: num cache por processo, um logout ou uma troca de senha em um worker não
+# chegaria aos outros, que continuariam aceitando a sessão antiga
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db' if GOOGLE_BOOKS_CACHE_URL else 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Usuário logado em cache (core.auth), invalidado quando o usuário é salvo; também só com o cache
+# compartilhado, pelo mesmo motivo. O ModelBackend continua na lista para as sessões abertas antes dele,
+# que guardam o caminho do backend usado no login
+AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+if GOOGLE_BOOKS_CACHE_URL:
+    AUTHENTICATION_BACKENDS.insert(0, 'core.auth.CachedModelBackend')
+AUTH_USER_CACHE = {
+    'ALIAS': 'sessions',
+    'TIMEOUT': 60 * 15,
+}
+
+# Mensagens de confirmação (adicionar, editar, remover) em cookie assinado: o redirect não grava a sessão
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Fragmentos dos templates (core.fragments): cards e páginas do perfil, grade de resultados da busca.
+# As chaves levam versões, então o TIMEOUT só serve para liberar espaço de fragmentos que não são mais usados
+FRAGMENT_CACHE = {
+    'ALIAS': 'fragments',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Livros de cada usuário marcados nos resultados de busca (core.membership): o mapa da lista fica no cache de
+# fragmentos por até TIMEOUT s (a chave leva a versão da lista); listas com mais de MAX_CACHED livros não são
+# guardadas, e cada página de resultados consulta só os livros dela
+MEMBERSHIP = {
+    'MAX_CACHED': 5000,
+    'TIMEOUT': 60 * 60,
+    'FILL_IN_BACKGROUND': True,  # o mapa é montado fora da requisição; a página usa a query com IN
+}
+
+# Filtros do perfil por autor e categoria (core.taxonomy): quantos de cada aparecem, dos com mais livros
+# na lista aos com menos
+FACETS = {
+    'LIMIT': 50,
+}
+
+# Respostas de busca: TTL em segundos e tamanho máximo do LRU em memória de cada processo.
+# Na primeira vez que uma pesquisa aparece, as 5 páginas exibíveis são buscadas em paralelo
+GOOGLE_BOOKS_CACHE = {
+    'ALIAS': 'google_books',
+    'TIMEOUT': 60 * 10,
+    'MAX_ENTRIES': 1000,
+    'PREFETCH_WORKERS': 8,  # threads que buscam em paralelo as outras páginas de uma pesquisa nova
+}
+
+# Cliente da API do Google Books (core.google_books): timeouts em segundos, novas tentativas
+# em 429/5xx e disjuntor que abre depois de BREAKER_THRESHOLD falhas seguidas
+GOOGLE_BOOKS_API = {
+    'BASE_URL': os.environ.get('GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1'),
+    'API_KEY': os.environ.get('GOOGLE_BOOKS_API_KEY'),
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'MAX_RETRIES': 2,
+    'BACKOFF': 0.3,
+    'POOL_MAXSIZE': 20,  # conexões simultâneas por host, por processo
+    'ASYNC_POOL_MAXSIZE': 200,  # idem, para o cliente assíncrono de cada event loop (views ASGI)
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET_TIMEOUT': 30,
+}
+
+# Chamadas idênticas simultâneas à API (ex.: um link compartilhado aberto por muitos usuários) viram uma só.
+# Com CROSS_PROCESS, a coalescência vale entre workers: quem busca trava a chave no cache de GOOGLE_BOOKS_CACHE
+# por até LOCK_TIMEOUT s e publica a resposta por RESULT_TIMEOUT s; os outros esperam até WAIT_TIMEOUT s
+GOOGLE_BOOKS_SINGLEFLIGHT = {
+    'CROSS_PROCESS': True,
+    'LOCK_TIMEOUT': 15,
+    'RESULT_TIMEOUT': 10,
+    'WAIT_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+# Cota da API do Google Books, compartilhada pelos workers no cache ALIAS: até CAPACITY chamadas de uma vez,
+# repostas a RATE por segundo, e DAILY_LIMIT por dia (a cota do projeto no Google Cloud).
+# Chamadas de segundo plano (páginas antecipadas, atualização de volumes, importações) só usam o que
+# passar de BACKGROUND_RESERVE (fração do bucket e do limite diário), reservado para as buscas dos usuários
+GOOGLE_BOOKS_QUOTA = {
+    'ENABLED': True,
+    'ALIAS': 'google_books',
+    'RATE': 10,
+    'CAPACITY': 50,
+    'DAILY_LIMIT': int(os.environ.get('GOOGLE_BOOKS_DAILY_QUOTA', 100000)),
+    'BACKGROUND_RESERVE': 0.5,
+}
+
+# Importação de listas de leitura (core.importers): linhas gravadas por lote, threads que
+# procuram os livros na API e limite de chamadas por segundo somando todas as threads
+READING_LIST_IMPORT = {
+    'BATCH_SIZE': 200,
+    'WORKERS': 8,
+    'RATE_LIMIT': 10,
+    'MAX_UPLOAD_SIZE': 50 * 1024 * 1024,
+    'QUOTA_WAIT': 60,  # segundos esperando cota da API antes de interromper a importação (retomável)
+}
+
+# Paginação da lista de livros do perfil: "offset" (números de página) ou "cursor"
+# (anterior/próxima, sem COUNT(*) nem OFFSET; indicada para bibliotecas com milhares de livros).
+# O modo cursor também pode ser pedido por requisição com ?cursor=
+PROFILE_PAGINATION = 'offset'
+
+# Com BOOKLY_ASYNC_VIEWS=1, a busca e os detalhes usam as views assíncronas (rodando sob ASGI/uvicorn)
+USE_ASYNC_VIEWS = os.environ.get('BOOKLY_ASYNC_VIEWS') == '1'
+
+# Dados completos dos livros salvos (BookVolume): tempo até serem considerados vencidos.
+# Volumes vencidos continuam sendo servidos enquanto são atualizados em segundo plano
+BOOK_VOLUME_TTL = 60 * 60 * 24 * 7
+
+BOOK_VOLUME_REFRESH_IN_BACKGROUND = True
+
+# Busca local (core.search_index): a API do Google só é chamada quando o catálogo local não tem
+# resultados suficientes para preencher a página pedida
+LOCAL_SEARCH_ENABLED = True
+
+# Autocomplete da busca (core.suggest): prefixos de títulos, autores e pesquisas feitas pelo menos
+# MIN_QUERY_COUNT vezes. MAX_AGE é o tempo (s) que o navegador pode reaproveitar a resposta de um prefixo;
+# REFRESH_INTERVAL, de quanto em quanto tempo cada processo lê os livros cadastrados por outros workers
+SEARCH_SUGGEST = {
+    'LIMIT': 8,
+    'MAX_LIMIT': 20,
+    'MIN_LENGTH': 2,
+    'MAX_AGE': 60,
+    'CACHE_SIZE': 2048,
+    'MIN_QUERY_COUNT': 3,
+    'REFRESH_INTERVAL': 60,
+}
+
+# Tarefas em segundo plano (core.jobs), guardadas no banco e executadas por "python manage.py run_jobs":
+# dados completos dos livros novos ("enrich") e cópia local das capas ("cover"). CONCURRENCY é o número de
+# threads de cada worker, KIND_CONCURRENCY o limite por tipo. Tarefas com erro são repetidas com backoff
+# (RETRY_BACKOFF s, dobrando a cada tentativa, até MAX_BACKOFF) até MAX_ATTEMPTS tentativas
+JOBS = {
+    'CONCURRENCY': 4,
+    'KIND_CONCURRENCY': {'enrich': 2, 'cover': 4, 'neighbors': 1},
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,
+    'MAX_BACKOFF': 60 * 60,
+    'LOCK_TIMEOUT': 10 * 60,  # tarefa "executando" há mais tempo que isso (worker morreu) volta para a fila
+    'POLL_INTERVAL': 2,
+}
+
+# Capas copiadas para MEDIA_ROOT/covers/ (core.covers): reduzidas para caber em MAX_SIZE (com Pillow
+# instalado) e servidas com cache de MAX_AGE segundos, já que a URL muda quando a imagem muda
+COVERS = {
+    'MAX_SIZE': (256, 384),
+    'QUALITY': 80,
+    'MAX_BYTES': 2 * 1024 * 1024,
+    'TIMEOUT': 10,
+    'MAX_AGE': 60 * 60 * 24 * 365,
+    # só capas do Google são baixadas pelo servidor (core.covers.is_allowed)
+    'ALLOWED_SCHEMES': ['https'],
+    'ALLOWED_HOSTS': ['books.google.com', '.googleusercontent.com'],
+}
+
+# Dados completos de vários livros de uma vez (core.hydration: perfil completo e exportação): volumes que não
+# estão no banco são buscados em até WORKERS chamadas simultâneas à API; os que passarem de TIMEOUT segundos
+# ficam sem os dados completos. A exportação hidrata EXPORT_BATCH livros por vez
+HYDRATION = {
+    'WORKERS': 16,
+    'TIMEOUT': 15,
+    'EXPORT_BATCH': 100,
+}
+
+# Recomendações "quem leu também leu" (core.recommendations): peso de cada status na semelhança entre livros,
+# TOP_K vizinhos guardados por livro, e só pares com MIN_COMMON leitores em comum. A tabela é recalculada
+# por "python manage.py rebuild_recommendations" (agende no cron) e atualizada livro a livro pela tarefa
+# "neighbors", UPDATE_DELAY segundos depois de uma mudança (mudanças no mesmo livro nesse meio-tempo viram uma).
+# As páginas mostram SHOW recomendações; as do perfil saem dos PROFILE_SEEDS livros mais recentes do usuário
+# e ficam CACHE_TIMEOUT segundos no cache de fragmentos
+RECOMMENDATIONS = {
+    'WEIGHTS': {'completed': 1.0, 'reading': 0.8, 'plan': 0.5, 'dropped': 0.1},
+    'TOP_K': 20,
+    'MIN_COMMON': 2,
+    'MAX_BOOKS_PER_USER': 500,
+    'BLOCK_SIZE': 2048,  # livros por bloco no cálculo com NumPy/SciPy
+    'UPDATE_DELAY': 60,
+    'SHOW': 6,
+    'PROFILE_SEEDS': 20,
+    'CACHE_TIMEOUT': 60 * 10,
+}
+
+# API JSON (core.api, em /api/v1/): PAGE_SIZE itens por página (?limit= até MAX_PAGE_SIZE). Respostas
+# maiores que COMPRESS_MIN_SIZE bytes são comprimidas (brotli, se o pacote estiver instalado, ou gzip).
+# Buscas podem ser reaproveitadas pelo cliente por SEARCH_MAX_AGE segundos
+API = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 200,
+    'COMPRESS_MIN_SIZE': 512,
+    'SEARCH_MAX_AGE': 60,
+}
+
+
+# Medição das requisições (core.instrumentation): cabeçalho Server-Timing com os tempos de API, banco e
+# template, e percentis por view nas últimas WINDOW requisições, em /metrics/ (formato do Prometheus).
+# /metrics/ é só para staff; defina METRICS_TOKEN para o Prometheus acessar com "Authorization: Bearer <token>"
+PERFORMANCE_METRICS = {
+    'SERVER_TIMING': True,
+    'WINDOW': 1000,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
 }
 
 
@@ -127,6 +431,12 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Arquivos enviados pelos usuários (ex.: listas de leitura para importar) e capas dos livros
+
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 